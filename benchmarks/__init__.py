@@ -0,0 +1,5 @@
+"""
+Benchmarks for the coco backends, run against local stand-ins (see `benchmarks.fakes`).
+
+Run `python -m benchmarks --help` for the available options.
+"""
@@ -0,0 +1,73 @@
+from argparse import ArgumentParser
+from benchmarks.runner import BACKENDS, run
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+def get_commit():
+    """
+    Return the commit the working tree is at or `None` if it cannot be determined.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=open(os.devnull, 'w')
+        ).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='python -m benchmarks', description="Benchmark the coco backends against local stand-ins.")
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help="comma separated backends to benchmark (default: %(default)s)")
+    parser.add_argument('--scale', type=int, default=100,
+                        help="number of containers, users or directories to create (default: %(default)s)")
+    parser.add_argument('--iterations', type=int, default=100,
+                        help="number of calls per read operation (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the lookup order (default: %(default)s)")
+    parser.add_argument('--output', help="file to write the JSON results to (default: stdout)")
+    parser.add_argument('--ldap-server', help="benchmark against this LDAP server instead of an in-memory one")
+    parser.add_argument('--ldap-base-dn', default='dc=coco,dc=bench')
+    parser.add_argument('--ldap-users-dn', default='ou=users')
+    parser.add_argument('--ldap-groups-dn', default='ou=groups')
+    parser.add_argument('--ldap-bind-dn')
+    parser.add_argument('--ldap-password')
+    args = parser.parse_args(argv)
+
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    unknown = [backend for backend in backends if backend not in BACKENDS]
+    if unknown:
+        parser.error("unknown backends: " + ', '.join(unknown))
+
+    report = {
+        'meta': {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'scale': args.scale,
+            'iterations': args.iterations,
+            'seed': args.seed,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        'results': run(
+            backends, scale=args.scale, iterations=args.iterations, seed=args.seed,
+            ldap_server=args.ldap_server, ldap_base_dn=args.ldap_base_dn, ldap_users_dn=args.ldap_users_dn,
+            ldap_groups_dn=args.ldap_groups_dn, ldap_bind_dn=args.ldap_bind_dn, ldap_password=args.ldap_password
+        )
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+    return 1 if any('error' in results for results in report.get('results').values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
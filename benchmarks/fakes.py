@@ -0,0 +1,675 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from base64 import standard_b64decode
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import os
+import re
+import shutil
+import SocketServer
+import tempfile
+import threading
+import time
+from urlparse import parse_qs, urlparse
+import uuid
+
+
+class CallCounter(object):
+
+    """
+    Proxy counting the method calls made on the wrapped object.
+
+    Used to count the round trips of backends that do not talk to a server we control
+    (i.e. an LDAP connection or the file system helper).
+    """
+
+    def __init__(self, target):
+        """
+        Initialize a new call counter.
+
+        :param target: The object to wrap.
+        """
+        self.calls = 0
+        self._target = target
+
+    def __getattr__(self, name):
+        """
+        Return the attribute `name` of the wrapped object, counting calls if it is a method.
+        """
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            return attribute(*args, **kwargs)
+        return call
+
+
+class FakeServer(object):
+
+    """
+    Base class of the in-memory HTTP stand-ins.
+
+    Requests are dispatched to `handle(method, path, query, body, headers)`, which returns
+    the status code, the body (serialized as JSON, strings are sent as plain text) and optional extra headers.
+    The number of handled requests (round trips) is counted in `requests`.
+    """
+
+    def __init__(self):
+        """
+        Initialize a new, stopped fake server.
+        """
+        self.requests = 0
+        self._lock = threading.RLock()
+        self._server = None
+
+    def handle(self, method, path, query, body, headers):
+        """
+        Handle a request and return a tuple (status, body, headers).
+
+        :param method: The HTTP method.
+        :param path: The request path.
+        :param query: Dictionary of query parameters (single values).
+        :param body: The raw request body.
+        :param headers: The request headers.
+        """
+        raise NotImplementedError
+
+    def make_server(self, handler):
+        """
+        Create and return the `SocketServer` instance to serve requests with `handler`.
+
+        :param handler: The request handler class.
+        """
+        raise NotImplementedError
+
+    def start(self):
+        """
+        Start serving requests in a background thread.
+        """
+        self._server = self.make_server(FakeRequestHandler)
+        self._server.fake = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+
+    """
+    HTTP/1.1 request handler dispatching to the `FakeServer` it belongs to.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_HEAD(self):
+        self.dispatch('HEAD')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def dispatch(self, method):
+        """
+        Pass the request on to the fake server and write its response.
+        """
+        fake = self.server.fake
+        url = urlparse(self.path)
+        query = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        with fake._lock:
+            fake.requests += 1
+        status, payload, headers = fake.handle(method, url.path, query, body, self.headers)
+
+        if hasattr(payload, 'next'):  # stream
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for chunk in payload:
+                    self.wfile.write('%x\r\n%s\r\n' % (len(chunk), chunk))
+                    self.wfile.flush()
+                self.wfile.write('0\r\n\r\n')
+            except IOError:
+                pass  # client went away
+            self.close_connection = 1
+            return
+
+        if isinstance(payload, basestring):  # error messages are sent as plain text
+            content, content_type = payload, 'text/plain'
+        else:
+            content, content_type = json.dumps(payload) if payload is not None else '', 'application/json'
+        self.send_response(status)
+        if content:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(content)
+
+    def finish(self):
+        try:
+            BaseHTTPRequestHandler.finish(self)
+        except IOError:
+            pass  # client went away
+
+    def handle(self):
+        try:
+            BaseHTTPRequestHandler.handle(self)
+        except IOError:
+            pass  # client went away
+
+    def log_message(self, format, *args):
+        pass  # keep the benchmark output clean
+
+
+class ThreadingUnixHTTPServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+
+    """
+    Threaded HTTP server listening on a unix socket.
+    """
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = SocketServer.UnixStreamServer.get_request(self)
+        return request, ('local', 0)  # BaseHTTPRequestHandler expects a (host, port) address
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, HTTPServer):
+
+    """
+    Threaded HTTP server listening on a TCP port.
+    """
+
+    daemon_threads = True
+
+
+class FakeDockerDaemon(FakeServer):
+
+    """
+    In-memory stand-in for the Docker daemon.
+
+    Serves the subset of the Docker remote API used by the `Docker` backend over a unix socket,
+    so the backend is exercised through docker-py exactly as in production.
+    """
+
+    def __init__(self, images=('coco/base:latest',), socket_path=None):
+        """
+        Initialize a new fake Docker daemon.
+
+        :param images: Tags of the images available right away.
+        :param socket_path: Path of the unix socket to listen on (a temporary one if not set).
+        """
+        super(FakeDockerDaemon, self).__init__()
+        self._tmp_dir = None
+        if socket_path is None:
+            self._tmp_dir = tempfile.mkdtemp()
+            socket_path = os.path.join(self._tmp_dir, 'docker.sock')
+        self.socket_path = socket_path
+        self.containers = OrderedDict()  # ID -> inspect data
+        self.images = OrderedDict()  # ID -> inspect data
+        self._events = []
+        self._events_changed = threading.Condition(self._lock)
+        self._stopped = False
+        for tag in images:
+            self.add_image(tag)
+
+    @property
+    def base_url(self):
+        """
+        The URL to pass to the `Docker` backend.
+        """
+        return 'unix://' + self.socket_path
+
+    def add_image(self, tag, labels=None):
+        """
+        Add an image and return its inspect data.
+
+        :param tag: The image's tag (i.e. coco/base:latest).
+        :param labels: The image's labels.
+        """
+        pk = uuid.uuid4().hex + uuid.uuid4().hex
+        image = {
+            'Id': pk,
+            'RepoTags': [tag],
+            'RepoDigests': [],
+            'Created': int(time.time()),
+            'Size': 1024 * 1024,
+            'VirtualSize': 100 * 1024 * 1024,
+            'Labels': labels or {},
+            'Config': {'Labels': labels or {}}
+        }
+        with self._lock:
+            self.images[pk] = image
+        return image
+
+    def find_container(self, ref):
+        """
+        Return the container with the ID (prefix) or name `ref` or `None`.
+        """
+        with self._lock:
+            container = self.containers.get(ref)
+            if container is not None:
+                return container
+            for container in self.containers.values():
+                if container.get('Name') == '/' + ref.lstrip('/') or container.get('Id').startswith(ref):
+                    return container
+        return None
+
+    def find_image(self, ref):
+        """
+        Return the image with the ID (prefix) or tag `ref` or `None`.
+        """
+        if ':' not in ref and not re.match(r'^[0-9a-f]{12,}$', ref):
+            ref += ':latest'
+        with self._lock:
+            for image in self.images.values():
+                if ref in image.get('RepoTags') or image.get('Id').startswith(ref):
+                    return image
+        return None
+
+    def handle(self, method, path, query, body, headers):
+        """
+        :inherit.
+        """
+        path = re.sub(r'^/v[0-9.]+', '', path)
+        data = json.loads(body) if body else {}
+        filters = json.loads(query.get('filters') or '{}')
+
+        if path == '/_ping':
+            return 200, None, None
+        if path in ('/info', '/version'):
+            return 200, {'NCPU': 4, 'MemTotal': 8 * 1024 ** 3, 'ApiVersion': '1.19'}, None
+        if path == '/events':
+            return 200, self.stream_events(), None
+        if path == '/containers/json':
+            return 200, self.list_containers(query.get('all') in ('1', 'True', 'true'), filters), None
+        if path == '/containers/create':
+            return self.create_container(query.get('name'), data)
+        if path == '/images/json':
+            return 200, self.list_images(filters), None
+        if path == '/commit':
+            return self.commit(query, data)
+
+        match = re.match(r'^/containers/([^/]+)(?:/(\w+))?$', path)
+        if match:
+            return self.handle_container(method, match.group(1), match.group(2), query)
+        match = re.match(r'^/images/(.+?)(/json)?$', path)
+        if match:
+            image = self.find_image(match.group(1))
+            if image is None:
+                return 404, 'No such image: ' + match.group(1), None
+            if method == 'DELETE':
+                with self._lock:
+                    self.images.pop(image.get('Id'), None)
+                return 200, [{'Untagged': image.get('RepoTags')[0]}], None
+            return 200, image, None
+        return 404, 'page not found', None
+
+    def commit(self, query, data):
+        """
+        Commit a container to a new image.
+        """
+        container = self.find_container(query.get('container'))
+        if container is None:
+            return 404, 'No such container', None
+        labels = dict(container.get('Config').get('Labels') or {})
+        labels.update((data or {}).get('Labels') or {})
+        image = self.add_image('%s:%s' % (query.get('repo'), query.get('tag') or 'latest'), labels)
+        return 201, {'Id': image.get('Id')}, None
+
+    def create_container(self, name, config):
+        """
+        Create a container from the given config.
+        """
+        if name and self.find_container(name) is not None:
+            return 409, 'Conflict, the name is already in use', None
+        if self.find_image(config.get('Image')) is None:
+            return 404, 'No such image', None
+        pk = uuid.uuid4().hex + uuid.uuid4().hex
+        container = {
+            'Id': pk,
+            'Name': '/' + (name or pk[:12]),
+            'Image': config.get('Image'),
+            'Created': time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'State': {'Running': False, 'Paused': False},
+            'Config': {
+                'Cmd': config.get('Cmd'),
+                'Env': config.get('Env'),
+                'Labels': config.get('Labels') or {},
+                'ExposedPorts': config.get('ExposedPorts'),
+                'Volumes': config.get('Volumes')
+            },
+            'HostConfig': config.get('HostConfig') or {},
+            'NetworkSettings': {'Ports': {}}
+        }
+        with self._lock:
+            self.containers[pk] = container
+        self.publish(container, 'create')
+        return 201, {'Id': pk, 'Warnings': None}, None
+
+    def handle_container(self, method, ref, action, query):
+        """
+        Handle a request for a single container.
+        """
+        container = self.find_container(ref)
+        if container is None:
+            return 404, 'No such container: ' + ref, None
+        state = container.get('State')
+        if method == 'GET' and action == 'json':
+            return 200, container, None
+        if method == 'GET' and action == 'changes':
+            return 200, None, None
+        if method == 'DELETE' and action is None:
+            with self._lock:
+                self.containers.pop(container.get('Id'), None)
+            self.publish(container, 'destroy')
+            return 204, None, None
+        if method == 'POST' and action in ('start', 'restart', 'stop', 'pause', 'unpause', 'rename'):
+            with self._lock:
+                if action in ('start', 'restart'):
+                    state.update(Running=True, Paused=False)
+                elif action == 'stop':
+                    state.update(Running=False, Paused=False)
+                elif action == 'rename':
+                    container['Name'] = '/' + query.get('name')
+                else:
+                    state['Paused'] = action == 'pause'
+            self.publish(container, action)
+            return 204, None, None
+        return 404, 'page not found', None
+
+    def list_containers(self, all, filters):
+        """
+        Return the container listing, applying the label filters.
+        """
+        listing = []
+        with self._lock:
+            containers = list(self.containers.values())
+        for container in containers:
+            if not all and not container.get('State').get('Running'):
+                continue
+            if not self.matches_labels(container.get('Config').get('Labels'), filters.get('label')):
+                continue
+            listing.append({
+                'Id': container.get('Id'),
+                'Names': [container.get('Name')],
+                'Image': container.get('Image'),
+                'Labels': container.get('Config').get('Labels'),
+                'Status': 'Up' if container.get('State').get('Running') else 'Exited (0)'
+            })
+        return listing
+
+    def list_images(self, filters):
+        """
+        Return the image listing, applying the label and dangling filters.
+        """
+        with self._lock:
+            images = list(self.images.values())
+        return [
+            dict((key, value) for key, value in image.items() if key != 'Config')
+            for image in images if self.matches_labels(image.get('Labels'), filters.get('label'))
+        ]
+
+    def matches_labels(self, labels, selectors):
+        """
+        Return true if `labels` match all label filters (`key` or `key=value`).
+        """
+        for selector in selectors or []:
+            key, _, value = selector.partition('=')
+            if key not in (labels or {}) or (value and labels.get(key) != value):
+                return False
+        return True
+
+    def make_server(self, handler):
+        """
+        :inherit.
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        return ThreadingUnixHTTPServer(self.socket_path, handler)
+
+    def publish(self, container, action):
+        """
+        Publish a container event to the subscribers of the event stream.
+        """
+        with self._lock:
+            self._events.append(json.dumps({
+                'status': action,
+                'id': container.get('Id'),
+                'from': container.get('Image'),
+                'time': int(time.time())
+            }))
+            self._events_changed.notify_all()
+
+    def stop(self):
+        """
+        :inherit.
+        """
+        with self._lock:
+            self._stopped = True
+            self._events_changed.notify_all()
+        super(FakeDockerDaemon, self).stop()
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def stream_events(self):
+        """
+        Generator yielding the events published after the subscription until the daemon is stopped.
+        """
+        with self._lock:
+            position = len(self._events)
+        while True:
+            with self._lock:
+                while position == len(self._events) and not self._stopped:
+                    self._events_changed.wait(1)
+                if self._stopped:
+                    return
+                events = self._events[position:]
+                position = len(self._events)
+            for event in events:
+                yield event
+
+
+class FakeHostApi(FakeServer):
+
+    """
+    In-memory stand-in for the coco host API.
+
+    Serves the container slugs used by the `HttpRemote` backend over HTTP on localhost,
+    including `ETag` validators on the list endpoints.
+    """
+
+    def __init__(self):
+        """
+        Initialize a new fake host API.
+        """
+        super(FakeHostApi, self).__init__()
+        self.containers = OrderedDict()  # PK -> container
+        self._version = 0
+
+    @property
+    def url(self):
+        """
+        The URL to pass to the `HttpRemote` backend.
+        """
+        return 'http://127.0.0.1:%i' % self._server.server_address[1]
+
+    def handle(self, method, path, query, body, headers):
+        """
+        :inherit.
+        """
+        data = json.loads(body) if body else {}
+        if path == '/health':
+            return 200, {'backends': {'container': {'status': 'ok'}}}, None
+        if path in ('/containers/images', '/containers/snapshots'):
+            return self.listing([], headers)
+        if path == '/containers' and method == 'GET':
+            with self._lock:
+                containers = list(self.containers.values())
+            return self.listing(containers, headers)
+        if path == '/containers' and method == 'POST':
+            return self.create_container(data)
+
+        match = re.match(r'^/containers/(.+)$', path)  # base64 might contain slashes
+        if match:
+            pk = standard_b64decode(match.group(1))
+            with self._lock:
+                container = self.containers.get(pk)
+                if container is None:
+                    return 404, None, None
+                if method == 'DELETE':
+                    del self.containers[pk]
+                    self._version += 1
+                    return 204, None, None
+            return 200, container, None
+        return 404, None, None
+
+    def create_container(self, specification):
+        """
+        Create a container from the given specification.
+        """
+        name = 'coco-u%i-%s' % (specification.get('uid'), specification.get('name'))
+        with self._lock:
+            if any(c.get('name') == name for c in self.containers.values()):
+                return 409, None, None
+            container = {
+                'pk': uuid.uuid4().hex,
+                'status': 'running',
+                'name': name,
+                'owner': specification.get('uid')
+            }
+            self.containers[container.get('pk')] = container
+            self._version += 1
+        return 201, container, None
+
+    def listing(self, items, headers):
+        """
+        Return a list response carrying an `ETag`, or `304 Not Modified` if the client's copy is current.
+        """
+        with self._lock:
+            etag = '"%s"' % hashlib.md5(str(self._version) + str(len(items))).hexdigest()
+        if headers.getheader('If-None-Match') == etag:
+            return 304, None, {'ETag': etag}
+        return 200, items, {'ETag': etag}
+
+    def make_server(self, handler):
+        """
+        :inherit.
+        """
+        return ThreadingHTTPServer(('127.0.0.1', 0), handler)
+
+
+class FakeLdapConnection(object):
+
+    """
+    In-memory stand-in for a python-ldap connection (`LDAPObject`).
+
+    Implements the synchronous operations used by the `LdapBackend`. Every entry is stored
+    under its normalized DN, search filters of the form `attr=value` (or `attr=*`) are supported.
+    """
+
+    def __init__(self, base_dns=()):
+        """
+        Initialize a new, empty directory.
+
+        :param base_dns: DNs of the (organizational unit) entries to create right away.
+        """
+        self.entries = OrderedDict()  # normalized DN -> (DN, attributes)
+        for dn in base_dns:
+            self.entries[self.normalize(dn)] = (dn, {'objectclass': ['organizationalUnit']})
+
+    def add_s(self, dn, modlist):
+        import ldap
+        if self.normalize(dn) in self.entries:
+            raise ldap.ALREADY_EXISTS({'desc': 'Already exists'})
+        self.entries[self.normalize(dn)] = (dn, dict((attr, list(values)) for attr, values in modlist))
+
+    def bind_s(self, who, cred, method=None):
+        return None
+
+    def delete_s(self, dn):
+        import ldap
+        if self.entries.pop(self.normalize(dn), None) is None:
+            raise ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+
+    def modify_s(self, dn, modlist):
+        import ldap
+        entry = self.entries.get(self.normalize(dn))
+        if entry is None:
+            raise ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+        attributes = entry[1]
+        for op, attr, values in modlist:
+            values = [values] if isinstance(values, basestring) else list(values or [])
+            key = next((a for a in attributes if a.lower() == attr.lower()), attr)
+            if op == ldap.MOD_ADD:
+                attributes.setdefault(key, []).extend(values)
+            elif op == ldap.MOD_DELETE:
+                remaining = [v for v in attributes.get(key, []) if v not in values] if values else []
+                if remaining:
+                    attributes[key] = remaining
+                else:
+                    attributes.pop(key, None)
+            else:
+                attributes[key] = values
+
+    def normalize(self, dn):
+        """
+        Return the normalized form of `dn` (lowercase, no spaces around separators).
+        """
+        return ','.join(part.strip() for part in dn.lower().split(','))
+
+    def read_s(self, dn, filterstr=None, attrlist=None):
+        import ldap
+        entry = self.entries.get(self.normalize(dn))
+        if entry is None:
+            raise ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+        return copy.deepcopy(entry[1])
+
+    def search_s(self, base, scope, filterstr='(objectClass=*)', attrlist=None):
+        import ldap
+        base = self.normalize(base)
+        attr, _, value = filterstr.strip('()').partition('=')
+        results = []
+        for normalized, (dn, attributes) in self.entries.items():
+            if scope == ldap.SCOPE_BASE and normalized != base:
+                continue
+            if scope == ldap.SCOPE_ONELEVEL and normalized.partition(',')[2] != base:
+                continue
+            if scope == ldap.SCOPE_SUBTREE and normalized != base and not normalized.endswith(',' + base):
+                continue
+            values = next((v for a, v in attributes.items() if a.lower() == attr.lower()), None)
+            if values is None or (value != '*' and value.lower() not in [v.lower() for v in values]):
+                continue
+            results.append((dn, copy.deepcopy(attributes)))
+        return results
+
+    def simple_bind_s(self, who='', cred=''):
+        return None
+
+    def unbind_s(self):
+        return None
@@ -0,0 +1,217 @@
+from benchmarks.fakes import CallCounter, FakeDockerDaemon, FakeHostApi, FakeLdapConnection
+import os
+import random
+import shutil
+import tempfile
+import time
+
+
+"""
+Backends that can be benchmarked and the order they run in.
+"""
+BACKENDS = ('docker', 'http', 'ldap', 'fs')
+
+
+def get_percentile(durations, percentile):
+    """
+    Return the `percentile` (0-100) of the sorted list `durations` (nearest rank).
+    """
+    if not durations:
+        return 0
+    rank = int(round(percentile / 100.0 * len(durations) + 0.5)) - 1
+    return durations[max(0, min(rank, len(durations) - 1))]
+
+
+def measure(operation, args, counter):
+    """
+    Call `operation` once per entry of `args` and return the latency statistics.
+
+    :param operation: The callable to measure.
+    :param args: List of argument tuples, one per call.
+    :param counter: Callable returning the current number of round trips to the backend's server.
+    """
+    durations = []
+    round_trips = counter()
+    started = time.time()
+    for call_args in args:
+        call_started = time.time()
+        operation(*call_args)
+        durations.append(time.time() - call_started)
+    total = time.time() - started
+    round_trips = counter() - round_trips
+
+    durations.sort()
+    count = len(durations)
+    return {
+        'count': count,
+        'total_s': total,
+        'mean_ms': 1000 * total / count if count else 0,
+        'p50_ms': 1000 * get_percentile(durations, 50),
+        'p95_ms': 1000 * get_percentile(durations, 95),
+        'max_ms': 1000 * durations[-1] if count else 0,
+        'ops_per_s': count / total if total else 0,
+        'round_trips_per_op': float(round_trips) / count if count else 0
+    }
+
+
+def run_docker(scale, iterations):
+    """
+    Benchmark the `Docker` backend against a `FakeDockerDaemon` holding `scale` containers.
+
+    The inspect cache is disabled, so lookups are measured against the daemon rather than the cache.
+    """
+    from coco.backends.container_backends import Docker
+
+    daemon = FakeDockerDaemon()
+    daemon.start()
+    backend = None
+    try:
+        backend = Docker(base_url=daemon.base_url, version='1.19', inspect_ttl=0)
+        counter = lambda: daemon.requests
+        names = [(1000 + i % 50, 'bench%i' % i) for i in range(scale)]
+        results = {}
+
+        results['create_container'] = measure(
+            lambda uid, name: backend.create_container('bench', uid, name, [], [], image='coco/base:latest'),
+            names, counter
+        )
+        pks = [container.get('Id') for container in daemon.containers.values()]
+        lookups = [(random.choice(pks),) for _ in range(iterations)]
+        results['get_containers'] = measure(backend.get_containers, [()] * iterations, counter)
+        results['container_exists'] = measure(backend.container_exists, lookups, counter)
+        results['get_container'] = measure(backend.get_container, lookups, counter)
+
+        results['warm_up'] = measure(backend.warm_up, [()], counter)
+        results['get_containers_warm'] = measure(backend.get_containers, [()] * iterations, counter)
+
+        results['delete_container'] = measure(backend.delete_container, [(pk,) for pk in pks], counter)
+        return results
+    finally:
+        if backend is not None:  # stop the background threads and connections, so they do not outlive the daemon
+            backend.close()
+        daemon.stop()
+
+
+def run_http_remote(scale, iterations):
+    """
+    Benchmark the `HttpRemote` backend against a `FakeHostApi` holding `scale` containers.
+    """
+    from coco.backends.container_backends import HttpRemote
+
+    api = FakeHostApi()
+    api.start()
+    try:
+        backend = HttpRemote(api.url)
+        counter = lambda: api.requests
+        names = [(1000 + i % 50, 'bench%i' % i) for i in range(scale)]
+        results = {}
+
+        results['create_container'] = measure(
+            lambda uid, name: backend.create_container('bench', uid, name, [], [], image='coco/base:latest'),
+            names, counter
+        )
+        pks = list(api.containers.keys())
+        lookups = [(random.choice(pks),) for _ in range(iterations)]
+        results['get_containers'] = measure(backend.get_containers, [()] * iterations, counter)
+        results['container_exists'] = measure(backend.container_exists, lookups, counter)
+        results['get_container'] = measure(backend.get_container, lookups, counter)
+        results['delete_container'] = measure(backend.delete_container, [(pk,) for pk in pks], counter)
+        return results
+    finally:
+        api.stop()
+
+
+def run_ldap(scale, iterations, server=None, base_dn='dc=coco,dc=bench', users_dn='ou=users',
+             groups_dn='ou=groups', bind_dn=None, password=None):
+    """
+    Benchmark the `LdapBackend` with `scale` users.
+
+    Runs against a `FakeLdapConnection` unless `server` is set, in which case the real server is used
+    (the users and groups DNs must exist, the created entries are removed afterwards).
+    """
+    from coco.backends.usergroup_backends import LdapBackend
+
+    backend = LdapBackend(server or 'localhost', base_dn, users_dn=users_dn, groups_dn=groups_dn)
+    if server:
+        backend.connect({'dn': bind_dn, 'password': password})
+    else:
+        backend.cnx = FakeLdapConnection([backend.get_full_dn(users_dn), backend.get_full_dn(groups_dn)])
+    backend.cnx = CallCounter(backend.cnx)
+    counter = lambda: backend.cnx.calls
+    users = ['bench%i' % i for i in range(scale)]
+    results = {}
+
+    backend.create_group(90000, 'benchgroup')
+    try:
+        results['create_user'] = measure(
+            lambda uid, user: backend.create_user(uid, user, 'secret', 90000, '/home/' + user),
+            [(90001 + i, user) for i, user in enumerate(users)], counter
+        )
+        lookups = [(random.choice(users),) for _ in range(iterations)]
+        results['get_users'] = measure(backend.get_users, [()] * iterations, counter)
+        results['user_exists'] = measure(backend.user_exists, lookups, counter)
+        results['get_user'] = measure(backend.get_user, lookups, counter)
+        results['add_group_member'] = measure(
+            backend.add_group_member, [('benchgroup', user) for user in users], counter
+        )
+        results['is_group_member'] = measure(
+            backend.is_group_member, [('benchgroup', user) for (user,) in lookups], counter
+        )
+        results['delete_user'] = measure(backend.delete_user, [(user,) for user in users], counter)
+    finally:
+        backend.delete_group('benchgroup')
+        if server:
+            backend.disconnect()
+    return results
+
+
+def run_local_filesystem(scale, iterations):
+    """
+    Benchmark the `LocalFileSystem` backend with `scale` directories (on a tmpfs if available).
+    """
+    from coco.backends.storage_backends import LocalFileSystem
+
+    base_dir = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        backend = LocalFileSystem(base_dir)
+        backend._fs = CallCounter(backend._fs)
+        counter = lambda: backend._fs.calls
+        dirs = ['bench%i' % i for i in range(scale)]
+        lookups = [(random.choice(dirs),) for _ in range(iterations)]
+        results = {}
+
+        results['mk_dir'] = measure(backend.mk_dir, [(d,) for d in dirs], counter)
+        results['dir_exists'] = measure(backend.dir_exists, lookups, counter)
+        results['get_dir_mode'] = measure(backend.get_dir_mode, lookups, counter)
+        results['get_dir_owner'] = measure(backend.get_dir_owner, lookups, counter)
+        results['rm_dir'] = measure(backend.rm_dir, [(d,) for d in dirs], counter)
+        return results
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def run(backends=BACKENDS, scale=100, iterations=100, seed=0, **kwargs):
+    """
+    Run the benchmarks of `backends` and return the results per backend and operation.
+
+    A backend that cannot be benchmarked (i.e. because a dependency is missing) is reported
+    with its error instead of failing the whole run.
+
+    :param kwargs: Options for `run_ldap` (prefixed with `ldap_`).
+    """
+    suites = {
+        'docker': lambda: run_docker(scale, iterations),
+        'http': lambda: run_http_remote(scale, iterations),
+        'ldap': lambda: run_ldap(scale, iterations, **dict(
+            (key[len('ldap_'):], value) for key, value in kwargs.items() if key.startswith('ldap_')
+        )),
+        'fs': lambda: run_local_filesystem(scale, iterations)
+    }
+    results = {}
+    for backend in backends:
+        random.seed(seed)
+        try:
+            results[backend] = suites[backend]()
+        except Exception as ex:
+            results[backend] = {'error': '%s: %s' % (type(ex).__name__, ex)}
+    return results
@@ -14,4 +14,7 @@ setup(
         'python-ldap==2.4.20',
         'requests==2.7.0'
     ],
+    extras_require={
+        'msgpack': ['msgpack-python']
+    },
 )
@@ -0,0 +1,110 @@
+from requests.exceptions import RequestException
+import threading
+import time
+
+
+class CircuitOpenError(RequestException):
+
+    """
+    Raised instead of sending a request while the circuit is open.
+    """
+
+    pass
+
+
+class CircuitBreaker(object):
+
+    """
+    Per-node circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and requests fail fast
+    with a `CircuitOpenError`. Once `reset_timeout` seconds passed, a single probe request is let
+    through (half-open): if it succeeds the circuit closes again, otherwise it re-opens.
+    """
+
+    STATE_CLOSED = 'closed'
+    STATE_HALF_OPEN = 'half_open'
+    STATE_OPEN = 'open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """
+        Initialize a new (closed) circuit breaker.
+
+        :param failure_threshold: Number of consecutive failures after which the circuit opens.
+        :param reset_timeout: Seconds after which an open circuit lets a probe request through.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._opened_at = None
+        self._probing = False
+        self._state = CircuitBreaker.STATE_CLOSED
+
+    def before_request(self):
+        """
+        Raise a `CircuitOpenError` if no request may be sent right now.
+
+        Return true if the request is the half-open probe. The caller must then record its outcome
+        or call `release_probe` (i.e. in a `finally` clause), otherwise no further probe is let through.
+        """
+        with self._lock:
+            if self._state == CircuitBreaker.STATE_OPEN:
+                if time.time() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit open, the node is considered down")
+                self._state = CircuitBreaker.STATE_HALF_OPEN
+                self._probing = False
+            if self._state == CircuitBreaker.STATE_HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError("Circuit half-open, waiting for the probe request")
+                self._probing = True
+                return True
+            return False
+
+    def get_state(self):
+        """
+        Return the circuit's state, the number of consecutive failures and when it was opened.
+        """
+        with self._lock:
+            return {
+                'state': self._state,
+                'failures': self._failures,
+                'opened_at': self._opened_at
+            }
+
+    def is_open(self):
+        """
+        Return true if requests currently fail fast.
+        """
+        with self._lock:
+            return self._state == CircuitBreaker.STATE_OPEN \
+                and time.time() - self._opened_at < self.reset_timeout
+
+    def record_failure(self):
+        """
+        Record a failed request.
+        """
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == CircuitBreaker.STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = CircuitBreaker.STATE_OPEN
+                self._opened_at = time.time()
+
+    def record_success(self):
+        """
+        Record a successful request.
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self._state = CircuitBreaker.STATE_CLOSED
+
+    def release_probe(self):
+        """
+        Let the next request through as probe if the current one ended without a recorded outcome.
+        """
+        with self._lock:
+            if self._state == CircuitBreaker.STATE_HALF_OPEN:
+                self._probing = False
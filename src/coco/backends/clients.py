@@ -0,0 +1,361 @@
+from coco.backends.instrumentation import Instrumentation, instrument_call
+from copy import deepcopy
+from docker import Client
+import Queue
+import socket
+import threading
+import time
+import types
+import weakref
+
+
+class InspectCache(object):
+
+    """
+    Short-lived cache merging repeated and concurrent inspects of the same object into one daemon call.
+
+    Results are cached for `ttl` seconds. Concurrent requests for an object that is being loaded wait for
+    that load instead of issuing their own (single-flight). Failed loads are not cached. Every caller
+    gets its own copy of the result, so callers may modify it.
+    """
+
+    def __init__(self, ttl=1, max_entries=1024):
+        """
+        Initialize a new, empty inspect cache.
+
+        :param ttl: Seconds a result is served from the cache.
+        :param max_entries: Number of entries after which expired ones are purged.
+        """
+        self.hits = 0
+        self.max_entries = max_entries
+        self.misses = 0
+        self.ttl = ttl
+        self._entries = {}  # key -> (timestamp, result)
+        self._generation = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """
+        Return the cached result for `key`, calling `load` to get it if none is cached.
+
+        :param key: The (hashable) cache key.
+        :param load: Callable returning the result.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                self.hits += 1
+                return deepcopy(entry[1])
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._in_flight[key] = {'done': threading.Event(), 'generation': self._generation}
+            else:
+                self.hits += 1
+
+        if not leader:
+            flight.get('done').wait()
+            if 'error' in flight:
+                raise flight.get('error')
+            return deepcopy(flight.get('result'))
+
+        try:
+            flight['result'] = load()
+            return deepcopy(flight.get('result'))
+        except Exception as ex:
+            flight['error'] = ex
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is flight:
+                    del self._in_flight[key]
+                if 'error' not in flight and flight.get('generation') == self._generation:
+                    self._entries[key] = (time.time(), flight.get('result'))
+                    if len(self._entries) > self.max_entries:
+                        self._purge()
+            flight.get('done').set()
+
+    def get_stats(self):
+        """
+        Return the number of cache hits and misses.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def invalidate(self):
+        """
+        Drop all cached results, including those of loads currently in progress.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._in_flight.clear()
+            self._generation += 1
+
+    def _purge(self):
+        """
+        Remove all expired entries (the lock must be held).
+        """
+        now = time.time()
+        for key, entry in self._entries.items():
+            if now - entry[0] > self.ttl:
+                del self._entries[key]
+
+
+class ClosingStream(object):
+
+    """
+    Iterator over a stream returned by a dedicated docker-py client, closing the client once the stream
+    is exhausted, broken or closed.
+    """
+
+    def __init__(self, stream, client):
+        """
+        Initialize a new closing stream.
+
+        :param stream: The generator returned by the client.
+        :param client: The client the stream was opened with.
+        """
+        self._client = client
+        self._stream = stream
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        """
+        Close the stream and its client.
+
+        May be called while the stream is iterated in another thread, whose blocking read is then
+        interrupted by shutting the connection down.
+        """
+        client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            self._stream.close()
+        except ValueError:  # generator already executing (in another thread)
+            response = getattr(client, 'stream_response', None)
+            try:
+                client._get_raw_response_socket(response).shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass  # already closed
+        finally:
+            client.close()
+
+    def next(self):
+        """
+        Return the next item of the stream.
+        """
+        try:
+            return next(self._stream)
+        except Exception:  # exhausted (StopIteration) or broken
+            self.close()
+            raise
+
+
+class DockerClientPool(object):
+
+    """
+    Thread-safe pool of docker-py clients sharing the same daemon.
+
+    The pool is used like a single `docker.Client`: every method call is executed on a client checked out
+    of the pool for the duration of the call, with the timeout configured for that method. Concurrent calls
+    run on different clients (and connections), so a long commit does not hold up unrelated inspects.
+    Once all `size` clients are in use, further calls wait for one to be returned.
+
+    Streaming calls (see `STREAM_OPERATIONS` or `stream=True`) keep their connection open after returning,
+    they are executed on a dedicated client outside of the pool. The client is closed once the returned
+    stream is exhausted or closed, or the pool is closed (see `close`).
+
+    Inspects (see `CACHED_OPERATIONS`) go through an `InspectCache` if `cache_ttl` is set. The cache is
+    invalidated by every call that might change a container or image (all but `READ_OPERATIONS`).
+
+    Every call sent to the daemon is reported to `instrumentation` (named after the client method), with the
+    size of the request and response bodies (unknown for streaming calls). Calls served from the cache are not.
+    """
+
+    """
+    Client methods returning a stream that is consumed after the call returned.
+    """
+    STREAM_OPERATIONS = ('attach', 'events', 'stats')
+
+    """
+    Client methods whose results are cached and client methods that never change the daemon's state.
+    """
+    CACHED_OPERATIONS = ('inspect_container', 'inspect_image')
+    READ_OPERATIONS = CACHED_OPERATIONS + ('containers', 'diff', 'events', 'images', 'info', 'logs', 'stats', 'version')
+
+    def __init__(self, size=4, timeouts=None, default_timeout=120, cache_ttl=None, instrumentation=None, **kwargs):
+        """
+        Initialize a new client pool.
+
+        :param size: Maximum number of pooled clients.
+        :param timeouts: Dictionary of timeouts (in seconds, `None` for no timeout) per client method name.
+        :param default_timeout: Timeout (in seconds) for methods without a configured timeout.
+        :param cache_ttl: If set, seconds inspect results are cached.
+        :param instrumentation: The `Instrumentation` to report the calls to.
+        :param kwargs: Arguments for `docker.Client` (i.e. `base_url` and `version`).
+        """
+        self.default_timeout = default_timeout
+        self.inspect_cache = InspectCache(ttl=cache_ttl) if cache_ttl else None
+        self.instrumentation = instrumentation or Instrumentation()
+        self.size = size
+        self.timeouts = timeouts or {}
+        self._client_kwargs = kwargs
+        self._closed = False
+        self._idle = Queue.LifoQueue()  # reuse the most recently used (connected) client first
+        self._lock = threading.Lock()
+        self._streams = weakref.WeakSet()
+        self.release(self.create_client(default_timeout))  # fail early if the client cannot be created
+        self._created = 1
+
+    def __getattr__(self, name):
+        """
+        Return a callable executing the client method `name` (see `call`).
+        """
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        return call
+
+    def acquire(self):
+        """
+        Check out a client, creating a new one if none is idle and the pool is not full yet.
+        """
+        try:
+            return self._idle.get(block=False)
+        except Queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self.create_client(self.default_timeout)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def call(self, operation, *args, **kwargs):
+        """
+        Execute the client method `operation` on a pooled client and return its result.
+
+        :param operation: The client method name (i.e. `inspect_container`).
+        """
+        if self.inspect_cache is not None and operation in self.CACHED_OPERATIONS:
+            key = (operation,) + args + tuple(sorted(kwargs.items()))
+            return self.inspect_cache.get(key, lambda: self.execute(operation, args, kwargs))
+        try:
+            return self.execute(operation, args, kwargs)
+        finally:
+            if self.inspect_cache is not None and operation not in self.READ_OPERATIONS:
+                self.inspect_cache.invalidate()
+
+    def close(self):
+        """
+        Close all idle clients and open streams (and their connections).
+
+        Clients still checked out are closed once they are released.
+        """
+        with self._lock:
+            self._closed = True
+            streams = list(self._streams)
+        for stream in streams:
+            stream.close()
+        while True:
+            try:
+                self._idle.get(block=False).close()
+            except Queue.Empty:
+                return
+
+    def create_client(self, timeout):
+        """
+        Return a new docker-py client.
+
+        The client counts the bytes it transferred in its `transferred` attribute.
+
+        :param timeout: The client's timeout in seconds (`None` for no timeout).
+        """
+        client = Client(timeout=timeout, **self._client_kwargs)
+        client.stream_response = None
+        client.transferred = 0
+
+        def count_transferred(response, **kwargs):
+            client.transferred += len(response.request.body or '')
+            if kwargs.get('stream'):
+                client.stream_response = response  # kept to shut the connection down, see `ClosingStream.close`
+            else:
+                client.transferred += len(response.content)  # read anyway by requests right after the hook
+        client.hooks['response'].append(count_transferred)
+        return client
+
+    def execute(self, operation, args, kwargs):
+        """
+        Execute the client method `operation` with the configured timeout, bypassing the cache.
+
+        :param operation: The client method name.
+        :param args: The positional arguments for the method.
+        :param kwargs: The keyword arguments for the method.
+        """
+        timeout = self.get_timeout(operation)
+        if operation in self.STREAM_OPERATIONS or kwargs.get('stream') is True:
+            client = self.create_client(timeout)
+            try:
+                result = instrument_call(
+                    self.instrumentation, 'docker', operation, getattr(client, operation), args, kwargs
+                )
+            except Exception:
+                client.close()
+                raise
+            if not isinstance(result, types.GeneratorType):
+                client.close()
+                return result
+            stream = ClosingStream(result, client)
+            with self._lock:
+                self._streams.add(stream)
+            return stream
+        client = self.acquire()
+        try:
+            client.timeout = timeout
+            client.transferred = 0
+            return instrument_call(
+                self.instrumentation, 'docker', operation, getattr(client, operation), args, kwargs,
+                get_bytes=lambda: client.transferred
+            )
+        finally:
+            self.release(client)
+
+    def get_timeout(self, operation):
+        """
+        Return the timeout (in seconds) for the client method `operation`.
+
+        :param operation: The client method name (i.e. `inspect_container`).
+        """
+        return self.timeouts.get(operation, self.default_timeout)
+
+    def invalidate(self):
+        """
+        Drop all cached inspect results.
+        """
+        if self.inspect_cache is not None:
+            self.inspect_cache.invalidate()
+
+    def release(self, client):
+        """
+        Return a checked out client to the pool.
+
+        :param client: The client to return.
+        """
+        if self._closed:
+            client.close()
+        else:
+            self._idle.put(client)
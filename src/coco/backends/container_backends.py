@@ -1,13 +1,115 @@
 from base64 import standard_b64encode
+from coco.backends.circuit_breaker import CircuitBreaker
+from coco.backends.clients import DockerClientPool
+from coco.backends.events import CONTAINER_STATUS_DELETED, EVENT_KEY_ACTION, EVENT_KEY_TIME, ContainerStateWatcher
+from coco.backends.instrumentation import OUTCOME_ERROR, OUTCOME_NOT_FOUND, OUTCOME_OK, Instrumentation, instrument_call
+from coco.backends.jobs import Job, JobQueue
+from coco.backends.metrics import ContainerStatsSampler
+from coco.backends.schedulers import CpusetPacker, IdleContainerSuspender, PortAllocator
+from coco.backends.snapshots import SnapshotIndex, SnapshotManager, SnapshotRetentionPolicy
 from coco.contract.backends import *
 from coco.contract.errors import *
-from docker import Client, utils as docker_utils
+from collections import OrderedDict
+from copy import deepcopy
+from docker import utils as docker_utils
 from docker.errors import APIError as DockerError
 import json
+from multiprocessing.pool import ThreadPool
+import random
 import re
 import requests
+from requests.compat import urlencode
 from requests.exceptions import RequestException
+import threading
 import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON is used if not installed
+    msgpack = None
+
+
+"""
+Content types of the supported wire formats.
+"""
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_MSGPACK = 'application/x-msgpack'
+
+"""
+Keys under which container backends return the container's name and owner UID (if known).
+"""
+CONTAINER_KEY_NAME = 'name'
+CONTAINER_KEY_OWNER = 'owner'
+
+
+def decode_payload(body, content_type=None):
+    """
+    Decode a request or response body encoded with `encode_payload`.
+
+    :param body: The raw body.
+    :param content_type: The body's content type (JSON is assumed if unknown).
+    """
+    if (content_type or '').startswith(CONTENT_TYPE_MSGPACK):
+        if msgpack is None:
+            raise ValueError("MessagePack payload received but msgpack is not installed")
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except TypeError:  # msgpack < 0.5.2
+            return msgpack.unpackb(body, encoding='utf-8')
+    return json.loads(body)
+
+
+def encode_payload(data, accept=None):
+    """
+    Encode `data` in the best format accepted and return the body and its content type.
+
+    MessagePack is used if it is installed and listed in `accept`, JSON otherwise.
+    Used by the HTTP remote and the APIs serving it to negotiate the wire format.
+
+    :param data: The (JSON serializable) data to encode.
+    :param accept: The value of the peer's `Accept` header.
+    """
+    if msgpack is not None and CONTENT_TYPE_MSGPACK in (accept or ''):
+        # Python 2 strings would be packed as binary and decoded as bytes by the peer, pack them as text
+        return msgpack.packb(data, use_bin_type=str is not bytes), CONTENT_TYPE_MSGPACK
+    return json.dumps(data), CONTENT_TYPE_JSON
+
+
+def filter_containers(containers, only_running=False, status=None, owner=None, name_prefix=None, fields=None):
+    """
+    Return the containers matching all given filters, reduced to the requested fields.
+
+    Used by the backends (and HTTP APIs exposing them) to filter container lists before serialization.
+
+    :param containers: The containers as returned by `ContainerBackend.get_containers`.
+    :param only_running: If true, only running (and suspended) containers are returned.
+    :param status: Only return containers with this status.
+    :param owner: Only return containers owned by the user with this UID.
+    :param name_prefix: Only return containers whose name starts with this prefix (i.e. coco-u2500-).
+    :param fields: List (or comma-separated string) of keys to include. The PK is always included.
+    """
+    if isinstance(fields, basestring):
+        fields = fields.split(',')
+    running = (ContainerBackend.CONTAINER_STATUS_RUNNING, SuspendableContainerBackend.CONTAINER_STATUS_SUSPENDED)
+
+    filtered = []
+    for container in containers:
+        if only_running and container.get(ContainerBackend.CONTAINER_KEY_STATUS) not in running:
+            continue
+        if status is not None and container.get(ContainerBackend.CONTAINER_KEY_STATUS) != status:
+            continue
+        if owner is not None and container.get(CONTAINER_KEY_OWNER) != int(owner):
+            continue
+        if name_prefix is not None and not (container.get(CONTAINER_KEY_NAME) or '').startswith(name_prefix):
+            continue
+        if fields:
+            container = dict(
+                (key, value) for key, value in container.items()
+                if key in fields or key == ContainerBackend.KEY_PK
+            )
+        filtered.append(container)
+    return filtered
 
 
 class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
@@ -26,26 +128,220 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
     """
     CONTAINER_SNAPSHOT_NAME_PREFIX = 'snapshot-'
 
+    """
+    The prefix that is prepended to the name of temporary images created for cloning.
+    """
+    CLONE_IMAGE_NAME_PREFIX = 'for-clone-'
+
+    """
+    Key under which the seconds spent committing the source container of a clone are returned.
+    """
+    CONTAINER_KEY_CLONE_COMMIT_DURATION = 'commit_duration'
+
+    """
+    Key under which the port mappings of a created container (with the allocated external ports) are returned.
+    """
+    CONTAINER_KEY_PORTS = 'ports'
+
+    """
+    Key under which the job pushing a newly created image to the registry is referenced.
+    """
+    CONTAINER_IMAGE_KEY_PUSH_JOB = 'push_job'
+
+    """
+    Key under which the seconds a container was unavailable during a snapshot restore are returned.
+    """
+    CONTAINER_KEY_RESTORE_DOWNTIME = 'downtime'
+
+    """
+    Keys of the per-container results returned by the bulk operations (i.e. `delete_containers`).
+    """
+    BULK_RESULT_KEY_SUCCESS = 'success'
+    BULK_RESULT_KEY_ERROR = 'error'
+
+    """
+    Supported resource limit options and the Docker host config fields they are mapped to.
+    """
+    RESOURCE_LIMITS = {
+        'mem_limit': 'Memory',
+        'memswap_limit': 'MemorySwap',
+        'cpu_shares': 'CpuShares',
+        'cpu_period': 'CpuPeriod',
+        'cpu_quota': 'CpuQuota',
+        'cpuset': 'CpusetCpus'
+    }
+
+    """
+    Docker container events that (may) change a container's state and are reported by `get_container_events`.
+    """
+    CONTAINER_EVENTS = ('create', 'start', 'restart', 'die', 'stop', 'pause', 'unpause', 'rename', 'destroy')
+
+    """
+    Labels attached to the containers and images created by the backend, used to filter listings on the daemon.
+    """
+    LABEL_MANAGED = 'coco.managed'
+    LABEL_OWNER = 'coco.owner'
+    LABEL_SNAPSHOT = 'coco.snapshot'
+
+    """
+    docker-py client methods expected to return quickly (`short_timeout`) and to take long (`long_timeout`).
+    """
+    SHORT_CLIENT_OPERATIONS = ('containers', 'images', 'info', 'inspect_container', 'inspect_image', 'version')
+    LONG_CLIENT_OPERATIONS = ('build', 'commit', 'pull', 'push')
+
     def __init__(self, base_url='unix://var/run/docker.sock', version=None,
-                 registry=None
-                 ):
+                 registry=None, warm_images=None, warm_interval=300,
+                 push_workers=2, push_retries=2, snapshot_retention=None, snapshot_index_ttl=300,
+                 bulk_workers=8, idle_suspend=None, stats_max_age=5, stats_interval=None,
+                 resource_limits=None, cpuset_packing=None, prefetch_workers=4, prefetch_registry_workers=2,
+                 job_workers=4, client_pool_size=4, short_timeout=10, timeout=120, long_timeout=600,
+                 inspect_ttl=1, label_filters=False, port_ranges=None, instrumentation=None):
         """
         Initialize a new Docker container backend.
 
         :param base_url: The URL or unix path to the Docker API endpoint.
         :param version: The Docker API version number (see docker version).
         :param registry: If set, created images will be pushed to this registery.
-        """
+        :param warm_images: List of image PKs to pull from the registry in the background right away.
+        :param warm_interval: Seconds after which a pulled image is refreshed from the registry (in the background).
+        :param push_workers: Maximum number of images pushed to the registry concurrently.
+        :param push_retries: How many times a failed push is retried.
+        :param snapshot_retention: If set, snapshots are pruned in the background. Dictionary with the
+                                   `SnapshotRetentionPolicy` arguments and the prune `interval` in seconds.
+        :param snapshot_index_ttl: Seconds after which the in-memory snapshot index is rebuilt from Docker.
+        :param bulk_workers: Maximum number of containers processed concurrently by the bulk operations.
+        :param idle_suspend: If set, idle containers are suspended in the background.
+                             Dictionary with the `IdleContainerSuspender` arguments.
+        :param stats_max_age: Seconds a container's resource usage sample is served from the cache.
+        :param stats_interval: If set, all running containers are sampled in the background
+                               every `stats_interval` seconds.
+        :param resource_limits: Dictionary of resource limits (see `RESOURCE_LIMITS`) per image PK.
+                                The limits under `*` apply to all images.
+        :param cpuset_packing: If set, containers without an explicit cpuset are pinned to the least loaded cores.
+                               Dictionary with the `CpusetPacker` arguments.
+        :param prefetch_workers: Maximum number of images prefetched concurrently.
+        :param prefetch_registry_workers: Maximum number of images prefetched concurrently from the same registry.
+        :param job_workers: Maximum number of operations requested as job (`as_job`) running concurrently.
+        :param client_pool_size: Maximum number of concurrent connections to the Docker API.
+        :param short_timeout: Seconds to wait for inspect and list calls to the Docker API.
+        :param timeout: Seconds to wait for other calls to the Docker API.
+        :param long_timeout: Seconds to wait for commits, pushes and pulls.
+        :param inspect_ttl: Seconds container and image inspects are cached (`None` disables the cache).
+                            The cache is invalidated by every change made through the backend.
+        :param label_filters: If true, containers and snapshots are listed by their labels (see `LABEL_MANAGED`).
+                              Only enable once all containers and snapshots on the host carry the labels,
+                              the others are no longer listed.
+        :param port_ranges: If set, list of (first, last) host port ranges. Port mappings without an external port
+                            get one allocated from these ranges and conflicts are detected before creating a container.
+        :param instrumentation: The `Instrumentation` to report the calls to the Docker API to.
+        """
+        self.instrumentation = instrumentation or Instrumentation()
+        timeouts = dict((operation, short_timeout) for operation in self.SHORT_CLIENT_OPERATIONS)
+        timeouts.update((operation, long_timeout) for operation in self.LONG_CLIENT_OPERATIONS)
+        timeouts['events'] = None  # long-lived subscription
         try:
-            self._client = Client(
+            self._client = DockerClientPool(
+                size=client_pool_size,
+                timeouts=timeouts,
+                default_timeout=timeout,
+                cache_ttl=inspect_ttl,
+                instrumentation=self.instrumentation,
                 base_url=base_url,
-                timeout=600,
                 version=version
             )
             self._registry = registry
         except Exception as ex:
             raise ConnectionError(ex)
 
+        self._warm_images = {}  # image PK -> timestamp of the last successful pull
+        self._warm_images_pending = set()
+        self._warm_images_lock = threading.Lock()
+        self._warm_interval = warm_interval
+        self._jobs = JobQueue(workers=job_workers, retries=0)
+        self._push_jobs = JobQueue(workers=push_workers, retries=push_retries)
+        self._prefetch_jobs = JobQueue(workers=1, retries=1)
+        self._prefetch_workers = prefetch_workers
+        self._prefetch_registry_semaphores = {}
+        self._prefetch_registry_workers = prefetch_registry_workers
+        self._snapshot_index = SnapshotIndex(ttl=snapshot_index_ttl)
+        self._bulk_workers = bulk_workers
+        self._label_filters = label_filters
+        self._resource_limits = resource_limits or {}
+        self._cpuset_packer = None
+        if cpuset_packing is not None:
+            self._cpuset_packer = CpusetPacker(self, **cpuset_packing)
+        self._port_allocator = None
+        if port_ranges is not None:
+            self._port_allocator = PortAllocator(self, port_ranges)
+        if self._registry and warm_images:
+            for image in warm_images:
+                self.refresh_container_image(image)
+
+        self.snapshot_manager = None
+        if snapshot_retention is not None:
+            retention = dict(snapshot_retention)
+            interval = retention.pop('interval', 3600)
+            self.snapshot_manager = SnapshotManager(self, SnapshotRetentionPolicy(**retention), interval)
+            self.snapshot_manager.start()
+
+        self.container_watcher = None
+        self._stats_sampler = ContainerStatsSampler(self, max_age=stats_max_age, interval=stats_interval)
+        self._stats_sampler.start()
+
+        self.idle_suspender = None
+        if idle_suspend is not None:
+            self.idle_suspender = IdleContainerSuspender(self, **idle_suspend)
+            self.idle_suspender.start()
+
+    def bulk_apply(self, func, containers):
+        """
+        Apply `func` to all `containers` using up to `bulk_workers` threads.
+
+        Return one result per container (in the same order) telling whether the operation succeeded
+        and if not, the name of the error raised.
+
+        :param func: Callable taking a container's inspect data.
+        :param containers: List of container identifiers.
+        """
+        def apply(container):
+            result = {
+                ContainerBackend.KEY_PK: container,
+                self.BULK_RESULT_KEY_SUCCESS: True,
+                self.BULK_RESULT_KEY_ERROR: None
+            }
+            inspect = None
+            try:
+                inspect = self.inspect_container_or_fail(container)
+                func(inspect)
+            except Exception as ex:
+                result[self.BULK_RESULT_KEY_SUCCESS] = False
+                result[self.BULK_RESULT_KEY_ERROR] = ex.__class__.__name__
+            if inspect is not None:
+                self.refresh_watched_container(inspect.get('Id'))
+            return result
+
+        if not containers:
+            return []
+        pool = ThreadPool(min(self._bulk_workers, len(containers)))
+        try:
+            return pool.map(self.instrumentation.wrap(apply), containers)
+        finally:
+            pool.close()
+
+    def close(self):
+        """
+        Stop all background threads of the backend and close its connections to the Docker daemon
+        (including the event stream of `container_watcher`).
+
+        Jobs already submitted are still executed. The backend must not be used afterwards.
+        """
+        for component in (self.container_watcher, self.idle_suspender, self.snapshot_manager, self._stats_sampler):
+            if component is not None:
+                component.stop()
+        for queue in (self._jobs, self._push_jobs, self._prefetch_jobs):
+            queue.close()
+        self._client.close()
+
     def container_exists(self, container, **kwargs):
         """
         :inherit.
@@ -106,17 +402,59 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         except Exception as ex:
             raise ContainerBackendError(ex)
 
+    def container_image_is_current(self, image):
+        """
+        Return true if `image` exists locally with the same digest as in its registry.
+
+        Returns false if the registry digest cannot be determined.
+
+        :param image: The image PK (i.e. 192.168.0.1:5000/coco/base-ldap:latest).
+        """
+        try:
+            local = self._client.inspect_image(image)
+        except DockerError as ex:
+            if ex.response.status_code == requests.codes.not_found:
+                return False
+            raise ContainerBackendError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        digest = self.get_registry_image_digest(image)
+        return digest is not None and any(d.endswith('@' + digest) for d in local.get('RepoDigests') or [])
+
     def container_snapshot_exists(self, snapshot, **kwargs):
         """
         :inherit.
         """
+        if self.get_container_snapshot_index().get(snapshot) is not None:
+            return True
         return self.container_image_exists(snapshot, **kwargs)
 
     def create_container(self, username, uid, name, ports, volumes,
                          cmd=None, base_url=None, image=None, clone_of=None, **kwargs):
         """
         :inherit.
+
+        Resource limits (see `RESOURCE_LIMITS`) can be passed as keyword arguments and override
+        the ones configured for the image.
+
+        When cloning, the source container is only committed if its writable layer contains changes,
+        otherwise the clone is created from the same image. The temporary clone image is untagged
+        right after the clone was created and removed once its last clone is deleted.
+        The time spent committing is returned under `CONTAINER_KEY_CLONE_COMMIT_DURATION`.
+
+        If port ranges are configured, external ports are reserved before the container is created
+        and port mappings without an external port get a free one allocated. The resulting port
+        mappings are returned under `CONTAINER_KEY_PORTS`.
+
+        :param as_job: If true, the container is created in the background and the job is returned (see `get_job`).
         """
+        if kwargs.pop('as_job', False):
+            return self.submit_job(
+                'create container ' + name, self.create_container, username, uid, name, ports, volumes,
+                cmd=cmd, base_url=base_url, image=image, clone_of=clone_of, **kwargs
+            )
+
         name = "%su%i-%s" % (self.CONTAINER_NAME_PREFIX, uid, name)
         if self.container_exists(name):
             raise ContainerBackendError("A container with that name already exists")
@@ -124,10 +462,33 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
             raise ContainerNotFoundError("Base container for the clone does not exist")
 
         # cloning
+        clone_image = None
+        commit_duration = 0
         if clone_of:
-            # TODO: some way to ensure no regular image is created with that name
-            image = self.create_container_image(clone_of, 'for-clone-' + name + '-at-' + str(int(time.time())), push=False)
-            image_pk = image.get(ContainerBackend.KEY_PK)
+            try:
+                source = self._client.inspect_container(clone_of)
+                changes = self._client.diff(clone_of)
+            except Exception as ex:
+                raise ContainerBackendError(ex)
+            if changes:
+                commit_start = time.time()
+                # TODO: some way to ensure no regular image is created with that name
+                clone_image = self.create_container_image(
+                    clone_of,
+                    self.CLONE_IMAGE_NAME_PREFIX + name + '-at-' + str(int(time.time())),
+                    push=False
+                ).get(ContainerBackend.KEY_PK)
+                commit_duration = time.time() - commit_start
+                try:
+                    image_pk = self._client.inspect_image(clone_image).get('Id')
+                except Exception as ex:
+                    self.untag_clone_image(clone_image)
+                    raise ContainerBackendError(ex)
+            else:  # nothing to commit, start from the same image
+                image_pk = source.get('Image')
+            image = {
+                ContainerBackend.KEY_PK: image_pk
+            }
         else:
             image_pk = image
         # bind mounts
@@ -140,6 +501,24 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
             volumes
         )
         # port mappings
+        reserved_ports = None
+        if self._port_allocator is not None:
+            explicit = [int(port.get(ContainerBackend.PORT_MAPPING_KEY_EXTERNAL))
+                        for port in ports if port.get(ContainerBackend.PORT_MAPPING_KEY_EXTERNAL)]
+            try:
+                allocated = iter(self._port_allocator.reserve(explicit, len(ports) - len(explicit)))
+            except ContainerBackendError as ex:
+                if clone_image is not None:
+                    self.untag_clone_image(clone_image)
+                raise ex
+            ports = [
+                dict(port, **{
+                    ContainerBackend.PORT_MAPPING_KEY_EXTERNAL:
+                        port.get(ContainerBackend.PORT_MAPPING_KEY_EXTERNAL) or next(allocated)
+                })
+                for port in ports
+            ]
+            reserved_ports = [int(port.get(ContainerBackend.PORT_MAPPING_KEY_EXTERNAL)) for port in ports]
         port_mappings = {}
         for port in ports:
             port_mappings[port.get(ContainerBackend.PORT_MAPPING_KEY_INTERNAL)] = (
@@ -147,21 +526,22 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
                 port.get(ContainerBackend.PORT_MAPPING_KEY_EXTERNAL)
             )
 
+        # resource limits
+        limits = self.get_resource_limits(image_pk if clone_of is None else None, **kwargs)
+        cores = None
+        if self._cpuset_packer is not None and limits.get('cpuset') is None:
+            cores = self._cpuset_packer.reserve()
+            limits['cpuset'] = ','.join(str(core) for core in cores)
+        host_config = docker_utils.create_host_config(
+            binds=binds,
+            port_bindings=port_mappings
+        )
+        host_config.update(self.make_resource_host_config(limits))
+
         container = None
         try:
             if self._registry and not clone_of:
-                parts = image_pk.split('/')
-                if len(parts) > 2:  # includes registry
-                    repository = parts[0] + '/' + parts[1] + '/' + parts[2].split(':')[0]
-                    tag = parts[2].split(':')[1]
-                else:
-                    repository = image_pk.split(':')[0]
-                    tag = image_pk.split(':')[1]
-                # FIXME: should be done automatically
-                self._client.pull(
-                    repository=repository,
-                    tag=tag
-                )
+                self.ensure_container_image_pulled(image_pk)
 
             container = self._client.create_container(
                 image=image_pk,
@@ -169,34 +549,61 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
                 name=name,
                 ports=[port.get(ContainerBackend.PORT_MAPPING_KEY_INTERNAL) for port in ports],
                 volumes=mount_points,
-                host_config=docker_utils.create_host_config(
-                    binds=binds,
-                    port_bindings=port_mappings
-                ),
+                host_config=host_config,
                 environment={
                     'OWNER': username,
                     'BASE_URL': base_url
                 },
+                labels={
+                    self.LABEL_MANAGED: 'true',
+                    self.LABEL_OWNER: str(uid)
+                },
                 detach=True
             )
+            if cores is not None:
+                self._cpuset_packer.bind(container.get('Id'), cores)
+                cores = None
+            if reserved_ports is not None:
+                self._port_allocator.bind(container.get('Id'), reserved_ports)
+                reserved_ports = None
             container = self.get_container(container.get('Id'))
+            container[self.CONTAINER_KEY_PORTS] = ports
             self.start_container(container.get(ContainerBackend.KEY_PK))
         except Exception as ex:
             raise ContainerBackendError(ex)
+        finally:
+            if cores is not None:
+                self._cpuset_packer.free(cores)
+            if reserved_ports is not None:
+                self._port_allocator.free(reserved_ports)
+            if clone_image is not None:
+                self.untag_clone_image(clone_image)
 
         if clone_of is None:
             ret = container
         else:
             ret = {
                 ContainerBackend.CONTAINER_KEY_CLONE_CONTAINER: container,
-                ContainerBackend.CONTAINER_KEY_CLONE_IMAGE: image
+                ContainerBackend.CONTAINER_KEY_CLONE_IMAGE: image,
+                self.CONTAINER_KEY_CLONE_COMMIT_DURATION: commit_duration
             }
         return ret
 
     def create_container_image(self, container, name, **kwargs):
         """
         :inherit.
+
+        The image is pushed to the registry (if any) in the background, right after the commit
+        finished. The push job's PK is returned under `CONTAINER_IMAGE_KEY_PUSH_JOB`,
+        see `get_push_job`.
+
+        :param push: If false, the image is not pushed to the registry.
+        :param async_push: If false, wait for the push to finish before returning.
+        :param as_job: If true, the image is committed in the background and the job is returned (see `get_job`).
         """
+        if kwargs.pop('as_job', False):
+            return self.submit_job('create image ' + name, self.create_container_image, container, name, **kwargs)
+
         if not self.container_exists(container):
             raise ContainerNotFoundError
         full_image_name = self.get_internal_container_image_name(container, name)
@@ -218,33 +625,59 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
             self._client.commit(
                 container=container,
                 repository=commit_name,
-                tag=tag
+                tag=tag,
+                conf={
+                    'Labels': {
+                        # set explicitly, images inherit the labels of the container's image
+                        self.LABEL_SNAPSHOT: 'true' if name.startswith(self.CONTAINER_SNAPSHOT_NAME_PREFIX) else 'false'
+                    }
+                }
             )
-            if self._registry and kwargs.get('push', True):
-                self._client.push(
-                    repository=full_image_name,
-                    stream=False,
-                    insecure_registry=True  # TODO: constructor?
-                )
-            return {
-                ContainerBackend.KEY_PK: full_image_name
-            }
         except Exception as ex:
-            print ex
             raise ContainerBackendError(ex)
 
+        image = {
+            ContainerBackend.KEY_PK: full_image_name
+        }
+        if self._registry and kwargs.get('push', True):
+            job = self._push_jobs.submit('push ' + full_image_name, self.push_container_image, full_image_name)
+            image[self.CONTAINER_IMAGE_KEY_PUSH_JOB] = job.pk
+            if kwargs.get('async_push', True) is False:
+                job.wait()
+                if job.error is not None:
+                    raise ContainerBackendError(job.error)
+        return image
+
     def create_container_snapshot(self, container, name, **kwargs):
         """
         :inherit.
+
+        :param as_job: If true, the snapshot is taken in the background and the job is returned (see `get_job`).
         """
-        return self.create_container_image(container, self.CONTAINER_SNAPSHOT_NAME_PREFIX + name, push=False)
+        if kwargs.pop('as_job', False):
+            return self.submit_job('create snapshot ' + name, self.create_container_snapshot, container, name)
+
+        snapshot = self.create_container_image(container, self.CONTAINER_SNAPSHOT_NAME_PREFIX + name, push=False)
+        pk = snapshot.get(ContainerBackend.KEY_PK)
+        try:
+            image = self._client.inspect_image(pk)
+            self._snapshot_index.add({
+                'Id': image.get('Id'),
+                'RepoTags': [pk],
+                'Created': int(time.time()),
+                'Size': image.get('Size', 0),
+                'VirtualSize': image.get('VirtualSize', 0)
+            })
+        except Exception:
+            self._snapshot_index.invalidate()
+        return snapshot
 
     def delete_container(self, container, **kwargs):
         """
         :inherit.
         """
-        if not self.container_exists(container):
-            raise ContainerNotFoundError
+        inspect = self.inspect_container_or_fail(container)
+        container_id = inspect.get('Id')  # reservations are held by ID
 
         try:
             if self.container_is_suspended(container):
@@ -255,7 +688,16 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
             pass
 
         try:
-            return self._client.remove_container(container=container, force=True)
+            removed = self._client.remove_container(container=container, force=True)
+            if self._cpuset_packer is not None:
+                self._cpuset_packer.release(container_id)
+            if self._port_allocator is not None:
+                self._port_allocator.release(container_id)
+            self.refresh_watched_container(container_id)
+            image = inspect.get('Image')
+            if image and (inspect.get('Config') or {}).get('Image') == image:  # created by ID, i.e. a clone
+                self.remove_clone_source_image(image)
+            return removed
         except DockerError as ex:
             if ex.response.status_code == requests.codes.not_found:
                 raise ContainerNotFoundError
@@ -266,12 +708,17 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
     def delete_container_image(self, image, **kwargs):
         """
         :inherit.
+
+        :param force: If false, images in use by a container are not removed (default: true).
         """
         if not self.container_image_exists(image):
             raise ContainerImageNotFoundError
 
         try:
-            self._client.remove_image(image=image, force=True)
+            self._client.remove_image(image=image, force=kwargs.get('force', True))
+            self._snapshot_index.remove(image)
+            with self._warm_images_lock:
+                self._warm_images.pop(image, None)
         except DockerError as ex:
             if ex.response.status_code == requests.codes.not_found:
                 raise ContainerImageNotFoundError
@@ -292,6 +739,47 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         except Exception as ex:
             raise ContainerBackendError(ex)
 
+    def delete_containers(self, containers, **kwargs):
+        """
+        Delete all `containers` (running, suspended or not) and return the per-container results.
+
+        :param containers: List of container identifiers.
+        """
+        def delete(container):
+            if container.get('State', {}).get('Paused') is True:
+                self._client.unpause(container=container.get('Id'))
+            self._client.remove_container(container=container.get('Id'), force=True)
+            if self._cpuset_packer is not None:
+                self._cpuset_packer.release(container.get('Id'))
+            if self._port_allocator is not None:
+                self._port_allocator.release(container.get('Id'))
+
+        return self.bulk_apply(self.translate_docker_errors(delete), containers)
+
+    def ensure_container_image_pulled(self, image):
+        """
+        Make sure `image` is available locally, pulling it from the registry only if required.
+
+        Images pulled before are used as they are. If the last pull is older than the warm interval,
+        a refresh is triggered in the background so the caller does not have to wait for the registry.
+        If the pull fails (i.e. the registry is unreachable) but the image exists locally, the local image
+        is used and the pull is retried in the background once the warm interval passed.
+
+        :param image: The image PK to ensure is pulled.
+        """
+        with self._warm_images_lock:
+            pulled_at = self._warm_images.get(image)
+        if pulled_at is None:
+            try:
+                self.pull_container_image(image)
+            except ContainerBackendError:
+                if not self.container_image_exists(image):
+                    raise
+                with self._warm_images_lock:
+                    self._warm_images[image] = time.time()
+        elif time.time() - pulled_at > self._warm_interval:
+            self.refresh_container_image(image)
+
     def exec_in_container(self, container, cmd, **kwargs):
         """
         :inherit.
@@ -347,13 +835,27 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         except Exception as ex:
             raise ContainerBackendError(ex)
 
+    def get_container_filters(self, owner=None):
+        """
+        Return the Docker filters selecting the containers created by this backend
+        (`None` if label filters are disabled).
+
+        :param owner: If set, only the containers of the user with this UID are selected.
+        """
+        if not self._label_filters:
+            return None
+        labels = [self.LABEL_MANAGED]
+        if owner is not None:
+            labels.append('%s=%s' % (self.LABEL_OWNER, owner))
+        return {'label': labels}
+
     def get_container_images(self, **kwargs):
         """
         :inherit.
         """
         try:
             images = []
-            for image in self._client.images():
+            for image in self._client.images(filters={'dangling': False}):
                 if not self.is_container_snapshot(image):
                     images.append({
                         ContainerBackend.KEY_PK: image.get('RepoTags')[0]
@@ -386,14 +888,150 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         except Exception as ex:
             raise ContainerBackendError(ex)
 
+    def get_container_cpusets(self):
+        """
+        Return the cpuset (i.e. `0-1,3`) of every container that is pinned to specific cores.
+        """
+        try:
+            cpusets = {}
+            for container in self._client.containers(all=True, filters=self.get_container_filters()):
+                container = self._client.inspect_container(container.get('Id'))
+                cpuset = container.get('HostConfig', {}).get('CpusetCpus') or container.get('Config', {}).get('Cpuset')
+                if cpuset:
+                    cpusets[container.get('Id')] = cpuset
+            return cpusets
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+    def get_container_events(self, since=None, **kwargs):
+        """
+        Subscribe to the state changes of all containers and return a (blocking) iterator over them.
+
+        The subscription is established right away, the iterator yields one event per state change
+        with the container's PK, status (`CONTAINER_STATUS_DELETED` once removed), name and owner
+        as well as the underlying Docker action and its timestamp.
+
+        :param since: If set, events since this UNIX timestamp are replayed first.
+        """
+        try:
+            stream = self._client.events(since=since, decode=True)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        def events():
+            try:
+                for event in stream:
+                    action = event.get('status') or event.get('Action')
+                    if event.get('Type', 'container') != 'container' or action not in self.CONTAINER_EVENTS:
+                        continue
+                    if 'from' not in event and 'Type' not in event:
+                        continue  # image event of an old API version
+                    pk = event.get('id')
+                    if action == 'destroy':
+                        container = {
+                            ContainerBackend.KEY_PK: pk,
+                            ContainerBackend.CONTAINER_KEY_STATUS: CONTAINER_STATUS_DELETED
+                        }
+                    else:
+                        self._client.invalidate()  # changed outside of the backend
+                        try:
+                            inspect = self._client.inspect_container(pk)
+                        except DockerError as ex:
+                            if ex.response.status_code == requests.codes.not_found:
+                                continue  # already removed, the destroy event follows
+                            raise ex
+                        labels = inspect.get('Config', {}).get('Labels') or {}
+                        if self._label_filters and self.LABEL_MANAGED not in labels:
+                            continue  # not created by this backend
+                        name = inspect.get('Name').lstrip('/')
+                        container = {
+                            ContainerBackend.KEY_PK: pk,
+                            ContainerBackend.CONTAINER_KEY_STATUS: self.make_container_status(inspect),
+                            CONTAINER_KEY_NAME: name,
+                            CONTAINER_KEY_OWNER: self.get_container_owner(name)
+                        }
+                    container[EVENT_KEY_ACTION] = action
+                    container[EVENT_KEY_TIME] = event.get('time')
+                    yield container
+            except Exception as ex:
+                raise ContainerBackendError(ex)
+            finally:
+                stream.close()
+
+        return events()
+
+    def get_container_owner(self, name):
+        """
+        Return the UID of the user owning the container named `name` (`None` if not created by this backend).
+
+        :param name: The container's name (i.e. coco-u2500-ipython).
+        """
+        match = re.match(r'^/?' + self.CONTAINER_NAME_PREFIX + r'u(\d+)-', name or '')
+        return int(match.group(1)) if match else None
+
+    def get_container_ports(self):
+        """
+        Return the host ports bound by every container (including the ones not created by this backend).
+        """
+        try:
+            ports = {}
+            for container in self._client.containers(all=True):
+                container = self._client.inspect_container(container.get('Id'))
+                bindings = (container.get('HostConfig') or {}).get('PortBindings') or {}
+                bindings = bindings.values() + ((container.get('NetworkSettings') or {}).get('Ports') or {}).values()
+                host_ports = set(
+                    int(binding.get('HostPort')) for binding in sum([b or [] for b in bindings], [])
+                    if binding.get('HostPort')
+                )
+                if host_ports:
+                    ports[container.get('Id')] = sorted(host_ports)
+            return ports
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
     def get_container_snapshot(self, snapshot, **kwargs):
         """
         :inherit.
         """
-        if not self.container_snapshot_exists(snapshot):
+        image = self.get_container_snapshot_index().get(snapshot)
+        if image is None and self.container_image_exists(snapshot):
+            # created since the index was built
+            self._snapshot_index.invalidate()
+            image = self.get_container_snapshot_index().get(snapshot)
+        if image is None:
             raise ContainerSnapshotNotFoundError
 
-        return next(sh for sh in self.get_container_snapshots() if sh.get(ContainerBackend.KEY_PK).startswith(snapshot))
+        return self.make_snapshot_contract_conform(image)
+
+    def get_container_snapshot_index(self):
+        """
+        Return the snapshot index, (re)building it from a single image listing if stale.
+        """
+        if self._snapshot_index.is_stale():
+            try:
+                images = self._client.images(filters=self.get_snapshot_filters())
+                self._snapshot_index.load([image for image in images if self.is_container_snapshot(image)])
+            except Exception as ex:
+                raise ContainerBackendError(ex)
+        return self._snapshot_index
+
+    def get_cpu_count(self):
+        """
+        Return the number of CPU cores available to the Docker daemon.
+        """
+        try:
+            return self._client.info().get('NCPU')
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+    def get_inspect_stats(self):
+        """
+        Return the number of container and image inspects served from the cache (hits)
+        and from the Docker daemon (misses).
+        """
+        if self._client.inspect_cache is None:
+            return {'hits': 0, 'misses': 0}
+        return self._client.inspect_cache.get_stats()
 
     def get_internal_container_image_name(self, container, name):
         """
@@ -429,32 +1067,205 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         :inherit.
         """
+        return [self.make_snapshot_contract_conform(image) for image in self.get_container_snapshot_index().all()]
+
+    def get_container_snapshot_lineages(self):
+        """
+        Return all snapshots grouped by the container they were taken from.
+
+        The keys are the internal image repositories (one per container, see `get_internal_container_image_name`),
+        the values lists of snapshots with their creation timestamp and size in bytes, newest first.
+        """
+        index = self.get_container_snapshot_index()
+        lineages = {}
+        for image in index.all():
+            pk = image.get('RepoTags')[0]
+            lineages.setdefault(index.get_repository(pk), []).append({
+                ContainerBackend.KEY_PK: pk,
+                'created': image.get('Created', 0),
+                'size': image.get('Size', 0)
+            })
+        for snapshots in lineages.values():
+            snapshots.sort(key=lambda sh: sh.get('created'), reverse=True)
+        return lineages
+
+    def get_container_stats(self, container, **kwargs):
+        """
+        Return the latest resource usage sample (CPU, memory, block I/O and network) of `container`.
+
+        See `ContainerStatsSampler` for the returned keys.
+
+        :param container: The container identifier.
+        """
+        return self._stats_sampler.get(container)
+
+    def get_containers(self, only_running=False, **kwargs):
+        """
+        :inherit.
+
+        Accepts the filters of `filter_containers` as keyword arguments. Name and owner filters are
+        applied before the containers' states are inspected. With label filters enabled, only containers
+        created by this backend are listed and the owner filter is applied by the daemon.
+        """
+        owner = kwargs.get('owner')
+        name_prefix = kwargs.get('name_prefix')
+        if self.container_watcher is not None and self.container_watcher.is_synced():
+            return filter_containers(
+                self.container_watcher.get_all(), only_running=only_running, status=kwargs.get('status'),
+                owner=owner, name_prefix=name_prefix, fields=kwargs.get('fields')
+            )
+
         try:
-            snapshots = []
-            for image in self._client.images():
-                if self.is_container_snapshot(image):
-                    snapshots.append(self.make_snapshot_contract_conform(image))
-            return snapshots
+            listed = []
+            for container in self._client.containers(all=(not only_running), filters=self.get_container_filters(owner)):
+                name = (container.get('Names') or ['/'])[0].lstrip('/')
+                if not filter_containers([{
+                    CONTAINER_KEY_NAME: name,
+                    CONTAINER_KEY_OWNER: self.get_container_owner(name)
+                }], owner=owner, name_prefix=name_prefix):
+                    continue
+                listed.append(container.get('Id'))
+            containers = [
+                self.make_container_contract_conform(container)
+                for container in self.inspect_containers(listed) if container is not None
+            ]
         except Exception as ex:
             raise ContainerBackendError(ex)
 
-    def get_containers(self, only_running=False, **kwargs):
+        return filter_containers(containers, status=kwargs.get('status'), fields=kwargs.get('fields'))
+
+    def get_containers_snapshots(self, container, **kwargs):
         """
         :inherit.
         """
+        repository = self.get_internal_container_image_name(container, '').rsplit(':', 1)[0]
+        return [
+            self.make_snapshot_contract_conform(image)
+            for image in self.get_container_snapshot_index().for_repository(repository)
+        ]
+
+    def get_containers_stats(self, **kwargs):
+        """
+        Return the latest resource usage samples of all running containers.
+        """
+        return self._stats_sampler.get_all()
+
+    def get_job(self, job, wait=None, **kwargs):
+        """
+        Return the state of a background job (see `Job.to_dict`).
+
+        Operations requested `as_job`, image pushes and prefetches are looked up.
+
+        :param job: The job PK.
+        :param wait: If set, wait up to this many seconds for the job to finish before returning its state.
+        """
+        found = self.get_job_or_fail(job)
+        if wait:
+            found.wait(float(wait))
+        return found.to_dict()
+
+    def get_job_or_fail(self, job):
+        """
+        Return the `Job` with the PK `job` (an operation requested `as_job`, an image push or prefetch).
+
+        :param job: The job PK.
+        """
+        for queue in (self._jobs, self._push_jobs, self._prefetch_jobs):
+            found = queue.get(job)
+            if found is not None:
+                return found
+        raise ContainerBackendError("No such job")
+
+    def get_node_load(self, **kwargs):
+        """
+        Return the load of the node the Docker daemon runs on.
+
+        The result contains the number of CPUs, the total and used memory (in bytes) and the number
+        of running containers, as used to place containers across nodes (see `NodeSelector`).
+        Everything but the used memory comes from a single `info` call. The used memory is summed up
+        from the stats sampler's cache without sampling any container, so it is only complete if all
+        running containers are sampled in the background (see `stats_interval`).
+        """
         try:
-            containers = []
-            for container in self._client.containers(all=(not only_running)):
-                containers.append(self.make_container_contract_conform(container))
-            return containers
+            info = self._client.info()
         except Exception as ex:
             raise ContainerBackendError(ex)
 
-    def get_containers_snapshots(self, container, **kwargs):
+        return {
+            'cpus': info.get('NCPU'),
+            'memory_total': info.get('MemTotal'),
+            'memory_used': sum(sample.get('memory_usage', 0) for sample in self._stats_sampler.get_cached()),
+            'containers': info.get('ContainersRunning', 0)
+        }
+
+    def get_prefetch_job(self, job, **kwargs):
+        """
+        Return the state of an image prefetch job.
+
+        :param job: The job PK as returned by `prefetch_container_images`.
+        """
+        prefetch_job = self._prefetch_jobs.get(job)
+        if prefetch_job is None:
+            raise ContainerBackendError("No such prefetch job")
+        return prefetch_job.to_dict()
+
+    def get_push_job(self, job):
+        """
+        Return the state of the job pushing an image to the registry.
+
+        :param job: The job PK as returned by `create_container_image`.
+        """
+        push_job = self._push_jobs.get(job)
+        if push_job is None:
+            raise ContainerBackendError("No such push job")
+        return push_job.to_dict()
+
+    def get_registry_image_digest(self, image):
+        """
+        Return the digest of `image` in its (v2) registry or `None` if it cannot be determined.
+
+        :param image: The image PK including the registry (i.e. 192.168.0.1:5000/coco/base-ldap:latest).
+        """
+        parts = image.split('/')
+        if len(parts) < 3:  # no registry
+            return None
+        repository, _, tag = '/'.join(parts[1:]).partition(':')
+
+        def head():
+            response = requests.head(
+                url='http://%s/v2/%s/manifests/%s' % (parts[0], repository, tag or 'latest'),
+                headers={'Accept': 'application/vnd.docker.distribution.manifest.v2+json'},
+                timeout=10
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            response = instrument_call(self.instrumentation, 'docker_registry', 'HEAD /v2/<id>/manifests/<id>', head)
+        except RequestException:
+            return None
+        return response.headers.get('Docker-Content-Digest')
+
+    def get_resource_limits(self, image, **kwargs):
+        """
+        Return the resource limits that apply to a container created from `image`.
+
+        :param image: The image PK (`None` if only the defaults should apply).
+        :param kwargs: Per-container limits overriding the configured ones.
+        """
+        limits = dict(self._resource_limits.get('*', {}))
+        limits.update(self._resource_limits.get(image, {}))
+        limits.update((key, value) for key, value in kwargs.items() if key in self.RESOURCE_LIMITS and value is not None)
+        return limits
+
+    def get_snapshot_filters(self):
         """
-        TODO: implement.
+        Return the Docker filters selecting the snapshot images.
         """
-        raise NotImplementedError
+        filters = {'dangling': False}
+        if self._label_filters:
+            filters['label'] = self.LABEL_SNAPSHOT + '=true'
+        return filters
 
     def get_status(self):
         """
@@ -466,6 +1277,43 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         except Exception:
             return ContainerBackend.BACKEND_STATUS_ERROR
 
+    def inspect_containers(self, containers):
+        """
+        Inspect all `containers` using up to `bulk_workers` threads and return their inspect data.
+
+        `None` is returned for containers that do not exist (anymore).
+
+        :param containers: List of container identifiers.
+        """
+        def inspect(container):
+            try:
+                return self.inspect_container_or_fail(container)
+            except ContainerNotFoundError:
+                return None
+
+        if not containers:
+            return []
+        pool = ThreadPool(min(self._bulk_workers, len(containers)))
+        try:
+            return pool.map(self.instrumentation.wrap(inspect), containers)
+        finally:
+            pool.close()
+
+    def inspect_container_or_fail(self, container):
+        """
+        Return the inspect data of `container` with a single API call.
+
+        :param container: The container identifier.
+        """
+        try:
+            return self._client.inspect_container(container)
+        except DockerError as ex:
+            if ex.response.status_code == requests.codes.not_found:
+                raise ContainerNotFoundError
+            raise ContainerBackendError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
     def is_container_snapshot(self, image):
         """
         Return true if `image` is internally used as a container snapshot.
@@ -483,18 +1331,52 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
 
         :param container: The container to make conform.
         """
-        if not self.container_is_running(container.get('Id')):
+        if 'State' in container:  # inspect data
+            status = self.make_container_status(container)
+        elif not self.container_is_running(container.get('Id')):
             status = ContainerBackend.CONTAINER_STATUS_STOPPED
         elif self.container_is_suspended(container.get('Id')):
             status = SuspendableContainerBackend.CONTAINER_STATUS_SUSPENDED
         else:
             status = ContainerBackend.CONTAINER_STATUS_RUNNING
 
+        name = (container.get('Name') or (container.get('Names') or [''])[0]).lstrip('/')
         return {
             ContainerBackend.KEY_PK: container.get('Id'),
-            ContainerBackend.CONTAINER_KEY_STATUS: status
+            ContainerBackend.CONTAINER_KEY_STATUS: status,
+            CONTAINER_KEY_NAME: name,
+            CONTAINER_KEY_OWNER: self.get_container_owner(name)
         }
 
+    def make_container_status(self, container):
+        """
+        Return the contract status of a container from its inspect data.
+
+        :param container: The container as returned by Docker's inspect.
+        """
+        state = container.get('State', {})
+        if state.get('Running') is not True:
+            return ContainerBackend.CONTAINER_STATUS_STOPPED
+        elif state.get('Paused') is True:
+            return SuspendableContainerBackend.CONTAINER_STATUS_SUSPENDED
+        return ContainerBackend.CONTAINER_STATUS_RUNNING
+
+    def make_resource_host_config(self, limits):
+        """
+        Return the Docker host config fields for the given resource limits.
+
+        :param limits: The resource limits (see `RESOURCE_LIMITS`).
+        """
+        host_config = {}
+        for key, field in self.RESOURCE_LIMITS.items():
+            value = limits.get(key)
+            if value is None:
+                continue
+            if key in ('mem_limit', 'memswap_limit') and isinstance(value, basestring):
+                value = docker_utils.parse_bytes(value)
+            host_config[field] = value
+        return host_config
+
     def make_snapshot_contract_conform(self, snapshot):
         """
         Ensure the snapshot dict returned from Docker is confirm with that the contract requires.
@@ -503,6 +1385,231 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         return self.make_image_contract_conform(snapshot)
 
+    def prefetch_container_images(self, images, **kwargs):
+        """
+        Make sure all `images` are pulled from the registry ahead of time and return the job doing so.
+
+        Images whose local digest matches the registry's are skipped. The job's progress holds the
+        number of pulled, skipped and failed images. See `get_prefetch_job`.
+
+        :param images: List of image PKs (as stored in the image's Backend PK).
+        """
+        return self._prefetch_jobs.submit('prefetch images', self.run_prefetch, list(images)).to_dict()
+
+    def prune_clone_images(self):
+        """
+        Untag all temporary clone images left behind and return how many were untagged.
+
+        Images still used by a clone keep their layers until the clone is deleted.
+        """
+        try:
+            images = self._client.images(filters={'dangling': False})
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        untagged = 0
+        for image in images:
+            for tag in image.get('RepoTags') or []:
+                if tag.rsplit(':', 1)[-1].startswith(self.CLONE_IMAGE_NAME_PREFIX):
+                    untagged += 1 if self.untag_clone_image(tag) else 0
+        return untagged
+
+    def prune_dangling_container_images(self):
+        """
+        Remove the dangling (untagged and unreferenced) images committed by this backend and return
+        the number of bytes reclaimed.
+
+        Only images labeled with `LABEL_SNAPSHOT` (set on every commit) are removed, dangling images
+        of other workloads on the host are left alone.
+        """
+        try:
+            dangling = self._client.images(filters={'dangling': True, 'label': self.LABEL_SNAPSHOT})
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        reclaimed = 0
+        for image in dangling:
+            if self.LABEL_SNAPSHOT not in (image.get('Labels') or {}):
+                continue  # older daemons ignore the label filter
+            try:
+                self._client.remove_image(image=image.get('Id'))
+                reclaimed += image.get('Size', 0)
+            except Exception:
+                pass  # still referenced by another image or container
+        return reclaimed
+
+    def pull_container_image(self, image):
+        """
+        Pull the image `image` from the registry and remember when it was pulled.
+
+        :param image: The image PK to pull (i.e. 192.168.0.1:5000/coco/base-ldap:latest).
+        """
+        parts = image.split('/')
+        if len(parts) > 2:  # includes registry
+            repository = parts[0] + '/' + parts[1] + '/' + parts[2].split(':')[0]
+            tag = parts[2].split(':')[1]
+        else:
+            repository = image.split(':')[0]
+            tag = image.split(':')[1]
+        # FIXME: should be done automatically
+        try:
+            output = self._client.pull(
+                repository=repository,
+                tag=tag
+            )
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+        for line in (output or '').splitlines():
+            if line.strip() and 'error' in json.loads(line):
+                raise ContainerBackendError(json.loads(line).get('error'))
+        with self._warm_images_lock:
+            self._warm_images[image] = time.time()
+
+    def push_container_image(self, job, image):
+        """
+        Push the image `image` to the registry, reporting the progress on `job`.
+
+        The progress is parsed from the streamed push output and holds the number of layers
+        seen/pushed and the bytes transferred so far.
+
+        :param job: The `Job` the push is executed for.
+        :param image: The full image name (including the registry) to push.
+        """
+        layers = {}
+        job.progress = {}
+        for chunk in self._client.push(repository=image, stream=True, insecure_registry=True):  # TODO: constructor?
+            for line in chunk.splitlines():
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                if 'error' in message:
+                    raise ContainerBackendError(message.get('error'))
+
+                status = message.get('status', '')
+                layer = message.get('id')
+                if layer is not None:
+                    current, total, done = layers.get(layer, (0, 0, False))
+                    detail = message.get('progressDetail') or {}
+                    if detail.get('total'):
+                        current, total = detail.get('current', current), detail.get('total')
+                    if status.startswith('Pushed') or status.endswith('already exists'):
+                        current, done = total, True
+                    layers[layer] = (current, total, done)
+
+                job.progress = {
+                    'status': status,
+                    'layers': len(layers),
+                    'layers_done': len([l for l in layers.values() if l[2]]),
+                    'bytes': sum(l[0] for l in layers.values()),
+                    'bytes_total': sum(l[1] for l in layers.values())
+                }
+        return {
+            ContainerBackend.KEY_PK: image
+        }
+
+    def refresh_container_image(self, image):
+        """
+        Pull the image `image` from the registry in the background.
+
+        Does nothing if a refresh for that image is already in progress.
+
+        :param image: The image PK to refresh.
+        """
+        with self._warm_images_lock:
+            if image in self._warm_images_pending:
+                return
+            self._warm_images_pending.add(image)
+
+        def refresh():
+            try:
+                self.pull_container_image(image)
+            except Exception:
+                pass  # keep using the local copy, the next create_container retries
+            finally:
+                with self._warm_images_lock:
+                    self._warm_images_pending.discard(image)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def run_prefetch(self, job, images):
+        """
+        Pull all `images` not up-to-date, reporting the progress on `job`.
+
+        :param job: The `Job` the prefetch is executed for.
+        :param images: List of image PKs to prefetch.
+        """
+        lock = threading.Lock()
+        job.progress = {'total': len(images), 'pulled': 0, 'skipped': 0, 'failed': 0}
+
+        def prefetch(image):
+            outcome = 'failed'
+            try:
+                if self.container_image_is_current(image):
+                    with self._warm_images_lock:
+                        self._warm_images[image] = time.time()
+                    outcome = 'skipped'
+                else:
+                    registry = image.split('/')[0] if len(image.split('/')) > 2 else None
+                    with lock:
+                        semaphore = self._prefetch_registry_semaphores.setdefault(
+                            registry, threading.BoundedSemaphore(self._prefetch_registry_workers)
+                        )
+                    with semaphore:
+                        self.pull_container_image(image)
+                    outcome = 'pulled'
+            except Exception:
+                pass
+            with lock:
+                job.progress[outcome] += 1
+            return outcome
+
+        if not images:
+            return job.progress
+        pool = ThreadPool(min(self._prefetch_workers, len(images)))
+        try:
+            outcomes = pool.map(prefetch, images)
+        finally:
+            pool.close()
+        if 'failed' in outcomes:
+            raise ContainerBackendError("%i image(s) could not be pulled" % outcomes.count('failed'))
+        return dict(job.progress)
+
+    def refresh_watched_container(self, container):
+        """
+        Apply a change made to `container` through the backend to `container_watcher` (if any) right away,
+        so listings served from the watcher do not lag behind the backend's own operations.
+
+        :param container: The container identifier (the PK for deleted containers).
+        """
+        if self.container_watcher is None:
+            return
+        try:
+            self.container_watcher.refresh(container)
+        except Exception:
+            pass  # the container's event updates the view as well
+
+    def remove_clone_source_image(self, image):
+        """
+        Remove `image` if it is an untagged clone image no longer in use and return true if it was removed.
+
+        :param image: The image ID the deleted container was created from.
+        """
+        try:
+            inspect = self._client.inspect_image(image)
+        except Exception:
+            return False
+        tags = [tag for tag in inspect.get('RepoTags') or [] if tag != '<none>:<none>']
+        labels = (inspect.get('Config') or {}).get('Labels') or {}
+        if tags or labels.get(self.LABEL_SNAPSHOT) != 'false':  # still tagged or not committed by this backend
+            return False
+        try:
+            self._client.remove_image(image=image)  # not forced, fails while other clones still use it
+            return True
+        except Exception:
+            return False
+
     def restart_container(self, container, **kwargs):
         """
         :inherit.
@@ -511,39 +1618,151 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
             raise ContainerNotFoundError
 
         try:
-            return self._client.restart(container=container, timeout=0)
+            result = self._client.restart(container=container, timeout=0)
         except DockerError as ex:
             if ex.response.status_code == requests.codes.not_found:
                 raise ContainerImageNotFoundError
             raise ContainerBackendError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
+        self.refresh_watched_container(container)
+        return result
 
     def restore_container_snapshot(self, container, snapshot, **kwargs):
         """
         :inherit.
+
+        The container is replaced by a new one created from the snapshot image, keeping the name,
+        volumes and port bindings (the container PK changes). The old container is only stopped once
+        the replacement is ready and removed in the background. The returned container contains
+        the seconds it was unavailable under `CONTAINER_KEY_RESTORE_DOWNTIME`.
         """
         if not self.container_exists(container):
             raise ContainerNotFoundError
         if not self.container_snapshot_exists(snapshot):
             raise ContainerSnapshotNotFoundError
 
-        raise NotImplementedError
+        try:
+            old = self._client.inspect_container(container)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+        config = old.get('Config', {})
+        name = old.get('Name').lstrip('/')
+        suffix = '-at-' + str(int(time.time()))
+
+        # prepare the replacement while the old container is still serving
+        try:
+            new = self._client.create_container(
+                image=snapshot,
+                command=config.get('Cmd'),
+                name=name + '-restore' + suffix,
+                ports=(config.get('ExposedPorts') or {}).keys(),
+                volumes=(config.get('Volumes') or {}).keys(),
+                host_config=old.get('HostConfig'),
+                environment=config.get('Env'),
+                labels=config.get('Labels'),
+                detach=True
+            ).get('Id')
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        # swap: ports and the name are only released once the old container is gone
+        paused = old.get('State', {}).get('Paused') is True
+        downtime_start = time.time()
+        try:
+            if paused:  # suspended containers cannot be stopped
+                self._client.unpause(container=old.get('Id'))
+            self._client.stop(container=old.get('Id'), timeout=0)
+            self._client.rename(old.get('Id'), name + '-replaced' + suffix)
+            self._client.rename(new, name)
+            self._client.start(container=new)
+        except Exception as ex:
+            try:  # roll back to the old container
+                self._client.remove_container(container=new, force=True)
+                self._client.rename(old.get('Id'), name)
+                if old.get('State', {}).get('Running') is True:
+                    self._client.start(container=old.get('Id'))
+                    if paused:
+                        self._client.pause(container=old.get('Id'))
+            except Exception:
+                pass
+            raise ContainerBackendError(ex)
+        downtime = time.time() - downtime_start
+        if self._cpuset_packer is not None:
+            self._cpuset_packer.transfer(old.get('Id'), new)
+        if self._port_allocator is not None:
+            self._port_allocator.transfer(old.get('Id'), new)
+
+        def remove_old():
+            try:
+                self._client.remove_container(container=old.get('Id'), force=True)
+            except Exception:
+                pass
+            self.refresh_watched_container(old.get('Id'))
+
+        thread = threading.Thread(target=remove_old)
+        thread.daemon = True
+        thread.start()
+
+        self.refresh_watched_container(new)
+        restored = self.get_container(new)
+        restored[self.CONTAINER_KEY_RESTORE_DOWNTIME] = downtime
+        return restored
 
     def resume_container(self, container, **kwargs):
         """
         :inherit.
         """
-        if not self.container_exists(container):
-            raise ContainerNotFoundError
-        if not self.container_is_running(container) or not self.container_is_suspended(container):
-            raise IllegalContainerStateError
+        if not self.container_exists(container):
+            raise ContainerNotFoundError
+        if not self.container_is_running(container) or not self.container_is_suspended(container):
+            raise IllegalContainerStateError
+
+        try:
+            result = self._client.unpause(container=container)
+        except DockerError as ex:
+            if ex.response.status_code == requests.codes.not_found:
+                raise ContainerImageNotFoundError
+            raise ContainerBackendError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+        if self.idle_suspender is not None:
+            self.idle_suspender.record_resume(container)
+        self.refresh_watched_container(container)
+        return result
+
+    def resume_containers(self, containers, **kwargs):
+        """
+        Resume all suspended `containers` and return the per-container results.
+
+        :param containers: List of container identifiers.
+        """
+        def resume(container):
+            if container.get('State', {}).get('Paused') is not True:
+                raise IllegalContainerStateError
+            self._client.unpause(container=container.get('Id'))
+            if self.idle_suspender is not None:
+                self.idle_suspender.record_resume(container.get('Id'))
+
+        return self.bulk_apply(self.translate_docker_errors(resume), containers)
+
+    def sample_container_stats(self, container):
+        """
+        Return a single sample of the resource usage statistics of `container`.
+
+        The sample is taken from Docker's stats stream, which is closed right afterwards.
 
+        :param container: The container identifier.
+        """
         try:
-            return self._client.unpause(container=container)
+            stream = self._client.stats(container)
+            try:
+                return json.loads(next(stream))
+            finally:
+                stream.close()
         except DockerError as ex:
             if ex.response.status_code == requests.codes.not_found:
-                raise ContainerImageNotFoundError
+                raise ContainerNotFoundError
             raise ContainerBackendError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
@@ -560,9 +1779,23 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
         #     raise IllegalContainerStateError
 
         try:
-            return self._client.start(container=container, **kwargs)
+            result = self._client.start(container=container, **kwargs)
         except Exception as ex:
             raise ContainerBackendError(ex)
+        self.refresh_watched_container(container)
+        return result
+
+    def start_containers(self, containers, **kwargs):
+        """
+        Start all `containers` that are not running yet and return the per-container results.
+
+        :param containers: List of container identifiers.
+        """
+        def start(container):
+            if container.get('State', {}).get('Running') is not True:
+                self._client.start(container=container.get('Id'))
+
+        return self.bulk_apply(self.translate_docker_errors(start), containers)
 
     def stop_container(self, container, **kwargs):
         """
@@ -579,13 +1812,42 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
             pass
 
         try:
-            return self._client.stop(container=container, timeout=0)
+            result = self._client.stop(container=container, timeout=0)
         except DockerError as ex:
             if ex.response.status_code == requests.codes.not_found:
                 raise ContainerImageNotFoundError
             raise ContainerBackendError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
+        self.refresh_watched_container(container)
+        return result
+
+    def stop_containers(self, containers, **kwargs):
+        """
+        Stop all running (or suspended) `containers` and return the per-container results.
+
+        :param containers: List of container identifiers.
+        """
+        def stop(container):
+            state = container.get('State', {})
+            if state.get('Paused') is True:
+                self._client.unpause(container=container.get('Id'))
+            if state.get('Running') is True:
+                self._client.stop(container=container.get('Id'), timeout=0)
+
+        return self.bulk_apply(self.translate_docker_errors(stop), containers)
+
+    def submit_job(self, name, func, *args, **kwargs):
+        """
+        Run `func(*args, **kwargs)` in the background job pool and return the job's state (see `get_job`).
+
+        :param name: A human readable description of the job.
+        :param func: The callable to execute.
+        """
+        def run(job):
+            return func(*args, **kwargs)
+
+        return self._jobs.submit(name, run).to_dict()
 
     def suspend_container(self, container, **kwargs):
         """
@@ -597,13 +1859,117 @@ class Docker(SnapshotableContainerBackend, SuspendableContainerBackend):
             raise IllegalContainerStateError
 
         try:
-            return self._client.pause(container=container)
+            result = self._client.pause(container=container)
         except DockerError as ex:
             if ex.response.status_code == requests.codes.not_found:
                 raise ContainerImageNotFoundError
             raise ContainerBackendError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
+        self.refresh_watched_container(container)
+        return result
+
+    def suspend_containers(self, containers, **kwargs):
+        """
+        Suspend all running `containers` and return the per-container results.
+
+        :param containers: List of container identifiers.
+        """
+        def suspend(container):
+            state = container.get('State', {})
+            if state.get('Running') is not True:
+                raise IllegalContainerStateError
+            if state.get('Paused') is not True:
+                self._client.pause(container=container.get('Id'))
+
+        return self.bulk_apply(self.translate_docker_errors(suspend), containers)
+
+    def translate_docker_errors(self, func):
+        """
+        Wrap `func` so Docker API errors are raised as the corresponding contract errors.
+
+        :param func: The callable to wrap.
+        """
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except BackendError as ex:
+                raise ex
+            except DockerError as ex:
+                if ex.response.status_code == requests.codes.not_found:
+                    raise ContainerNotFoundError
+                raise ContainerBackendError(ex)
+            except Exception as ex:
+                raise ContainerBackendError(ex)
+        return wrapper
+
+    def untag_clone_image(self, image):
+        """
+        Remove the tag of a temporary clone image and return true on success.
+
+        Forcing only untags images still used by a clone, their layers are removed together with
+        the last clone (see `remove_clone_source_image`).
+
+        :param image: The clone image tag.
+        """
+        try:
+            self._client.remove_image(image=image, force=True)
+            return True
+        except Exception:
+            return False
+
+    def wait_job(self, job, timeout=None, **kwargs):
+        """
+        Block until a background job has finished (or `timeout` seconds passed) and return its state.
+
+        :param job: The job PK.
+        :param timeout: Maximum number of seconds to wait (`None` waits forever).
+        """
+        found = self.get_job_or_fail(job)
+        found.wait(timeout)
+        return found.to_dict()
+
+    def warm_up(self, timeout=60):
+        """
+        Load the containers, images and snapshots into memory so a freshly started node serves
+        status queries without calling the Docker daemon.
+
+        The images are listed once with `get_snapshot_filters` (rebuilding the snapshot index from that
+        listing, with label filters enabled only the snapshots are listed and counted). The containers
+        are listed and inspected in parallel by `container_watcher`, which keeps them current from
+        Docker's events afterwards (`get_containers` is served from it). Changes made through the backend
+        are applied to the watcher before they return (see `refresh_watched_container`), so they are
+        listed right away. The CPU and port reservations are reconciled with the loaded containers.
+
+        Return the number of loaded containers, images and snapshots and the seconds it took.
+
+        :param timeout: Maximum number of seconds to wait for the containers to be loaded.
+        """
+        started = time.time()
+        try:
+            images = self._client.images(filters=self.get_snapshot_filters())
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+        snapshots = [image for image in images if self.is_container_snapshot(image)]
+        self._snapshot_index.load(snapshots)
+
+        if self.container_watcher is None:
+            self.container_watcher = ContainerStateWatcher(self)
+            self.container_watcher.start()
+        if not self.container_watcher.wait_synced(timeout):
+            raise ContainerBackendError("Loading the containers timed out")
+
+        if self._cpuset_packer is not None:
+            self._cpuset_packer.get_load()
+        if self._port_allocator is not None:
+            self._port_allocator.get_free_count()
+
+        return {
+            'containers': len(self.container_watcher.get_all()),
+            'images': len(images) - len(snapshots),
+            'snapshots': len(snapshots),
+            'duration': time.time() - started
+        }
 
 
 class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
@@ -619,25 +1985,118 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
     """
     PLACEHOLDER_CONTAINER = '<container>'
 
-    def __init__(self, url, slugs=None):
+    """
+    HTTP methods that are retried on connection errors and gateway errors.
+    """
+    IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+    """
+    Request bodies smaller than this (in bytes) are never compressed.
+    """
+    COMPRESS_MIN_SIZE = 1024
+
+    """
+    Maximum number of seconds a single long-polling request for a job's state is held by the remote.
+    """
+    JOB_WAIT_MAX = 30
+
+    """
+    Static path segments used besides the slugs. All other segments of a request's path are identifiers
+    (replaced by `<id>` in the operation names reported to the instrumentation).
+    """
+    PATH_SEGMENTS = (
+        'exec', 'health', 'logs', 'prefetch', 'restart', 'restore', 'resume', 'start', 'stats', 'stop', 'suspend'
+    )
+
+    def __init__(self, url, slugs=None, cache_size=64,
+                 connect_timeout=5, read_timeout=60, long_read_timeout=900,
+                 retries=2, retry_backoff=0.5, failure_threshold=5, reset_timeout=30,
+                 use_msgpack=True, compress_requests=False, instrumentation=None):
         """
         Initialize a new HTTP remote container backend.
 
         :param url: The base URL of the API endpoint (e.g. http://my.remote.ip:8080)
         :param slugs: A dictionary of slugs where the various endpoints can be found (e.g. /containers for containers)
+        :param cache_size: Maximum number of list responses kept for conditional requests.
+        :param connect_timeout: Seconds to wait for the connection to the remote to be established.
+        :param read_timeout: Seconds to wait for the remote to respond.
+        :param long_read_timeout: Seconds to wait for the remote to respond to long running operations (create, commit).
+        :param retries: How many times idempotent requests are retried.
+        :param retry_backoff: Base delay in seconds between two retries (doubled each retry, with jitter).
+        :param failure_threshold: Consecutive failures after which requests to the remote fail fast.
+        :param reset_timeout: Seconds after which a failing remote is probed again.
+        :param use_msgpack: If true (and msgpack is installed), MessagePack is negotiated as wire format.
+                            Request bodies are sent as MessagePack once the remote responded with it.
+        :param compress_requests: If true, larger request bodies are sent gzip compressed.
+        :param instrumentation: The `Instrumentation` to report the requests sent to the remote to.
         """
-        if slugs:
-            if isinstance(slugs, dict):
-                self.slugs.update(slugs)
-            else:
-                raise ValueError("Slugs need to be a dictionary")
         self.url = url
         self.slugs = {
             'containers': '/containers',
             'container_snapshots': '/containers/<container>/snapshots',
             'snapshots': '/containers/snapshots',
-            'images': '/containers/images'
+            'images': '/containers/images',
+            'stats': '/containers/stats',
+            'events': '/containers/events',
+            'jobs': '/jobs',
+            'load': '/load'
         }
+        if slugs:
+            if isinstance(slugs, dict):
+                self.slugs.update(slugs)
+            else:
+                raise ValueError("Slugs need to be a dictionary")
+        self._cache = OrderedDict()  # URL -> (ETag, Last-Modified, decoded body)
+        self._cache_lock = threading.Lock()
+        self._cache_size = cache_size
+        self.circuit_breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.connect_timeout = connect_timeout
+        self.long_read_timeout = long_read_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.compress_requests = compress_requests
+        self.instrumentation = instrumentation or Instrumentation()
+        self.use_msgpack = use_msgpack and msgpack is not None
+        self._remote_msgpack = False
+
+    def conditional_get(self, url):
+        """
+        Send a conditional GET request to `url` and return the status code and decoded JSON body.
+
+        The validators (`ETag`/`Last-Modified`) and decoded bodies of successful responses are cached per URL.
+        If the remote answers `304 Not Modified`, (a copy of) the cached body is returned with status `200`.
+
+        :param url: The URL to GET.
+        """
+        with self._cache_lock:
+            cached = self._cache.get(url)
+        headers = {}
+        if cached is not None:
+            if cached[0]:
+                headers['If-None-Match'] = cached[0]
+            if cached[1]:
+                headers['If-Modified-Since'] = cached[1]
+
+        response = self.request('GET', url=url, headers=headers)
+        if response.status_code == requests.codes.not_modified and cached is not None:
+            with self._cache_lock:
+                if url in self._cache:
+                    self._cache[url] = self._cache.pop(url)  # mark as recently used
+            return requests.codes.ok, deepcopy(cached[2])
+        if response.status_code != requests.codes.ok:
+            return response.status_code, None
+
+        body = self.decode(response)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        with self._cache_lock:
+            self._cache.pop(url, None)
+            if etag or last_modified:
+                self._cache[url] = (etag, last_modified, deepcopy(body))
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return response.status_code, body
 
     def container_exists(self, container, **kwargs):
         """
@@ -682,13 +2141,21 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         :inherit.
         """
-        snapshots = self.get_container_snapshots()
-        return next((sh for sh in snapshots if snapshot == sh.get(ContainerBackend.KEY_PK)), False) is not False
+        try:
+            self.get_container_snapshot(snapshot)
+            return True
+        except ContainerSnapshotNotFoundError:
+            return False
+        except Exception as ex:
+            raise ex
 
     def create_container(self, username, uid, name, ports, volumes,
                          cmd=None, base_url=None, image=None, clone_of=None, **kwargs):
         """
         :inherit.
+
+        :param as_job: If true, the remote creates the container in the background and returns the job
+                       right away (see `get_job`).
         """
         specification = {
             'username': username,
@@ -704,40 +2171,50 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         specification.update(kwargs)
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.url + self.slugs.get('containers'),
-                data=json.dumps(specification)
+                timeout=self.get_operation_timeout(kwargs.get('as_job')),
+                payload=specification
             )
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
-        if response.status_code == requests.codes.created:
-            return response.json()
+        if response.status_code in (requests.codes.created, requests.codes.accepted):
+            return self.decode(response)
         else:
             raise ContainerBackendError
 
     def create_container_image(self, container, name, **kwargs):
         """
         :inherit.
+
+        :param as_job: If true, the remote commits the image in the background and returns the job
+                       right away (see `get_job`).
         """
+        payload = {
+            'container': container,
+            'name': name
+        }
+        if kwargs.get('as_job'):
+            payload['as_job'] = True
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.url + self.slugs.get('images'),
-                data=json.dumps({
-                    'container': container,
-                    'name': name
-                })
+                timeout=self.get_operation_timeout(kwargs.get('as_job')),
+                payload=payload
             )
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
-        if response.status_code == requests.codes.created:
-            return response.json()
+        if response.status_code in (requests.codes.created, requests.codes.accepted):
+            return self.decode(response)
         elif response.status_code == requests.codes.not_found:
             raise ContainerNotFoundError
         else:
@@ -746,36 +2223,56 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
     def create_container_snapshot(self, container, name, **kwargs):
         """
         :inherit.
+
+        :param as_job: If true, the remote takes the snapshot in the background and returns the job
+                       right away (see `get_job`).
         """
+        payload = {
+            'name': name
+        }
+        if kwargs.get('as_job'):
+            payload['as_job'] = True
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.generate_container_snapshots_url(container),
-                data=json.dumps({
-                    'name': name
-                })
+                timeout=self.get_operation_timeout(kwargs.get('as_job')),
+                payload=payload
             )
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
-        if response.status_code == requests.codes.created:
-            return response.json()
+        if response.status_code in (requests.codes.created, requests.codes.accepted):
+            return self.decode(response)
         elif response.status_code == requests.codes.not_found:
             raise ContainerNotFoundError
         else:
             raise ContainerBackendError
 
+    def decode(self, response):
+        """
+        Return the decoded body of `response` (JSON or MessagePack, depending on its content type).
+
+        :param response: The response to decode.
+        """
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith(CONTENT_TYPE_MSGPACK):
+            self._remote_msgpack = True
+        return decode_payload(response.content, content_type)
+
     def delete_container(self, container, **kwargs):
         """
         :inherit.
         """
         response = None
         try:
-            response = requests.delete(
+            response = self.request(
+                'DELETE',
                 url=self.generate_container_url(container),
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -795,9 +2292,10 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.delete(
+            response = self.request(
+                'DELETE',
                 url=self.generate_image_url(image),
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -817,9 +2315,10 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.delete(
+            response = self.request(
+                'DELETE',
                 url=self.generate_snapshot_url(snapshot),
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -839,11 +2338,12 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.generate_container_url(container) + '/exec',
-                data=json.dumps({
+                payload={
                     'command': cmd
-                })
+                }
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -851,7 +2351,7 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json()
+            return self.decode(response)
         elif response.status_code == requests.codes.not_found:
             raise ContainerNotFoundError
         elif response.status_code == requests.codes.precondition_required:
@@ -898,52 +2398,101 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.get(url=self.generate_container_url(container))
+            response = self.request('GET', url=self.generate_container_url(container))
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json()
+            return self.decode(response)
         elif response.status_code == requests.codes.not_found:
             raise ContainerNotFoundError
         else:
             raise ContainerBackendError
 
+    def get_container_events(self, since=None, **kwargs):
+        """
+        Subscribe to the state changes of the remote's containers and return a (blocking) iterator over them.
+
+        The remote streams the events of `Docker.get_container_events` either as JSON lines or as server-sent
+        events. Empty lines and SSE comments can be sent as keep-alives. If the remote stays silent for
+        `long_read_timeout` seconds, the stream is considered broken.
+
+        :param since: If set, events since this UNIX timestamp (of the remote) are replayed first.
+        """
+        url = self.url + self.slugs.get('events')
+        if since is not None:
+            url += '?' + urlencode({'since': since})
+        response = None
+        try:
+            response = self.request(
+                'GET',
+                url=url,
+                headers={'Accept': 'application/x-ndjson, text/event-stream'},
+                timeout=(self.connect_timeout, self.long_read_timeout),
+                stream=True
+            )
+        except RequestException as ex:
+            raise ConnectionError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        if response.status_code != requests.codes.ok:
+            response.close()
+            raise ContainerBackendError
+
+        def events():
+            try:
+                # deliver events as soon as they arrive instead of waiting for a full buffer
+                for line in response.iter_lines(chunk_size=1):
+                    line = line.strip()
+                    if line.startswith('data:'):
+                        line = line[len('data:'):].strip()
+                    if not line.startswith('{'):
+                        continue  # keep-alives, SSE comments and other SSE fields
+                    yield json.loads(line)
+            except RequestException as ex:
+                raise ConnectionError(ex)
+            except Exception as ex:
+                raise ContainerBackendError(ex)
+            finally:
+                response.close()
+
+        return events()
+
     def get_container_image(self, image, **kwargs):
         """
         :inherit.
         """
         response = None
         try:
-            response = requests.get(url=self.generate_image_url(image))
+            response = self.request('GET', url=self.generate_image_url(image))
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json()
+            return self.decode(response)
         elif response.status_code == requests.codes.not_found:
             raise ContainerImageNotFoundError
         else:
             raise ContainerBackendError
 
-    def get_container_images(self, image, **kwargs):
+    def get_container_images(self, **kwargs):
         """
         :inherit.
         """
-        response = None
         try:
-            response = requests.get(url=self.url + self.slugs.get('images'))
+            status, images = self.conditional_get(self.url + self.slugs.get('images'))
         except RequestException as ex:
             raise ConnectionError(ex)
-        except Excpetion as ex:
+        except Exception as ex:
             raise ContainerBackendError(ex)
 
-        if response.status_code == requests.codes.ok:
-            return response.json()
+        if status == requests.codes.ok:
+            return images
         else:
             raise ContainerBackendError
 
@@ -953,14 +2502,14 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.get(url=self.generate_container_url(container) + '/logs')
+            response = self.request('GET', url=self.generate_container_url(container) + '/logs')
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json()
+            return self.decode(response)
         else:
             raise ContainerBackendError
 
@@ -970,14 +2519,14 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.get(url=self.generate_snapshot_url(snapshot))
+            response = self.request('GET', url=self.generate_snapshot_url(snapshot))
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json()
+            return self.decode(response)
         elif response.status_code == requests.codes.not_found:
             raise ContainerSnapshotNotFoundError
         else:
@@ -987,16 +2536,15 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         :inherit.
         """
-        response = None
         try:
-            response = requests.get(url=self.url + self.slugs.get('snapshots'))
+            status, snapshots = self.conditional_get(self.url + self.slugs.get('snapshots'))
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
-        if response.status_code == requests.codes.ok:
-            return response.json()
+        if status == requests.codes.ok:
+            return snapshots
         else:
             raise ContainerBackendError
 
@@ -1006,14 +2554,35 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.get(url=self.generate_container_snapshots_url(container))
+            response = self.request('GET', url=self.generate_container_snapshots_url(container))
+        except RequestException as ex:
+            raise ConnectionError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        if response.status_code == requests.codes.ok:
+            return self.decode(response)
+        elif response.status_code == requests.codes.not_found:
+            raise ContainerNotFoundError
+        else:
+            raise ContainerBackendError
+
+    def get_container_stats(self, container, **kwargs):
+        """
+        Return the latest resource usage sample of `container`.
+
+        :param container: The container identifier.
+        """
+        response = None
+        try:
+            response = self.request('GET', url=self.generate_container_url(container) + '/stats')
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json()
+            return self.decode(response)
         elif response.status_code == requests.codes.not_found:
             raise ContainerNotFoundError
         else:
@@ -1022,46 +2591,304 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
     def get_containers(self, only_running=False, **kwargs):
         """
         :inherit.
+
+        Accepts the filters of `filter_containers` as keyword arguments. They are sent to the remote
+        as query parameters and applied there, the remote's result is returned as-is.
+        """
+        filters = {
+            'only_running': only_running or None,
+            'status': kwargs.get('status'),
+            'owner': kwargs.get('owner'),
+            'name_prefix': kwargs.get('name_prefix'),
+            'fields': kwargs.get('fields')
+        }
+        if isinstance(filters.get('fields'), (list, tuple)):
+            filters['fields'] = ','.join(filters.get('fields'))
+        params = sorted((key, value) for key, value in filters.items() if value is not None)
+        url = self.url + self.slugs.get('containers')
+        if params:
+            url += '?' + urlencode(params)
+
+        try:
+            status, containers = self.conditional_get(url)
+        except RequestException as ex:
+            raise ConnectionError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        if status == requests.codes.ok:
+            return containers
+        else:
+            raise ContainerBackendError
+
+    def get_containers_stats(self, **kwargs):
+        """
+        Return the latest resource usage samples of all running containers.
         """
         response = None
         try:
-            response = requests.get(url=self.url + self.slugs.get('containers'))
+            response = self.request('GET', url=self.url + self.slugs.get('stats'))
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json()
+            return self.decode(response)
         else:
             raise ContainerBackendError
 
-    def get_status(self):
+    def get_job(self, job, wait=None, **kwargs):
         """
-        :inherit.
+        Return the state of a background job on the remote (see `Docker.get_job`).
+
+        :param job: The job PK.
+        :param wait: If set, the remote holds the request up to this many seconds until the job has finished.
+        """
+        url = self.url + self.slugs.get('jobs') + '/' + job
+        timeout = (self.connect_timeout, self.read_timeout)
+        if wait:
+            url += '?' + urlencode({'wait': wait})
+            timeout = (self.connect_timeout, self.read_timeout + wait)
+        response = None
+        try:
+            response = self.request('GET', url=url, timeout=timeout)
+        except RequestException as ex:
+            raise ConnectionError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        if response.status_code == requests.codes.ok:
+            return self.decode(response)
+        elif response.status_code == requests.codes.not_found:
+            raise ContainerBackendError("No such job")
+        else:
+            raise ContainerBackendError
+
+    def get_node_load(self, **kwargs):
+        """
+        Return the load of the remote node.
+        """
+        response = None
+        try:
+            response = self.request('GET', url=self.url + self.slugs.get('load'))
+        except RequestException as ex:
+            raise ConnectionError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        if response.status_code == requests.codes.ok:
+            return self.decode(response)
+        else:
+            raise ContainerBackendError
+
+    def get_operation_name(self, method, url):
+        """
+        Return the name under which a request is reported to the instrumentation.
+
+        The name consists of the method and the path, with identifiers replaced by `<id>` (i.e. `GET /containers/<id>`).
+
+        :param method: The HTTP method.
+        :param url: The requested URL.
+        """
+        path = (url[len(self.url):] if url.startswith(self.url) else url).split('?', 1)[0]
+        static = set(self.PATH_SEGMENTS)
+        for slug in self.slugs.values():
+            static.update(slug.split('/'))
+        segments = []
+        for segment in path.split('/'):
+            if segment in static:
+                segments.append(segment)
+            elif segments[-1:] != ['<id>']:  # base64 encoded identifiers might contain slashes
+                segments.append('<id>')
+        return method + ' ' + '/'.join(segments)
+
+    def get_operation_timeout(self, as_job=False):
+        """
+        Return the (connect, read) timeout for an operation that might take long.
+
+        Operations requested as job return right away, the others may take up to `long_read_timeout` seconds.
+
+        :param as_job: True if the operation is requested as background job.
+        """
+        return (self.connect_timeout, self.read_timeout if as_job else self.long_read_timeout)
+
+    def get_prefetch_job(self, job, **kwargs):
+        """
+        Return the state of an image prefetch job.
+
+        :param job: The job PK as returned by `prefetch_container_images`.
         """
         response = None
         try:
-            response = requests.get(url=self.url + '/health')
+            response = self.request('GET', url=self.url + self.slugs.get('images') + '/prefetch/' + job)
         except RequestException as ex:
             raise ConnectionError(ex)
         except Exception as ex:
             raise ContainerBackendError(ex)
 
         if response.status_code == requests.codes.ok:
-            return response.json().get('backends').get('container').get('status')
+            return self.decode(response)
+        else:
+            raise ContainerBackendError
+
+    def get_status(self, details=False):
+        """
+        :inherit.
+
+        While the circuit breaker is open, the status is reported as erroneous without contacting the remote.
+
+        :param details: If true, return a dictionary with the `status` and the `circuit_breaker` state
+                        (see `CircuitBreaker.get_state`) instead.
+        """
+        if self.circuit_breaker.is_open():
+            status = ContainerBackend.BACKEND_STATUS_ERROR
+        else:
+            response = None
+            try:
+                response = self.request('GET', url=self.url + '/health')
+            except RequestException as ex:
+                raise ConnectionError(ex)
+            except Exception as ex:
+                raise ContainerBackendError(ex)
+
+            if response.status_code == requests.codes.ok:
+                status = self.decode(response).get('backends').get('container').get('status')
+            else:
+                raise ContainerBackendError
+
+        if details:
+            return {
+                'status': status,
+                'circuit_breaker': self.circuit_breaker.get_state()
+            }
+        return status
+
+    def prefetch_container_images(self, images, **kwargs):
+        """
+        Make sure all `images` are pulled on the remote node ahead of time and return the job doing so.
+
+        :param images: List of image PKs.
+        """
+        response = None
+        try:
+            response = self.request(
+                'POST',
+                url=self.url + self.slugs.get('images') + '/prefetch',
+                payload={
+                    'images': images
+                }
+            )
+        except RequestException as ex:
+            raise ConnectionError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        if response.status_code in (requests.codes.ok, requests.codes.accepted):
+            return self.decode(response)
         else:
             raise ContainerBackendError
 
+    def report_request(self, method, url, kwargs, started, response=None):
+        """
+        Report a request sent to the remote to the instrumentation.
+
+        The transferred bytes are the request body plus the response body (unknown for streamed responses).
+        Server errors and failed requests are reported as `OUTCOME_ERROR`.
+
+        :param method: The HTTP method.
+        :param url: The requested URL.
+        :param kwargs: The arguments the request was sent with.
+        :param started: Timestamp the request was sent at.
+        :param response: The response or `None` if the request failed.
+        """
+        duration = time.time() - started
+        transferred = len(kwargs.get('data') or '')
+        if response is None:
+            outcome = OUTCOME_ERROR
+        else:
+            if kwargs.get('stream'):
+                transferred = None
+            else:
+                transferred += len(response.content)
+            if response.status_code == requests.codes.not_found:
+                outcome = OUTCOME_NOT_FOUND
+            elif response.status_code >= 500:
+                outcome = OUTCOME_ERROR
+            else:
+                outcome = OUTCOME_OK
+        try:
+            self.instrumentation.report(
+                'http_remote', self.get_operation_name(method, url), duration, transferred, outcome
+            )
+        except Exception:
+            pass  # instrumentation must never break a request
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request to the remote and return the response.
+
+        Applies the connect and read timeouts (unless given), fails fast while the circuit breaker is open
+        and retries idempotent requests (see `IDEMPOTENT_METHODS`) on connection and gateway errors,
+        waiting with exponential backoff and jitter in between. Every attempt is reported to the instrumentation.
+
+        :param method: The HTTP method.
+        :param url: The URL to send the request to.
+        :param kwargs: Additional arguments for `requests.request`. A `payload` is encoded in the negotiated
+                       wire format (and compressed if enabled) and sent as the request body.
+        """
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers.setdefault('Accept', CONTENT_TYPE_MSGPACK + ', ' + CONTENT_TYPE_JSON + ';q=0.9'
+                           if self.use_msgpack else CONTENT_TYPE_JSON)
+        if 'payload' in kwargs:
+            accept = CONTENT_TYPE_MSGPACK if self.use_msgpack and self._remote_msgpack else CONTENT_TYPE_JSON
+            body, headers['Content-Type'] = encode_payload(kwargs.pop('payload'), accept)
+            if self.compress_requests and len(body) >= self.COMPRESS_MIN_SIZE:
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+                body = compressor.compress(body) + compressor.flush()
+                headers['Content-Encoding'] = 'gzip'
+            kwargs['data'] = body
+        kwargs['headers'] = headers
+        attempts = 1 + (self.retries if method in self.IDEMPOTENT_METHODS else 0)
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            probe = self.circuit_breaker.before_request()
+            try:
+                started = time.time()
+                try:
+                    response = requests.request(method, url, **kwargs)
+                except RequestException as ex:
+                    self.report_request(method, url, kwargs, started)
+                    self.circuit_breaker.record_failure()
+                    if attempt + 1 == attempts:
+                        raise ex
+                    continue
+                self.report_request(method, url, kwargs, started, response)
+
+                if response.status_code in (requests.codes.bad_gateway, requests.codes.service_unavailable,
+                                            requests.codes.gateway_timeout):
+                    self.circuit_breaker.record_failure()
+                    if attempt + 1 < attempts:
+                        continue
+                else:
+                    self.circuit_breaker.record_success()
+                return response
+            finally:
+                if probe:  # no-op if the outcome was recorded, frees the probe slot after unexpected errors
+                    self.circuit_breaker.release_probe()
+
     def restart_container(self, container, **kwargs):
         """
         :inherit.
         """
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.generate_container_url(container) + '/restart',
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -1080,8 +2907,33 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
     def restore_container_snapshot(self, container, snapshot, **kwargs):
         """
         :inherit.
+
+        The remote answers `404 Not Found` if either the container or the snapshot does not exist,
+        the container is looked up to tell which one it was.
         """
-        raise NotImplementedError
+        response = None
+        try:
+            response = self.request(
+                'POST',
+                url=self.generate_container_url(container) + '/restore',
+                timeout=(self.connect_timeout, self.long_read_timeout),
+                payload={
+                    'snapshot': snapshot
+                }
+            )
+        except RequestException as ex:
+            raise ConnectionError(ex)
+        except Exception as ex:
+            raise ContainerBackendError(ex)
+
+        if response.status_code == requests.codes.ok:
+            return self.decode(response)
+        elif response.status_code == requests.codes.not_found:
+            if self.container_exists(container):
+                raise ContainerSnapshotNotFoundError
+            raise ContainerNotFoundError
+        else:
+            raise ContainerBackendError
 
     def resume_container(self, container, **kwargs):
         """
@@ -1089,9 +2941,10 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.generate_container_url(container) + '/resume',
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -1113,9 +2966,10 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.generate_container_url(container) + '/start',
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -1137,9 +2991,10 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.generate_container_url(container) + '/stop',
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -1161,9 +3016,10 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
         """
         response = None
         try:
-            response = requests.post(
+            response = self.request(
+                'POST',
                 url=self.generate_container_url(container) + '/suspend',
-                data=json.dumps({})
+                payload={}
             )
         except RequestException as ex:
             raise ConnectionError(ex)
@@ -1178,3 +3034,41 @@ class HttpRemote(SnapshotableContainerBackend, SuspendableContainerBackend):
             raise IllegalContainerStateError
         else:
             raise ContainerBackendError
+
+    def wait_job(self, job, timeout=None, poll_interval=1, **kwargs):
+        """
+        Block until a background job on the remote has finished (or `timeout` seconds passed) and return its state.
+
+        The job is long-polled in requests of up to `JOB_WAIT_MAX` seconds each. Remotes that do not support
+        long polling are polled every `poll_interval` seconds.
+
+        :param job: The job PK.
+        :param timeout: Maximum number of seconds to wait (`None` waits forever).
+        :param poll_interval: Seconds between two polls if the remote answers right away.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            wait = self.JOB_WAIT_MAX
+            if deadline is not None:
+                wait = max(0, min(wait, deadline - time.time()))
+            started = time.time()
+            state = self.get_job(job, wait=wait)
+            if state.get('status') in (Job.STATUS_SUCCEEDED, Job.STATUS_FAILED):
+                return state
+            if deadline is not None and time.time() >= deadline:
+                return state
+            if time.time() - started < poll_interval:
+                time.sleep(poll_interval if deadline is None else max(0, min(poll_interval, deadline - time.time())))
+
+    def watch_containers(self, listener=None, **kwargs):
+        """
+        Return a started `ContainerStateWatcher` keeping a local view of the remote's containers up-to-date.
+
+        Use the watcher's `get`/`get_all` instead of polling `get_container`/`get_containers`.
+
+        :param listener: If set, callable invoked with every container event.
+        :param kwargs: Additional arguments for the `ContainerStateWatcher`.
+        """
+        watcher = ContainerStateWatcher(self, listener=listener, **kwargs)
+        watcher.start()
+        return watcher
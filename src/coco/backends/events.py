@@ -0,0 +1,178 @@
+from coco.contract.backends import ContainerBackend
+from coco.contract.errors import ContainerNotFoundError
+import threading
+import time
+
+
+"""
+Status of a container in an event telling that the container has been deleted.
+"""
+CONTAINER_STATUS_DELETED = 'deleted'
+
+"""
+Keys under which container events carry the underlying action (i.e. `start`) and its timestamp.
+"""
+EVENT_KEY_ACTION = 'action'
+EVENT_KEY_TIME = 'time'
+
+
+class ContainerStateWatcher(object):
+
+    """
+    Local, continuously updated view of the containers of a backend.
+
+    The view is loaded with a single `get_containers` call and then kept current by the backend's
+    container events (see `Docker.get_container_events`). If the event stream breaks, it is reopened
+    after `reconnect_delay` seconds (doubled after each failed attempt, up to `max_reconnect_delay`)
+    and the view is resynchronized, so no state change is lost.
+    """
+
+    def __init__(self, backend, listener=None, reconnect_delay=1, max_reconnect_delay=60):
+        """
+        Initialize a new container state watcher.
+
+        :param backend: The container backend to watch (must provide `get_container_events`).
+        :param listener: If set, callable invoked with every applied event.
+        :param reconnect_delay: Seconds to wait before reopening a broken event stream.
+        :param max_reconnect_delay: Maximum seconds to wait between two reconnect attempts.
+        """
+        self.backend = backend
+        self.listener = listener
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnect_delay = reconnect_delay
+        self.reconnects = 0
+        self.synced_at = None
+        self._containers = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._synced = threading.Event()
+        self._thread = None
+
+    def get(self, container):
+        """
+        Return the last known state of `container` or `None` if it is not known.
+
+        :param container: The container identifier.
+        """
+        with self._lock:
+            known = self._containers.get(container)
+            return dict(known) if known is not None else None
+
+    def get_all(self):
+        """
+        Return the last known states of all containers.
+        """
+        with self._lock:
+            return [dict(container) for container in self._containers.values()]
+
+    def is_synced(self):
+        """
+        Return true if the view is loaded and the event stream is connected.
+        """
+        return self._synced.is_set()
+
+    def refresh(self, container):
+        """
+        Reload the state of `container` into the view right away (i.e. after the backend changed it),
+        instead of waiting for the event telling about the change.
+
+        Does nothing unless the view is synced. The listener is not invoked.
+
+        :param container: The container PK (a container that no longer exists is removed from the view).
+        """
+        if not self.is_synced():
+            return
+        try:
+            state = self.backend.get_container(container)
+        except ContainerNotFoundError:
+            with self._lock:
+                self._containers.pop(container, None)
+            return
+        with self._lock:
+            self._containers[state.get(ContainerBackend.KEY_PK)] = dict(state)
+
+    def start(self):
+        """
+        Start watching the backend in the background.
+        """
+        if self._thread is not None:
+            return
+        self._stopped = threading.Event()  # one per run, so a previous loop cannot be revived
+        self._thread = threading.Thread(target=self._run, args=(self._stopped,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching the backend.
+
+        The background thread exits with the next event (or when the stream is closed by the backend).
+        """
+        self._stopped.set()
+        self._thread = None
+        self._synced.clear()
+        self.synced_at = None
+
+    def wait_synced(self, timeout=None):
+        """
+        Block until the view is loaded and the event stream is connected (or `timeout` seconds passed).
+
+        Return true if the view is synced.
+
+        :param timeout: Maximum number of seconds to wait (`None` waits forever).
+        """
+        return self._synced.wait(timeout)
+
+    def _apply(self, event):
+        """
+        Apply a container event to the view.
+        """
+        pk = event.get(ContainerBackend.KEY_PK)
+        with self._lock:
+            if event.get(ContainerBackend.CONTAINER_KEY_STATUS) == CONTAINER_STATUS_DELETED:
+                self._containers.pop(pk, None)
+            else:
+                self._containers[pk] = dict(
+                    (key, value) for key, value in event.items() if key not in (EVENT_KEY_ACTION, EVENT_KEY_TIME)
+                )
+        if self.listener is not None:
+            try:
+                self.listener(event)
+            except Exception:
+                pass  # a failing listener must not break the view
+
+    def _resync(self):
+        """
+        Replace the view with the backend's current container list.
+        """
+        containers = self.backend.get_containers()
+        with self._lock:
+            self._containers = dict((c.get(ContainerBackend.KEY_PK), dict(c)) for c in containers)
+        self.synced_at = time.time()
+        self._synced.set()
+
+    def _run(self, stopped):
+        """
+        Background loop (re)opening the event stream and applying its events until `stopped` is set.
+        """
+        delay = self.reconnect_delay
+        while not stopped.is_set():
+            try:
+                # subscribe first so no event is lost between the listing and the stream
+                events = self.backend.get_container_events()
+                self._resync()
+                delay = self.reconnect_delay
+                for event in events:
+                    if stopped.is_set():
+                        return
+                    self._apply(event)
+            except Exception:
+                pass  # the backend might be temporarily unavailable
+            if stopped.is_set():
+                return  # the view might already belong to a new run
+            self._synced.clear()
+            self.synced_at = None
+            if stopped.wait(delay):
+                return
+            self.reconnects += 1
+            delay = min(delay * 2, self.max_reconnect_delay)
@@ -0,0 +1,367 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+
+"""
+Outcomes reported for external operations.
+"""
+OUTCOME_ERROR = 'error'
+OUTCOME_NOT_FOUND = 'not_found'
+OUTCOME_OK = 'ok'
+
+
+def get_outcome(ex, not_found=()):
+    """
+    Return the outcome to report for an operation that raised `ex`.
+
+    :param ex: The raised exception.
+    :param not_found: Exception types telling that the object operated on does not exist.
+    """
+    if (not_found and isinstance(ex, not_found)) \
+            or getattr(getattr(ex, 'response', None), 'status_code', None) == 404:
+        return OUTCOME_NOT_FOUND
+    return OUTCOME_ERROR
+
+
+def instrument_call(instrumentation, backend, operation, func, args=(), kwargs=None, get_bytes=None, not_found=()):
+    """
+    Call `func` and report the call to `instrumentation`. Return what `func` returns.
+
+    :param instrumentation: The `Instrumentation` to report to.
+    :param backend: The name of the reporting backend.
+    :param operation: The name of the external operation.
+    :param func: The callable executing the operation.
+    :param args: The positional arguments for `func`.
+    :param kwargs: The keyword arguments for `func`.
+    :param get_bytes: If set, callable returning the number of bytes transferred (called after `func` returned).
+    :param not_found: Exception types to report as `OUTCOME_NOT_FOUND`.
+    """
+    outcome = OUTCOME_OK
+    started = time.time()
+    try:
+        return func(*args, **(kwargs or {}))
+    except Exception as ex:
+        outcome = get_outcome(ex, not_found)
+        raise
+    finally:
+        duration = time.time() - started
+        try:
+            instrumentation.report(backend, operation, duration, get_bytes() if get_bytes else None, outcome)
+        except Exception:
+            pass  # instrumentation must never break an operation
+
+
+class Instrumentation(object):
+
+    """
+    Receiver of the external operations executed by the backends (Docker API calls, HTTP requests,
+    LDAP operations and file system calls), one report per operation.
+
+    This default implementation ignores all reports. Implementations must be thread-safe and fast,
+    as they are called from the thread executing the operation.
+    """
+
+    def report(self, backend, operation, duration, bytes=None, outcome=OUTCOME_OK):
+        """
+        Record an executed external operation.
+
+        :param backend: The name of the reporting backend (i.e. `docker`).
+        :param operation: The name of the operation (i.e. `inspect_container` or `GET /containers/<id>`).
+        :param duration: Seconds the operation took.
+        :param bytes: Number of bytes transferred (request and response bodies) or `None` if unknown.
+        :param outcome: One of `OUTCOME_OK`, `OUTCOME_NOT_FOUND` or `OUTCOME_ERROR`.
+        """
+        pass
+
+    def wrap(self, func):
+        """
+        Return `func` prepared to be executed in another thread on behalf of the current one.
+
+        Used by backends that fan out work to thread pools, so implementations keeping per-thread
+        state (see `RequestCallCounter`) can attribute the operations to the right caller.
+
+        :param func: The callable to wrap.
+        """
+        return func
+
+
+class CompositeInstrumentation(Instrumentation):
+
+    """
+    Instrumentation passing every report on to several instrumentations.
+    """
+
+    def __init__(self, *instrumentations):
+        """
+        Initialize a new composite instrumentation.
+
+        :param instrumentations: The instrumentations to report to.
+        """
+        self.instrumentations = instrumentations
+
+    def report(self, backend, operation, duration, bytes=None, outcome=OUTCOME_OK):
+        """
+        :inherit.
+        """
+        for instrumentation in self.instrumentations:
+            instrumentation.report(backend, operation, duration, bytes, outcome)
+
+    def wrap(self, func):
+        """
+        :inherit.
+        """
+        for instrumentation in self.instrumentations:
+            func = instrumentation.wrap(func)
+        return func
+
+
+class InstrumentedProxy(object):
+
+    """
+    Proxy reporting every method call on the wrapped object as an external operation
+    (named after the method).
+
+    Used to instrument objects whose methods map to external operations one-to-one,
+    like a python-ldap connection.
+    """
+
+    def __init__(self, target, instrumentation, backend, not_found=()):
+        """
+        Initialize a new instrumented proxy.
+
+        :param target: The object to wrap.
+        :param instrumentation: The `Instrumentation` to report to.
+        :param backend: The name of the reporting backend.
+        :param not_found: Exception types to report as `OUTCOME_NOT_FOUND`.
+        """
+        self._backend = backend
+        self._instrumentation = instrumentation
+        self._not_found = not_found
+        self._target = target
+
+    def __getattr__(self, name):
+        """
+        Return the attribute `name` of the wrapped object, instrumenting it if it is a method.
+        """
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return instrument_call(
+                self._instrumentation, self._backend, name, attribute, args, kwargs, not_found=self._not_found
+            )
+        return call
+
+
+class PrometheusHistograms(Instrumentation):
+
+    """
+    Instrumentation aggregating the reports into Prometheus-style metrics:
+        - <namespace>_operation_duration_seconds: Histogram of the durations by backend, operation and outcome
+        - <namespace>_operation_bytes_total:      Counter of the transferred bytes by backend and operation
+
+    `render` returns them in the Prometheus text exposition format (to be served on a metrics endpoint).
+    """
+
+    """
+    Upper bounds (in seconds) of the default histogram buckets.
+    """
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, buckets=None, namespace='coco_backend'):
+        """
+        Initialize a new, empty set of histograms.
+
+        :param buckets: Sorted upper bounds (in seconds) of the histogram buckets.
+        :param namespace: Prefix of the metric names.
+        """
+        self.buckets = tuple(buckets or PrometheusHistograms.DEFAULT_BUCKETS)
+        self.namespace = namespace
+        self._bytes = {}  # (backend, operation) -> bytes
+        self._histograms = {}  # (backend, operation, outcome) -> [bucket counts, count, sum]
+        self._lock = threading.Lock()
+
+    def get_histogram(self, backend, operation, outcome=OUTCOME_OK):
+        """
+        Return the cumulative bucket counts (by upper bound), the count and sum of an operation's durations.
+
+        :param backend: The name of the backend.
+        :param operation: The name of the operation.
+        :param outcome: The outcome of the operations.
+        """
+        with self._lock:
+            histogram = self._histograms.get((backend, operation, outcome))
+            if histogram is None:
+                return None
+            counts, count, total = list(histogram[0]), histogram[1], histogram[2]
+        cumulative = 0
+        buckets = []
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        return {
+            'buckets': buckets,
+            'count': count,
+            'sum': total
+        }
+
+    def render(self):
+        """
+        Return all metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self._histograms.items())
+            transferred = sorted(self._bytes.items())
+
+        duration = self.namespace + '_operation_duration_seconds'
+        lines = [
+            '# HELP %s Duration of the external operations executed by the backends.' % duration,
+            '# TYPE %s histogram' % duration
+        ]
+        for (backend, operation, outcome), (counts, count, total) in histograms:
+            labels = 'backend="%s",operation="%s",outcome="%s"' % tuple(
+                self._escape(value) for value in (backend, operation, outcome)
+            )
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket{%s,le="%s"} %i' % (duration, labels, repr(float(bound)), cumulative))
+            lines.append('%s_bucket{%s,le="+Inf"} %i' % (duration, labels, count))
+            lines.append('%s_sum{%s} %s' % (duration, labels, repr(total)))
+            lines.append('%s_count{%s} %i' % (duration, labels, count))
+
+        size = self.namespace + '_operation_bytes_total'
+        lines.extend([
+            '# HELP %s Bytes transferred by the external operations executed by the backends.' % size,
+            '# TYPE %s counter' % size
+        ])
+        for (backend, operation), total in transferred:
+            lines.append('%s{backend="%s",operation="%s"} %i' % (
+                size, self._escape(backend), self._escape(operation), total
+            ))
+        return '\n'.join(lines) + '\n'
+
+    def report(self, backend, operation, duration, bytes=None, outcome=OUTCOME_OK):
+        """
+        :inherit.
+        """
+        bucket = bisect_left(self.buckets, duration)
+        with self._lock:
+            histogram = self._histograms.get((backend, operation, outcome))
+            if histogram is None:
+                histogram = self._histograms[(backend, operation, outcome)] = [[0] * len(self.buckets), 0, 0.0]
+            if bucket < len(self.buckets):
+                histogram[0][bucket] += 1
+            histogram[1] += 1
+            histogram[2] += duration
+            if bytes is not None:
+                self._bytes[(backend, operation)] = self._bytes.get((backend, operation), 0) + bytes
+
+    def reset(self):
+        """
+        Drop all recorded metrics.
+        """
+        with self._lock:
+            self._bytes.clear()
+            self._histograms.clear()
+
+    def _escape(self, value):
+        """
+        Return `value` escaped for use as a label value.
+        """
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestCallCounter(Instrumentation):
+
+    """
+    Instrumentation counting the external operations caused by each request (i.e. contract method call).
+
+    Requests are marked with `track`. The operations executed while a request is tracked (including those
+    fanned out to thread pools by the backends) are counted for that request, nested requests are counted
+    for all enclosing ones. Operations executed outside of any tracked request are not counted.
+    """
+
+    def __init__(self):
+        """
+        Initialize a new, empty call counter.
+        """
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = {}  # request -> {'requests': count, 'calls': {(backend, operation): count}}
+
+    def get_counts(self):
+        """
+        Return the number of tracked invocations and the total number of external operations per request
+        (by `<backend> <operation>`).
+        """
+        with self._lock:
+            return dict(
+                (request, {
+                    'requests': totals.get('requests'),
+                    'calls': dict(('%s %s' % key, count) for key, count in totals.get('calls').items())
+                })
+                for request, totals in self._totals.items()
+            )
+
+    def report(self, backend, operation, duration, bytes=None, outcome=OUTCOME_OK):
+        """
+        :inherit.
+        """
+        scopes = getattr(self._local, 'scopes', None)
+        if not scopes:
+            return
+        key = (backend, operation)
+        with self._lock:
+            for calls in scopes:
+                calls[key] = calls.get(key, 0) + 1
+
+    def reset(self):
+        """
+        Drop all recorded counts.
+        """
+        with self._lock:
+            self._totals.clear()
+
+    @contextmanager
+    def track(self, request):
+        """
+        Context manager counting the external operations executed within it for `request`.
+
+        Yields the dictionary of counts (by `(backend, operation)`) of this invocation only, which is complete
+        once the context is left.
+
+        :param request: The name of the request (i.e. the contract method or API endpoint).
+        """
+        calls = {}
+        previous = getattr(self._local, 'scopes', None) or []
+        self._local.scopes = previous + [calls]
+        try:
+            yield calls
+        finally:
+            self._local.scopes = previous
+            with self._lock:
+                totals = self._totals.setdefault(request, {'requests': 0, 'calls': {}})
+                totals['requests'] += 1
+                for key, count in calls.items():
+                    totals.get('calls')[key] = totals.get('calls').get(key, 0) + count
+
+    def wrap(self, func):
+        """
+        :inherit.
+        """
+        scopes = getattr(self._local, 'scopes', None)
+        if not scopes:
+            return func
+
+        def call(*args, **kwargs):
+            previous = getattr(self._local, 'scopes', None)
+            self._local.scopes = scopes
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.scopes = previous
+        return call
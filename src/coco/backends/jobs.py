@@ -0,0 +1,172 @@
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+import uuid
+
+
+class Job(object):
+
+    """
+    Handle to a unit of work that is executed in the background by a `JobQueue`.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, name):
+        """
+        Initialize a new job.
+
+        :param name: A human readable description of what the job does.
+        """
+        self.pk = uuid.uuid4().hex
+        self.name = name
+        self.status = Job.STATUS_PENDING
+        self.progress = {}
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def finish(self, result=None, error=None):
+        """
+        Mark the job as finished, either successfully or with an error.
+
+        :param result: The job's result if it succeeded.
+        :param error: The error message if it failed.
+        """
+        self.result = result
+        self.error = error
+        self.status = Job.STATUS_FAILED if error is not None else Job.STATUS_SUCCEEDED
+        self.finished_at = time.time()
+        self._done.set()
+
+    def is_done(self):
+        """
+        Return true if the job has finished (successfully or not).
+        """
+        return self._done.is_set()
+
+    def to_dict(self):
+        """
+        Return a serializable representation of the job.
+        """
+        return {
+            'pk': self.pk,
+            'name': self.name,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'attempts': self.attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+    def wait(self, timeout=None):
+        """
+        Block until the job has finished or `timeout` seconds passed.
+
+        Return true if the job has finished.
+
+        :param timeout: Maximum number of seconds to wait (`None` waits forever).
+        """
+        return self._done.wait(timeout)
+
+
+class JobQueue(object):
+
+    """
+    Bounded background executor for `Job`s with retries.
+
+    The callables run on a pool of `workers` threads. A failing callable is retried up to
+    `retries` times, waiting `retry_delay` seconds times the number of the attempt in between.
+    """
+
+    def __init__(self, workers=2, retries=2, retry_delay=5, keep=1000):
+        """
+        Initialize a new job queue.
+
+        :param workers: Maximum number of jobs running concurrently.
+        :param retries: How many times a failed job is retried.
+        :param retry_delay: Base delay in seconds between two attempts.
+        :param keep: Maximum number of finished jobs to remember.
+        """
+        self.keep = keep
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def close(self):
+        """
+        Let the worker threads exit once the submitted jobs have finished.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+
+    def get(self, pk):
+        """
+        Return the job with primary key `pk` or `None` if no such job is known.
+
+        :param pk: The job's primary key.
+        """
+        with self._lock:
+            return self._jobs.get(pk)
+
+    def submit(self, name, func, *args, **kwargs):
+        """
+        Schedule `func` for background execution and return the `Job` tracking it.
+
+        `func` is called with the job as its first argument (so it can report progress)
+        followed by `args` and `kwargs`. Its return value becomes the job's result.
+
+        :param name: A human readable description of the job.
+        :param func: The callable to execute.
+        """
+        job = Job(name)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers)
+            self._jobs[job.pk] = job
+            self._prune()
+        self._pool.apply_async(self._run, (job, func, args, kwargs))
+        return job
+
+    def _prune(self):
+        """
+        Forget the oldest finished jobs once more than `keep` jobs are known.
+        """
+        if len(self._jobs) <= self.keep:
+            return
+        finished = sorted(
+            (job for job in self._jobs.values() if job.is_done()),
+            key=lambda job: job.finished_at
+        )
+        for job in finished[:len(self._jobs) - self.keep]:
+            del self._jobs[job.pk]
+
+    def _run(self, job, func, args, kwargs):
+        """
+        Execute `func` for `job`, retrying on failure.
+        """
+        job.status = Job.STATUS_RUNNING
+        while True:
+            job.attempts += 1
+            try:
+                result = func(job, *args, **kwargs)
+                job.finish(result=result)
+                return
+            except Exception as ex:
+                if job.attempts > self.retries:
+                    job.finish(error=str(ex) or ex.__class__.__name__)
+                    return
+                time.sleep(self.retry_delay * job.attempts)
@@ -0,0 +1,187 @@
+from coco.contract.backends import ContainerBackend
+from coco.contract.errors import ContainerBackendError
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+
+class ContainerStatsSampler(object):
+
+    """
+    Shared sampler for the resource usage statistics of a `Docker` backend's containers.
+
+    Samples are taken from Docker's stats stream (one message per sample, the stream is closed right away)
+    and cached. Requests for a container sampled less than `max_age` seconds ago are served from the cache,
+    concurrent requests for the same container share a single sample. If `interval` is set, all running
+    containers are sampled in the background so requests are always served from the cache.
+
+    Each sample is a dictionary with the following keys:
+        - cpu_usage:      Total CPU time consumed (in nanoseconds)
+        - cpu_percent:    CPU usage since the previous sample (100 = one CPU), `None` for the first sample
+        - memory_usage:   Memory used (in bytes)
+        - memory_limit:   Memory limit (in bytes)
+        - blkio_read:     Bytes read from block devices
+        - blkio_write:    Bytes written to block devices
+        - network_rx:     Bytes received over the network
+        - network_tx:     Bytes sent over the network
+        - sampled_at:     Timestamp the sample was taken at
+    """
+
+    def __init__(self, backend, max_age=5, interval=None, workers=8):
+        """
+        Initialize a new stats sampler.
+
+        :param backend: The `Docker` backend whose containers to sample.
+        :param max_age: Seconds a sample is served from the cache.
+        :param interval: If set, seconds between two background samples of all running containers.
+        :param workers: Maximum number of containers sampled concurrently.
+        """
+        self.backend = backend
+        self.interval = interval
+        self.max_age = max_age
+        self.workers = workers
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._sampling = {}
+        self._stopped = threading.Event()
+        self._system_usage = {}
+        self._thread = None
+
+    def get(self, container):
+        """
+        Return the latest sample of `container`, sampling it if the cached one is too old.
+
+        :param container: The container identifier.
+        """
+        with self._lock:
+            latest = self._latest.get(container)
+        if latest is not None and time.time() - latest.get('sampled_at') <= self.max_age:
+            return latest
+        return self.sample(container)
+
+    def get_all(self):
+        """
+        Return the latest samples of all running containers, sampling those whose cached sample is too old.
+
+        Only the backend's containers (named with its `CONTAINER_NAME_PREFIX`) are sampled.
+        """
+        running = [
+            c.get(ContainerBackend.KEY_PK)
+            for c in self.backend.get_containers(only_running=True, name_prefix=self.backend.CONTAINER_NAME_PREFIX)
+        ]
+        with self._lock:
+            for container in set(self._latest) - set(running):
+                self._latest.pop(container, None)
+                self._system_usage.pop(container, None)
+        if not running:
+            return []
+        pool = ThreadPool(min(self.workers, len(running)))
+        try:
+            samples = pool.map(self._get_or_none, running)
+        finally:
+            pool.close()
+        return [sample for sample in samples if sample is not None]
+
+    def get_cached(self):
+        """
+        Return the cached samples of all containers without sampling any of them.
+        """
+        with self._lock:
+            return list(self._latest.values())
+
+    def sample(self, container):
+        """
+        Take a new sample of `container` and cache it.
+
+        If a sample of that container is already being taken, wait for it instead.
+
+        :param container: The container identifier.
+        """
+        with self._lock:
+            in_flight = self._sampling.get(container)
+            if in_flight is None:
+                self._sampling[container] = threading.Event()
+        if in_flight is not None:
+            in_flight.wait()
+            with self._lock:
+                latest = self._latest.get(container)
+            if latest is None:
+                raise ContainerBackendError("Sampling the container failed")
+            return latest
+
+        try:
+            raw = self.backend.sample_container_stats(container)
+            with self._lock:
+                latest = self._normalize(container, raw, self._latest.get(container))
+                self._latest[container] = latest
+            return latest
+        finally:
+            with self._lock:
+                self._sampling.pop(container).set()
+
+    def start(self):
+        """
+        Start sampling all running containers in the background every `interval` seconds.
+        """
+        if self._thread is not None or not self.interval:
+            return
+        self._stopped = threading.Event()  # one per run, so a previous loop cannot be revived
+        self._thread = threading.Thread(target=self._run, args=(self._stopped,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background sampling.
+        """
+        self._stopped.set()
+        self._thread = None
+
+    def _get_or_none(self, container):
+        """
+        Like `get`, but return `None` for containers that cannot be sampled (i.e. stopped in the meantime).
+        """
+        try:
+            return self.get(container)
+        except ContainerBackendError:
+            return None
+
+    def _normalize(self, container, raw, previous):
+        """
+        Turn a raw Docker stats message into a sample.
+        """
+        cpu_stats = raw.get('cpu_stats', {})
+        cpu_usage = cpu_stats.get('cpu_usage', {}).get('total_usage', 0)
+        system_usage = cpu_stats.get('system_cpu_usage', 0)
+        cpus = len(cpu_stats.get('cpu_usage', {}).get('percpu_usage') or [None])
+        cpu_percent = None
+        previous_system_usage = self._system_usage.get(container, 0)
+        if previous is not None and system_usage > previous_system_usage:
+            cpu_percent = float(cpu_usage - previous.get('cpu_usage')) \
+                / (system_usage - previous_system_usage) * cpus * 100
+        self._system_usage[container] = system_usage
+
+        blkio = raw.get('blkio_stats', {}).get('io_service_bytes_recursive') or []
+        networks = raw.get('networks') or {'eth0': raw.get('network') or {}}
+        return {
+            ContainerBackend.KEY_PK: container,
+            'cpu_usage': cpu_usage,
+            'cpu_percent': cpu_percent,
+            'memory_usage': raw.get('memory_stats', {}).get('usage', 0),
+            'memory_limit': raw.get('memory_stats', {}).get('limit', 0),
+            'blkio_read': sum(e.get('value', 0) for e in blkio if e.get('op') == 'Read'),
+            'blkio_write': sum(e.get('value', 0) for e in blkio if e.get('op') == 'Write'),
+            'network_rx': sum(n.get('rx_bytes', 0) for n in networks.values()),
+            'network_tx': sum(n.get('tx_bytes', 0) for n in networks.values()),
+            'sampled_at': time.time()
+        }
+
+    def _run(self, stopped):
+        """
+        Background loop calling `get_all` until `stopped` is set.
+        """
+        while not stopped.wait(self.interval):
+            try:
+                self.get_all()
+            except Exception:
+                pass  # the backend might be temporarily unavailable
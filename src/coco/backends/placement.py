@@ -0,0 +1,143 @@
+from coco.contract.errors import BackendError, ConnectionError, ContainerBackendError
+import threading
+import time
+
+
+class NodeSelector(object):
+
+    """
+    Picks the node (i.e. a `HttpRemote` backend) a new container should be created on.
+
+    Each node is scored by its live load and the node with the highest score wins:
+
+        score = memory_weight * free memory fraction
+              + containers_weight / (1 + running containers)
+              + image_weight (if the node already has the image)
+
+    Node loads and image locality are cached for `ttl` seconds, so placing many containers
+    in a row does not query every node each time. Nodes that cannot be reached are skipped.
+    """
+
+    def __init__(self, nodes, ttl=5, memory_weight=1.0, containers_weight=0.5, image_weight=0.5):
+        """
+        Initialize a new node selector.
+
+        :param nodes: The container backends (one per node) to choose from.
+        :param ttl: Seconds the load data of a node is cached.
+        :param memory_weight: Weight of the free memory fraction.
+        :param containers_weight: Weight of the (inverse) number of running containers.
+        :param image_weight: Bonus for nodes that already have the image.
+        """
+        self.containers_weight = containers_weight
+        self.image_weight = image_weight
+        self.memory_weight = memory_weight
+        self.nodes = list(nodes)
+        self.ttl = ttl
+        self._images = {}  # (node index, image) -> (fetched at, has image)
+        self._loads = {}  # node index -> (fetched at, load)
+        self._lock = threading.Lock()
+
+    def create_container(self, *args, **kwargs):
+        """
+        Create a container on the best node and return it.
+
+        Takes the same arguments as `ContainerBackend.create_container`.
+        """
+        node = self.select(kwargs.get('image'))
+        return node.create_container(*args, **kwargs)
+
+    def get_scores(self, image=None):
+        """
+        Return the score of every reachable node as a list of (node, score) tuples.
+
+        :param image: The image the container will be created from (if any).
+        """
+        scores = []
+        for index, node in enumerate(self.nodes):
+            try:
+                load = self._get_load(index)
+                has_image = image is not None and self._has_image(index, image)
+            except (BackendError, ConnectionError):
+                continue
+            memory_total = load.get('memory_total') or 0
+            free = 1 - float(load.get('memory_used', 0)) / memory_total if memory_total else 0
+            score = self.memory_weight * max(free, 0) \
+                + self.containers_weight / (1.0 + load.get('containers', 0)) \
+                + (self.image_weight if has_image else 0)
+            scores.append((node, score))
+        return scores
+
+    def invalidate(self):
+        """
+        Drop all cached load data.
+        """
+        with self._lock:
+            self._images.clear()
+            self._loads.clear()
+
+    def prefetch_container_images(self, images):
+        """
+        Ask every reachable node to pull `images` ahead of time.
+
+        Return a list of (node, prefetch job) tuples.
+
+        :param images: List of image PKs.
+        """
+        jobs = []
+        for node in self.nodes:
+            try:
+                jobs.append((node, node.prefetch_container_images(images)))
+            except (BackendError, ConnectionError):
+                continue
+        with self._lock:
+            self._images.clear()
+        return jobs
+
+    def select(self, image=None):
+        """
+        Return the node with the highest score.
+
+        :param image: The image the container will be created from (if any).
+        """
+        scores = self.get_scores(image)
+        if not scores:
+            raise ContainerBackendError("No node available")
+        node = max(scores, key=lambda score: score[1])[0]
+
+        # account for the new container until the load is fetched again
+        index = self.nodes.index(node)
+        with self._lock:
+            cached = self._loads.get(index)
+            if cached is not None:
+                load = dict(cached[1])
+                load['containers'] = load.get('containers', 0) + 1
+                self._loads[index] = (cached[0], load)
+            if image is not None:
+                self._images[(index, image)] = (time.time(), True)
+        return node
+
+    def _get_load(self, index):
+        """
+        Return the (cached) load of the node at `index`.
+        """
+        with self._lock:
+            cached = self._loads.get(index)
+        if cached is not None and time.time() - cached[0] <= self.ttl:
+            return cached[1]
+        load = self.nodes[index].get_node_load()
+        with self._lock:
+            self._loads[index] = (time.time(), load)
+        return load
+
+    def _has_image(self, index, image):
+        """
+        Return true if the node at `index` already has `image` (cached).
+        """
+        with self._lock:
+            cached = self._images.get((index, image))
+        if cached is not None and time.time() - cached[0] <= self.ttl:
+            return cached[1]
+        has_image = self.nodes[index].container_image_exists(image)
+        with self._lock:
+            self._images[(index, image)] = (time.time(), has_image)
+        return has_image
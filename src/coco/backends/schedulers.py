@@ -0,0 +1,437 @@
+from coco.contract.backends import ContainerBackend
+from coco.contract.errors import ContainerBackendError, ContainerNotFoundError, IllegalContainerStateError
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+
+class IdleContainerSuspender(object):
+
+    """
+    Suspends containers that have been idle for too long.
+
+    Every `interval` seconds, the CPU and network counters of all running containers created by the backend
+    (named with its `CONTAINER_NAME_PREFIX`) are sampled from the Docker stats API (through the backend's
+    shared stats sampler), other containers on the host are left alone. A container is considered
+    idle while it uses less than `cpu_threshold` CPUs and transfers less than `network_threshold` bytes
+    per second. Containers idle for longer than `idle_timeout` seconds are suspended using the backend's
+    `suspend_container`.
+
+    The backend reports the containers it resumes to `record_resume`, so the resume is counted and the
+    container is not suspended again right away.
+    """
+
+    def __init__(self, backend, idle_timeout=1800, interval=60,
+                 cpu_threshold=0.01, network_threshold=1024, workers=8):
+        """
+        Initialize a new idle container suspender.
+
+        :param backend: The `Docker` backend whose containers to suspend.
+        :param idle_timeout: Seconds after which an idle container is suspended.
+        :param interval: Seconds between two activity samples.
+        :param cpu_threshold: CPU usage (in CPUs) below which a container is considered idle.
+        :param network_threshold: Network traffic (in bytes per second) below which a container is considered idle.
+        :param workers: Maximum number of containers sampled concurrently.
+        """
+        self.backend = backend
+        self.cpu_threshold = cpu_threshold
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self.network_threshold = network_threshold
+        self.resumed = 0
+        self.suspended = 0
+        self.workers = workers
+        self._activity = {}  # container -> (sampled at, CPU ns, network bytes, last active at)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def get_stats(self):
+        """
+        Return the number of suspended and resumed containers and how many containers are tracked.
+        """
+        with self._lock:
+            return {
+                'suspended': self.suspended,
+                'resumed': self.resumed,
+                'tracked': len(self._activity)
+            }
+
+    def record_resume(self, container):
+        """
+        Count the resume of `container` and reset its idle time.
+
+        :param container: The container identifier.
+        """
+        with self._lock:
+            self.resumed += 1
+            self._activity.pop(container, None)
+
+    def run_once(self):
+        """
+        Sample all running containers of the backend and suspend those idle for longer than `idle_timeout`.
+
+        Return the list of suspended containers.
+        """
+        containers = self.backend.get_containers(only_running=True, name_prefix=self.backend.CONTAINER_NAME_PREFIX)
+        running = [
+            c.get(ContainerBackend.KEY_PK) for c in containers
+            if c.get(ContainerBackend.CONTAINER_KEY_STATUS) == ContainerBackend.CONTAINER_STATUS_RUNNING
+        ]
+        with self._lock:
+            for container in set(self._activity) - set(running):
+                del self._activity[container]
+        if not running:
+            return []
+
+        pool = ThreadPool(min(self.workers, len(running)))
+        try:
+            idle = [c for c in pool.map(self._check, running) if c is not None]
+        finally:
+            pool.close()
+
+        suspended = []
+        for container in idle:
+            try:
+                self.backend.suspend_container(container)
+                suspended.append(container)
+            except (ContainerNotFoundError, IllegalContainerStateError):
+                pass  # gone or stopped in the meantime
+            with self._lock:
+                self._activity.pop(container, None)
+        with self._lock:
+            self.suspended += len(suspended)
+        return suspended
+
+    def start(self):
+        """
+        Start sampling and suspending in the background every `interval` seconds.
+        """
+        if self._thread is not None:
+            return
+        self._stopped = threading.Event()  # one per run, so a previous loop cannot be revived
+        self._thread = threading.Thread(target=self._run, args=(self._stopped,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background sampling.
+        """
+        self._stopped.set()
+        self._thread = None
+
+    def _check(self, container):
+        """
+        Sample `container` and return it if it has been idle for longer than `idle_timeout`.
+        """
+        try:
+            stats = self.backend.get_container_stats(container)
+        except ContainerBackendError:
+            return None
+        now = stats.get('sampled_at')
+        cpu = stats.get('cpu_usage')
+        network = stats.get('network_rx') + stats.get('network_tx')
+
+        with self._lock:
+            previous = self._activity.get(container)
+            if previous is None:
+                self._activity[container] = (now, cpu, network, now)
+                return None
+            sampled_at, previous_cpu, previous_network, active_at = previous
+            elapsed = max(now - sampled_at, 1e-6)
+            if (cpu - previous_cpu) / 1e9 / elapsed >= self.cpu_threshold \
+                    or (network - previous_network) / elapsed >= self.network_threshold:
+                active_at = now
+            self._activity[container] = (now, cpu, network, active_at)
+            return container if now - active_at > self.idle_timeout else None
+
+    def _run(self, stopped):
+        """
+        Background loop calling `run_once` until `stopped` is set.
+        """
+        while not stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                pass  # the backend might be temporarily unavailable
+
+
+class CpusetPacker(object):
+
+    """
+    Assigns cpusets to new containers so the load is spread evenly across a node's CPU cores.
+
+    Each container is pinned to the `cpus_per_container` cores with the fewest containers pinned to them.
+    The current assignment is loaded from the backend's existing containers on first use.
+    """
+
+    def __init__(self, backend, cpus_per_container=1):
+        """
+        Initialize a new cpuset packer.
+
+        :param backend: The `Docker` backend whose containers to pin.
+        :param cpus_per_container: Number of cores each container is pinned to.
+        """
+        self.backend = backend
+        self.cpus_per_container = cpus_per_container
+        self._assignments = None  # container -> list of cores
+        self._load = None  # core -> number of containers pinned to it
+        self._lock = threading.Lock()
+
+    def bind(self, container, cores):
+        """
+        Record that `container` has been created with the reserved `cores`.
+
+        :param container: The container identifier.
+        :param cores: The cores as returned by `reserve`.
+        """
+        with self._lock:
+            self._assignments[container] = cores
+
+    def free(self, cores):
+        """
+        Give back reserved `cores` that have not been bound to a container.
+
+        :param cores: The cores as returned by `reserve`.
+        """
+        with self._lock:
+            for core in cores:
+                self._load[core] = max(self._load.get(core, 0) - 1, 0)
+
+    def get_load(self):
+        """
+        Return the number of containers pinned to each core.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._load)
+
+    def parse_cpuset(self, cpuset):
+        """
+        Return the list of cores in a cpuset string (i.e. `0-2,4` -> [0, 1, 2, 4]).
+
+        :param cpuset: The cpuset string.
+        """
+        cores = []
+        for part in (cpuset or '').split(','):
+            if '-' in part:
+                start, end = part.split('-')
+                cores.extend(range(int(start), int(end) + 1))
+            elif part.strip():
+                cores.append(int(part))
+        return cores
+
+    def release(self, container):
+        """
+        Release the cores `container` is pinned to (i.e. because it has been deleted).
+
+        :param container: The container identifier.
+        """
+        with self._lock:
+            if self._assignments is None:
+                return
+            cores = self._assignments.pop(container, None)
+        if cores:
+            self.free(cores)
+
+    def reserve(self):
+        """
+        Reserve the `cpus_per_container` least loaded cores for a new container and return them.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            cores = sorted(self._load, key=lambda core: (self._load[core], core))[:self.cpus_per_container]
+            for core in cores:
+                self._load[core] += 1
+            return sorted(cores)
+
+    def transfer(self, source, target):
+        """
+        Move the cores the container `source` is pinned to to the container `target` (i.e. after a restore).
+
+        :param source: The identifier of the container currently pinned to the cores.
+        :param target: The identifier of the container taking them over.
+        """
+        with self._lock:
+            if self._assignments is not None and source in self._assignments:
+                self._assignments[target] = self._assignments.pop(source)
+
+    def _ensure_loaded(self):
+        """
+        Load the current core assignment from the backend (once).
+        """
+        if self._load is not None:
+            return
+        load = dict((core, 0) for core in range(self.backend.get_cpu_count()))
+        assignments = {}
+        for container, cpuset in self.backend.get_container_cpusets().items():
+            cores = [core for core in self.parse_cpuset(cpuset) if core in load]
+            for core in cores:
+                load[core] += 1
+            assignments[container] = cores
+        self._assignments = assignments
+        self._load = load
+
+
+class PortAllocator(object):
+
+    """
+    Allocates host ports for the port mappings of new containers.
+
+    The reserved host ports are tracked in a bitmap (one bit per port). Free ports are handed out
+    from the configured `ranges`, searching from where the last allocation stopped. Ports given
+    explicitly are reserved as well, so conflicts are detected before a container is created.
+    The current reservations are loaded from the backend's existing containers on first use.
+    """
+
+    def __init__(self, backend, ranges=((49152, 65535),)):
+        """
+        Initialize a new port allocator.
+
+        :param backend: The `Docker` backend whose containers' ports to manage.
+        :param ranges: List of (first, last) host port ranges ports are allocated from.
+        """
+        self.backend = backend
+        self.ranges = [(int(first), int(last)) for first, last in ranges]
+        self._assignments = None  # container -> list of ports
+        self._bitmap = None
+        self._cursor = 0  # index into the allocatable ports where the next search starts
+        self._lock = threading.Lock()
+        self._size = sum(last - first + 1 for first, last in self.ranges)
+
+    def bind(self, container, ports):
+        """
+        Record that `container` has been created with the reserved `ports`.
+
+        :param container: The container identifier.
+        :param ports: The ports as returned by `reserve`.
+        """
+        with self._lock:
+            self._assignments[container] = list(ports)
+
+    def free(self, ports):
+        """
+        Give back reserved `ports` that have not been bound to a container.
+
+        :param ports: The ports as returned by `reserve`.
+        """
+        with self._lock:
+            for port in ports:
+                self._set(port, False)
+
+    def get_free_count(self):
+        """
+        Return the number of ports still available for allocation.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return len([i for i in range(self._size) if not self._is_set(self._port_at(i))])
+
+    def is_reserved(self, port):
+        """
+        Return true if the host port `port` is reserved.
+
+        :param port: The host port number.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._is_set(port)
+
+    def release(self, container):
+        """
+        Release the ports bound to `container` (i.e. because it has been deleted).
+
+        :param container: The container identifier.
+        """
+        with self._lock:
+            if self._assignments is None:
+                return
+            ports = self._assignments.pop(container, None)
+        if ports:
+            self.free(ports)
+
+    def reserve(self, ports=(), count=0):
+        """
+        Atomically reserve the explicitly requested `ports` and `count` additional ones.
+
+        Return the additionally allocated ports. Nothing is reserved if a requested port
+        is already taken or not enough ports are available.
+
+        :param ports: Host ports that have to be reserved as they are.
+        :param count: Number of ports to allocate from the configured ranges.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            for port in ports:
+                if self._is_set(port):
+                    raise ContainerBackendError("Port %i is already in use" % port)
+            for port in ports:
+                self._set(port, True)
+
+            allocated = []
+            index = self._cursor
+            for _ in range(self._size):
+                if len(allocated) == count:
+                    break
+                port = self._port_at(index)
+                index = (index + 1) % self._size
+                if not self._is_set(port):
+                    self._set(port, True)
+                    allocated.append(port)
+            if len(allocated) < count:
+                for port in list(ports) + allocated:
+                    self._set(port, False)
+                raise ContainerBackendError("No free port available")
+            self._cursor = index
+            return allocated
+
+    def transfer(self, source, target):
+        """
+        Move the ports bound to the container `source` to the container `target` (i.e. after a restore).
+
+        :param source: The identifier of the container currently holding the ports.
+        :param target: The identifier of the container taking them over.
+        """
+        with self._lock:
+            if self._assignments is not None and source in self._assignments:
+                self._assignments[target] = self._assignments.pop(source)
+
+    def _ensure_loaded(self):
+        """
+        Load the ports used by the backend's containers (once).
+        """
+        if self._bitmap is not None:
+            return
+        bitmap = bytearray(65536 // 8)
+        assignments = self.backend.get_container_ports()
+        for ports in assignments.values():
+            for port in ports:
+                bitmap[port >> 3] |= 1 << (port & 7)
+        self._assignments = assignments
+        self._bitmap = bitmap
+
+    def _is_set(self, port):
+        """
+        Return true if the bit of `port` is set.
+        """
+        return bool(self._bitmap[port >> 3] & (1 << (port & 7)))
+
+    def _port_at(self, index):
+        """
+        Return the `index`th allocatable port (counted across all ranges).
+        """
+        for first, last in self.ranges:
+            if index <= last - first:
+                return first + index
+            index -= last - first + 1
+        raise IndexError(index)
+
+    def _set(self, port, reserved):
+        """
+        Set (or clear) the bit of `port`.
+        """
+        if reserved:
+            self._bitmap[port >> 3] |= 1 << (port & 7)
+        else:
+            self._bitmap[port >> 3] &= ~(1 << (port & 7)) & 0xff
@@ -0,0 +1,240 @@
+from coco.contract.backends import ContainerBackend
+from coco.contract.errors import ContainerBackendError
+import threading
+import time
+
+
+class SnapshotRetentionPolicy(object):
+
+    """
+    Decides which of a container's snapshots are kept.
+
+    A snapshot is kept if it is one of the `keep_last` newest snapshots, the newest snapshot
+    of one of the `keep_daily` most recent days or the newest of one of the `keep_weekly`
+    most recent weeks (days and weeks that have snapshots, in UTC).
+    """
+
+    def __init__(self, keep_last=5, keep_daily=7, keep_weekly=4):
+        """
+        Initialize a new retention policy.
+
+        :param keep_last: Number of most recent snapshots to keep.
+        :param keep_daily: Number of days for which the newest snapshot is kept.
+        :param keep_weekly: Number of weeks for which the newest snapshot is kept.
+        """
+        self.keep_daily = keep_daily
+        self.keep_last = keep_last
+        self.keep_weekly = keep_weekly
+
+    def select(self, snapshots):
+        """
+        Return the PKs of the snapshots to keep.
+
+        :param snapshots: A container's snapshots as returned by `Docker.get_container_snapshot_lineages`
+                          (newest first).
+        """
+        keep = set(sh.get(ContainerBackend.KEY_PK) for sh in snapshots[:self.keep_last])
+        for fmt, limit in (('%Y-%m-%d', self.keep_daily), ('%Y-%W', self.keep_weekly)):
+            buckets = set()
+            for snapshot in snapshots:
+                bucket = time.strftime(fmt, time.gmtime(snapshot.get('created')))
+                if bucket in buckets:
+                    continue
+                if len(buckets) == limit:
+                    break
+                buckets.add(bucket)
+                keep.add(snapshot.get(ContainerBackend.KEY_PK))
+        return keep
+
+
+class SnapshotManager(object):
+
+    """
+    Enforces a `SnapshotRetentionPolicy` on the snapshots of a `Docker` backend.
+
+    Pruning can be triggered manually (`prune`) or periodically in the background (`start`).
+    Snapshots still in use by a container are never removed.
+    """
+
+    def __init__(self, backend, policy=None, interval=3600):
+        """
+        Initialize a new snapshot manager.
+
+        :param backend: The `Docker` backend to manage the snapshots of.
+        :param policy: The retention policy to apply (defaults to `SnapshotRetentionPolicy()`).
+        :param interval: Seconds between two background prune runs.
+        """
+        self.backend = backend
+        self.interval = interval
+        self.policy = policy or SnapshotRetentionPolicy()
+        self.reclaimed_bytes = 0
+        self.removed_snapshots = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def prune(self):
+        """
+        Remove all snapshots not retained by the policy as well as dangling image layers.
+
+        Return a dictionary with the removed snapshot PKs and the reclaimed bytes.
+        """
+        removed = []
+        reclaimed = 0
+        for container, snapshots in self.backend.get_container_snapshot_lineages().items():
+            keep = self.policy.select(snapshots)
+            for snapshot in snapshots:
+                pk = snapshot.get(ContainerBackend.KEY_PK)
+                if pk in keep:
+                    continue
+                try:
+                    self.backend.delete_container_snapshot(pk, force=False)
+                    removed.append(pk)
+                    reclaimed += snapshot.get('size', 0)
+                except ContainerBackendError:
+                    pass  # still in use, try again next time
+        reclaimed += self.backend.prune_dangling_container_images()
+
+        self.reclaimed_bytes += reclaimed
+        self.removed_snapshots += len(removed)
+        return {
+            'removed': removed,
+            'reclaimed_bytes': reclaimed
+        }
+
+    def start(self):
+        """
+        Start pruning in the background every `interval` seconds.
+        """
+        if self._thread is not None:
+            return
+        self._stopped = threading.Event()  # one per run, so a previous loop cannot be revived
+        self._thread = threading.Thread(target=self._run, args=(self._stopped,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background pruning.
+        """
+        self._stopped.set()
+        self._thread = None
+
+    def _run(self, stopped):
+        """
+        Background loop calling `prune` until `stopped` is set.
+        """
+        while not stopped.wait(self.interval):
+            try:
+                self.prune()
+            except Exception:
+                pass  # the backend might be temporarily unavailable
+
+
+class SnapshotIndex(object):
+
+    """
+    In-memory index of a `Docker` backend's snapshot images.
+
+    Maps snapshot tags to their image (as returned by Docker's image listing) and
+    image repositories (one per container) to the tags of their snapshots.
+    The index is (re)built from a single image listing after `ttl` seconds and kept
+    current by the backend when snapshots are created or deleted in between.
+    """
+
+    def __init__(self, ttl=300):
+        """
+        Initialize a new, empty snapshot index.
+
+        :param ttl: Seconds after which the index needs to be rebuilt.
+        """
+        self.ttl = ttl
+        self._images = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._repositories = {}
+
+    def add(self, image):
+        """
+        Add (or replace) a snapshot image in the index.
+
+        :param image: The snapshot image as returned by Docker's image listing.
+        """
+        tag = image.get('RepoTags')[0]
+        with self._lock:
+            self._images[tag] = image
+            self._repositories.setdefault(self.get_repository(tag), set()).add(tag)
+
+    def all(self):
+        """
+        Return all indexed snapshot images.
+        """
+        with self._lock:
+            return list(self._images.values())
+
+    def for_repository(self, repository):
+        """
+        Return the snapshot images of the given image repository.
+
+        :param repository: The image repository (i.e. coco-u2500/ipython).
+        """
+        with self._lock:
+            return [self._images[tag] for tag in self._repositories.get(repository, ())]
+
+    def get(self, tag):
+        """
+        Return the snapshot image tagged exactly `tag` or `None` if there is no such snapshot.
+
+        :param tag: The snapshot tag to lookup.
+        """
+        with self._lock:
+            return self._images.get(tag)
+
+    def get_repository(self, tag):
+        """
+        Return the image repository part of a snapshot tag.
+
+        :param tag: The snapshot tag (i.e. coco-u2500/ipython:snapshot-name).
+        """
+        return tag.rsplit(':', 1)[0]
+
+    def invalidate(self):
+        """
+        Mark the index as stale so it is rebuilt on next use.
+        """
+        self._loaded_at = None
+
+    def is_stale(self):
+        """
+        Return true if the index has never been loaded or is older than `ttl` seconds.
+        """
+        return self._loaded_at is None or time.time() - self._loaded_at > self.ttl
+
+    def load(self, images):
+        """
+        Replace the index content with `images`.
+
+        :param images: All snapshot images as returned by Docker's image listing.
+        """
+        by_tag = {}
+        repositories = {}
+        for image in images:
+            tag = image.get('RepoTags')[0]
+            by_tag[tag] = image
+            repositories.setdefault(self.get_repository(tag), set()).add(tag)
+        with self._lock:
+            self._images = by_tag
+            self._repositories = repositories
+            self._loaded_at = time.time()
+
+    def remove(self, tag):
+        """
+        Remove the snapshot tagged `tag` from the index (if indexed).
+
+        :param tag: The snapshot tag to remove.
+        """
+        with self._lock:
+            if self._images.pop(tag, None) is not None:
+                tags = self._repositories.get(self.get_repository(tag), set())
+                tags.discard(tag)
+                if not tags:
+                    self._repositories.pop(self.get_repository(tag), None)
@@ -1,3 +1,4 @@
+from coco.backends.instrumentation import Instrumentation, InstrumentedProxy
 from coco.common.utils import FileSystem
 from coco.contract.backends import StorageBackend
 from coco.contract.errors import DirectoryNotFoundError, StorageBackendError
@@ -9,12 +10,15 @@ class LocalFileSystem(StorageBackend):
     Storage backend implementation using the local filesystem as the underlaying backend.
     """
 
-    def __init__(self, base_dir):
+    def __init__(self, base_dir, instrumentation=None):
         """
         :inherit.
+
+        :param instrumentation: The `Instrumentation` to report the file system calls to.
         """
         super(LocalFileSystem, self).__init__(base_dir)
-        self._fs = FileSystem(base_dir)
+        self.instrumentation = instrumentation or Instrumentation()
+        self._fs = InstrumentedProxy(FileSystem(base_dir), self.instrumentation, 'local_fs')
 
     def dir_exists(self, dir_name, **kwargs):
         """
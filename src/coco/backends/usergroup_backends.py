@@ -1,3 +1,4 @@
+from coco.backends.instrumentation import Instrumentation, InstrumentedProxy
 from coco.contract.backends import GroupBackend, UserBackend
 from coco.contract.errors import *
 import ldap
@@ -27,7 +28,7 @@ class LdapBackend(GroupBackend, UserBackend):
     as a constructor argument.
     """
 
-    def __init__(self, server, base_dn, users_dn=None, groups_dn=None, readonly=False):
+    def __init__(self, server, base_dn, users_dn=None, groups_dn=None, readonly=False, instrumentation=None):
         """
         Initialize a new LDAP backend.
 
@@ -36,12 +37,14 @@ class LdapBackend(GroupBackend, UserBackend):
         :param users_dn: The DN to use for user related operations (relative to `base_dn`).
         :param groups_dn: The DN to use for group related operations (relative to `base_dn`).
         :param readonly: Either the server is read-only or not.
+        :param instrumentation: The `Instrumentation` to report the LDAP operations to.
         """
         if "ldap://" not in server:
             server = "ldap://" + server
 
         self.base_dn = base_dn
         self.groups_dn = groups_dn
+        self.instrumentation = instrumentation or Instrumentation()
         self.readonly = readonly
         self.server = server
         self.users_dn = users_dn
@@ -77,7 +80,7 @@ class LdapBackend(GroupBackend, UserBackend):
             raise UserNotFoundError
 
         try:
-            user_ldap = LdapBackend(self.server, self.base_dn, self.users_dn)
+            user_ldap = LdapBackend(self.server, self.base_dn, self.users_dn, instrumentation=self.instrumentation)
             user_ldap.connect({
                 'dn': user_ldap.get_full_user_dn(user),
                 'password': password
@@ -102,7 +105,9 @@ class LdapBackend(GroupBackend, UserBackend):
             username = dn
 
         try:
-            self.cnx = ldap.initialize(self.server)
+            self.cnx = InstrumentedProxy(
+                ldap.initialize(self.server), self.instrumentation, 'ldap', not_found=(ldap.NO_SUCH_OBJECT,)
+            )
             self.cnx.bind_s(str(username), str(credentials.get('password')))
         except ldap.INVALID_CREDENTIALS as ex:
             raise AuthenticationError(ex)
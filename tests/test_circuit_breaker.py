@@ -0,0 +1,67 @@
+from coco.backends.circuit_breaker import CircuitBreaker, CircuitOpenError
+import time
+import unittest
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def open(self, breaker):
+        for i in range(breaker.failure_threshold):
+            breaker.before_request()
+            breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open())
+
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+        self.assertRaises(CircuitOpenError, breaker.before_request)
+        self.assertEqual(breaker.get_state().get('state'), CircuitBreaker.STATE_OPEN)
+        self.assertEqual(breaker.get_state().get('failures'), 3)
+
+    def test_single_probe_closes_the_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.open(breaker)
+
+        self.assertTrue(breaker.before_request())
+        self.assertRaises(CircuitOpenError, breaker.before_request)
+        breaker.record_success()
+
+        self.assertFalse(breaker.before_request())
+        self.assertEqual(breaker.get_state(), {'state': CircuitBreaker.STATE_CLOSED, 'failures': 0, 'opened_at': None})
+
+    def test_failed_probe_reopens_the_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        self.open(breaker)
+        time.sleep(0.1)
+
+        self.assertTrue(breaker.before_request())
+        breaker.record_failure()
+        self.assertRaises(CircuitOpenError, breaker.before_request)
+
+    def test_released_probe_lets_the_next_probe_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.open(breaker)
+
+        self.assertTrue(breaker.before_request())
+        breaker.release_probe()  # i.e. the probe raised an unexpected error
+
+        self.assertTrue(breaker.before_request())
+
+    def test_release_after_the_outcome_is_a_no_op(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.open(breaker)
+
+        self.assertTrue(breaker.before_request())
+        breaker.record_failure()
+        breaker.release_probe()
+        self.assertEqual(breaker.get_state().get('state'), CircuitBreaker.STATE_OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
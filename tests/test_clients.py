@@ -0,0 +1,182 @@
+from coco.backends.clients import DockerClientPool, InspectCache
+from coco.backends.instrumentation import Instrumentation
+import Queue
+import threading
+import time
+import unittest
+import weakref
+
+
+class InspectCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = InspectCache(ttl=60)
+        self.loads = []
+
+    def load(self):
+        self.loads.append(True)
+        return {'State': {'Running': True}}
+
+    def test_results_are_cached(self):
+        self.assertEqual(self.cache.get('a', self.load), {'State': {'Running': True}})
+        self.assertEqual(self.cache.get('a', self.load), {'State': {'Running': True}})
+        self.cache.get('b', self.load)
+
+        self.assertEqual(len(self.loads), 2)
+        self.assertEqual(self.cache.get_stats(), {'hits': 1, 'misses': 2})
+
+    def test_callers_get_their_own_copy(self):
+        self.cache.get('a', self.load)['State']['Running'] = False
+        self.cache.get('a', self.load)['State']['Running'] = False
+
+        self.assertEqual(self.cache.get('a', self.load), {'State': {'Running': True}})
+
+    def test_expired_results_are_reloaded(self):
+        cache = InspectCache(ttl=0.05)
+        cache.get('a', self.load)
+        time.sleep(0.1)
+        cache.get('a', self.load)
+
+        self.assertEqual(len(self.loads), 2)
+
+    def test_failed_loads_are_not_cached(self):
+        def broken():
+            raise ValueError('daemon unavailable')
+
+        self.assertRaises(ValueError, self.cache.get, 'a', broken)
+        self.cache.get('a', self.load)
+        self.assertEqual(len(self.loads), 1)
+
+    def test_invalidate(self):
+        self.cache.get('a', self.load)
+        self.cache.invalidate()
+        self.cache.get('a', self.load)
+
+        self.assertEqual(len(self.loads), 2)
+
+    def test_concurrent_requests_share_a_single_load(self):
+        loading = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            loading.set()
+            release.wait(5)
+            return self.load()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.cache.get('a', slow)))
+        leader.start()
+        self.assertTrue(loading.wait(5))
+        follower = threading.Thread(target=lambda: results.append(self.cache.get('a', slow)))
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(len(self.loads), 1)
+        self.assertEqual(len(results), 2)
+        self.assertIsNot(results[0], results[1])
+
+
+class FakeStreamClient(object):
+
+    def __init__(self):
+        self.closed = False
+        self.shut_down = threading.Event()
+        self.stream_response = 'response'
+
+    def attach(self, container, stream=False):
+        return 'output'
+
+    def close(self):
+        self.closed = True
+
+    def events(self):
+        raise ValueError('daemon unavailable')
+
+    def logs(self, container, stream=False):
+        yield 'started'
+        self.shut_down.wait(5)  # blocks like a read on the connection until it is shut down
+
+    def stats(self, container):
+        yield '{"id": 1}'
+        yield '{"id": 2}'
+
+    def _get_raw_response_socket(self, response):
+        return self
+
+    def shutdown(self, how):
+        self.shut_down.set()
+
+
+class DockerClientPoolStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clients = []
+        self.pool = DockerClientPool.__new__(DockerClientPool)
+        self.pool.default_timeout = 10
+        self.pool.inspect_cache = None
+        self.pool.instrumentation = Instrumentation()
+        self.pool.timeouts = {}
+        self.pool.create_client = lambda timeout: self.clients.append(FakeStreamClient()) or self.clients[-1]
+        self.pool._closed = False
+        self.pool._idle = Queue.LifoQueue()
+        self.pool._lock = threading.Lock()
+        self.pool._streams = weakref.WeakSet()
+
+    def test_client_is_closed_once_the_stream_is_exhausted(self):
+        stream = self.pool.stats('a')
+        self.assertFalse(self.clients[0].closed)
+
+        self.assertEqual(list(stream), ['{"id": 1}', '{"id": 2}'])
+        self.assertTrue(self.clients[0].closed)
+
+    def test_client_is_closed_with_the_stream(self):
+        stream = self.pool.stats('a')
+        next(stream)
+        stream.close()
+        self.assertTrue(self.clients[0].closed)
+
+        unconsumed = self.pool.stats('b')
+        unconsumed.close()
+        self.assertTrue(self.clients[1].closed)
+
+    def test_client_is_closed_without_a_stream(self):
+        self.assertEqual(self.pool.attach('a'), 'output')
+        self.assertRaises(ValueError, self.pool.events)
+        self.assertTrue(all(client.closed for client in self.clients))
+        self.assertEqual(len(self.clients), 2)
+
+    def test_stream_iterated_in_another_thread_is_closed(self):
+        stream = self.pool.logs('a', stream=True)
+        consumed = []
+        thread = threading.Thread(target=lambda: consumed.extend(stream))
+        thread.start()
+        while not consumed:
+            time.sleep(0.01)
+
+        stream.close()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(self.clients[0].shut_down.is_set())
+        self.assertTrue(self.clients[0].closed)
+
+    def test_pool_is_closed(self):
+        idle = [FakeStreamClient(), FakeStreamClient()]
+        for client in idle:
+            self.pool.release(client)
+        stream = self.pool.stats('a')
+
+        self.pool.close()
+        self.assertTrue(all(client.closed for client in idle + self.clients))
+        self.assertRaises(StopIteration, next, stream)
+
+        checked_out = FakeStreamClient()
+        self.pool.release(checked_out)
+        self.assertTrue(checked_out.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
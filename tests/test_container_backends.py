@@ -0,0 +1,1059 @@
+from coco.backends.circuit_breaker import CircuitBreaker
+from coco.backends.container_backends import CONTAINER_KEY_NAME, CONTAINER_KEY_OWNER, CONTENT_TYPE_JSON, \
+    CONTENT_TYPE_MSGPACK, Docker, HttpRemote, decode_payload, encode_payload, filter_containers
+from coco.backends.events import ContainerStateWatcher
+from coco.backends.instrumentation import Instrumentation
+from coco.backends.jobs import Job, JobQueue
+from coco.backends.metrics import ContainerStatsSampler
+from coco.backends.schedulers import IdleContainerSuspender, PortAllocator
+from coco.backends.snapshots import SnapshotIndex
+from coco.contract.backends import SuspendableContainerBackend
+from coco.contract.errors import ContainerBackendError, ContainerNotFoundError, ContainerSnapshotNotFoundError
+from docker.errors import APIError as DockerError
+import json
+import requests
+import threading
+import time
+import unittest
+import zlib
+
+
+class FakeClient(object):
+
+    """
+    Stand-in for the backend's docker-py client pool, recording the calls made.
+
+    Calls return the value configured for the method name (called with the arguments if callable).
+    """
+
+    def __init__(self, **results):
+        self.calls = []
+        self.results = results
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            result = self.results.get(name)
+            return result(*args, **kwargs) if callable(result) else result
+        return call
+
+    def get_calls(self, name):
+        return [call for call in self.calls if call[0] == name]
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, content='', headers=None):
+        self.content = content
+        self.headers = headers or {}
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(response=self)
+
+
+def make_docker(client):
+    """
+    Return a `Docker` backend using `client`, without connecting to a daemon or starting background threads.
+    """
+    backend = Docker.__new__(Docker)
+    backend._client = client
+    backend.container_watcher = None
+    backend._cpuset_packer = None
+    backend._port_allocator = None
+    backend.idle_suspender = None
+    return backend
+
+
+class PortReservationTest(unittest.TestCase):
+
+    def setUp(self):
+        class Backend(object):
+            def get_container_ports(self):
+                return {'abc': [50000]}
+
+        self.client = FakeClient(
+            inspect_container={'Id': 'abc', 'State': {'Running': False, 'Paused': False}},
+            create_container={'Id': 'def'}
+        )
+        self.backend = make_docker(self.client)
+        self.backend._port_allocator = PortAllocator(Backend(), [(50000, 50009)])
+        self.backend._registry = None
+        self.backend._resource_limits = {}
+
+    def test_create_returns_the_allocated_ports(self):
+        self.backend.container_exists = lambda container: False
+        self.backend.get_container = lambda container: {'pk': container}
+        self.backend.start_container = lambda container: True
+        ports = [
+            {'internal_port': 8888, 'external_port': None, 'bind_ip': '0.0.0.0'},
+            {'internal_port': 22, 'external_port': 2222, 'bind_ip': '0.0.0.0'}
+        ]
+
+        container = self.backend.create_container('user', 2500, 'ipython', ports, [], image='coco/ipython')
+
+        self.assertEqual(container.get(Docker.CONTAINER_KEY_PORTS), [
+            {'internal_port': 8888, 'external_port': 50001, 'bind_ip': '0.0.0.0'},
+            {'internal_port': 22, 'external_port': 2222, 'bind_ip': '0.0.0.0'}
+        ])
+        self.assertTrue(self.backend._port_allocator.is_reserved(2222))
+
+    def test_delete_by_name_releases_the_ports(self):
+        self.assertTrue(self.backend._port_allocator.is_reserved(50000))
+
+        self.backend.delete_container('coco-u2500-ipython')
+
+        self.assertEqual(self.client.get_calls('remove_container')[0][2].get('container'), 'coco-u2500-ipython')
+        self.assertFalse(self.backend._port_allocator.is_reserved(50000))
+
+
+class FilterContainersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.containers = [
+            {'pk': 'a', CONTAINER_KEY_NAME: 'coco-u2500-ipython', CONTAINER_KEY_OWNER: 2500, 'status': 'running'},
+            {'pk': 'b', CONTAINER_KEY_NAME: 'coco-u2500-rstudio', CONTAINER_KEY_OWNER: 2500, 'status': 'suspended'},
+            {'pk': 'c', CONTAINER_KEY_NAME: 'coco-u2501-ipython', CONTAINER_KEY_OWNER: 2501, 'status': 'stopped'},
+            {'pk': 'd', CONTAINER_KEY_NAME: None, CONTAINER_KEY_OWNER: None, 'status': 'stopped'}
+        ]
+
+    def get_pks(self, **filters):
+        return [container.get('pk') for container in filter_containers(self.containers, **filters)]
+
+    def test_no_filters(self):
+        self.assertEqual(filter_containers(self.containers), self.containers)
+
+    def test_filters(self):
+        self.assertEqual(self.get_pks(only_running=True), ['a', 'b'])
+        self.assertEqual(self.get_pks(status='stopped'), ['c', 'd'])
+        self.assertEqual(self.get_pks(owner='2500'), ['a', 'b'])
+        self.assertEqual(self.get_pks(name_prefix='coco-u2500-'), ['a', 'b'])
+        self.assertEqual(self.get_pks(owner=2500, status='running'), ['a'])
+
+    def test_fields(self):
+        self.assertEqual(filter_containers(self.containers[:1], fields='status'), [{'pk': 'a', 'status': 'running'}])
+        self.assertEqual(filter_containers(self.containers[:1], fields=['owner']), [{'pk': 'a', 'owner': 2500}])
+
+
+class LabelFiltersTest(unittest.TestCase):
+
+    def test_disabled(self):
+        backend = make_docker(FakeClient())
+        backend._label_filters = False
+
+        self.assertIsNone(backend.get_container_filters(owner=2500))
+        self.assertEqual(backend.get_snapshot_filters(), {'dangling': False})
+
+    def test_enabled(self):
+        backend = make_docker(FakeClient())
+        backend._label_filters = True
+
+        self.assertEqual(backend.get_container_filters(), {'label': [Docker.LABEL_MANAGED]})
+        self.assertEqual(
+            backend.get_container_filters(owner=2500),
+            {'label': [Docker.LABEL_MANAGED, Docker.LABEL_OWNER + '=2500']}
+        )
+        self.assertEqual(backend.get_snapshot_filters().get('label'), Docker.LABEL_SNAPSHOT + '=true')
+
+
+class GetNodeLoadTest(unittest.TestCase):
+
+    def test_load_is_derived_without_sampling(self):
+        client = FakeClient(info={'NCPU': 4, 'MemTotal': 1000, 'ContainersRunning': 3})
+        backend = make_docker(client)
+        backend._stats_sampler = ContainerStatsSampler(backend)
+        backend._stats_sampler._latest = {'a': {'memory_usage': 100}, 'b': {'memory_usage': 50}}
+
+        load = backend.get_node_load()
+
+        self.assertEqual(load, {'cpus': 4, 'memory_total': 1000, 'memory_used': 150, 'containers': 3})
+        self.assertEqual([call[0] for call in client.calls], ['info'])
+
+
+class WaitJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = make_docker(FakeClient())
+        self.backend._jobs = JobQueue(workers=1)
+        self.backend._prefetch_jobs = JobQueue(workers=1)
+        self.backend._push_jobs = JobQueue(workers=1)
+
+    def test_waits_until_the_job_has_finished(self):
+        job = self.backend._push_jobs.submit('push', lambda job: time.sleep(0.1))
+
+        self.assertEqual(self.backend.wait_job(job.pk).get('status'), Job.STATUS_SUCCEEDED)
+
+    def test_timeout(self):
+        job = self.backend._jobs.submit('slow', lambda job: time.sleep(0.5))
+
+        state = self.backend.wait_job(job.pk, timeout=0.01)
+        self.assertIn(state.get('status'), (Job.STATUS_PENDING, Job.STATUS_RUNNING))
+        self.assertTrue(job.wait(5))
+
+    def test_unknown_job(self):
+        self.assertRaises(ContainerBackendError, self.backend.wait_job, 'unknown')
+
+
+class EnsureContainerImagePulledTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pulled = threading.Event()
+        self.client = FakeClient(pull=lambda repository, tag: self.pulled.set() or '{"status": "Downloaded"}')
+        self.backend = make_docker(self.client)
+        self.backend._warm_images = {}
+        self.backend._warm_images_pending = set()
+        self.backend._warm_images_lock = threading.Lock()
+        self.backend._warm_interval = 60
+
+    def test_first_pull(self):
+        self.backend.ensure_container_image_pulled('registry:5000/coco/ipython:latest')
+
+        self.assertEqual(
+            self.client.get_calls('pull')[0][2],
+            {'repository': 'registry:5000/coco/ipython', 'tag': 'latest'}
+        )
+        self.assertIn('registry:5000/coco/ipython:latest', self.backend._warm_images)
+
+    def test_warm_image_is_not_pulled(self):
+        self.backend._warm_images['coco/ipython:latest'] = time.time()
+
+        self.backend.ensure_container_image_pulled('coco/ipython:latest')
+
+        self.assertEqual(self.client.get_calls('pull'), [])
+
+    def test_stale_image_is_refreshed_in_the_background(self):
+        self.backend._warm_images['coco/ipython:latest'] = time.time() - 120
+
+        self.backend.ensure_container_image_pulled('coco/ipython:latest')
+
+        self.assertTrue(self.pulled.wait(5))
+        for _ in range(50):
+            if not self.backend._warm_images_pending:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.backend._warm_images_pending, set())
+        self.assertGreater(self.backend._warm_images['coco/ipython:latest'], time.time() - 60)
+
+    def test_refresh_in_progress_is_not_repeated(self):
+        self.backend._warm_images_pending.add('coco/ipython:latest')
+
+        self.backend.refresh_container_image('coco/ipython:latest')
+
+        self.assertFalse(self.pulled.wait(0.1))
+
+
+class BulkOperationsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.states = {
+            'running': {'Running': True, 'Paused': False},
+            'suspended': {'Running': True, 'Paused': True},
+            'stopped': {'Running': False, 'Paused': False},
+            'broken': {'Running': True, 'Paused': False}
+        }
+
+        def inspect_container(container):
+            if container not in self.states:
+                raise DockerError('not found', FakeResponse(404))
+            return {'Id': container, 'State': self.states[container]}
+
+        def fail_on_broken(container, **kwargs):
+            if container == 'broken':
+                raise DockerError('server error', FakeResponse(500))
+
+        self.client = FakeClient(
+            inspect_container=inspect_container,
+            pause=fail_on_broken,
+            remove_container=fail_on_broken,
+            start=fail_on_broken,
+            stop=fail_on_broken,
+            unpause=fail_on_broken
+        )
+        self.backend = make_docker(self.client)
+        self.backend._bulk_workers = 2
+        self.backend.instrumentation = Instrumentation()
+
+    def get_results(self, results):
+        return [
+            (result.get('pk'), result.get(Docker.BULK_RESULT_KEY_SUCCESS), result.get(Docker.BULK_RESULT_KEY_ERROR))
+            for result in results
+        ]
+
+    def get_containers(self, name):
+        return sorted(call[2].get('container') for call in self.client.get_calls(name))
+
+    def test_delete_containers(self):
+        results = self.backend.delete_containers(['running', 'suspended', 'broken', 'missing'])
+
+        self.assertEqual(self.get_results(results), [
+            ('running', True, None),
+            ('suspended', True, None),
+            ('broken', False, 'ContainerBackendError'),
+            ('missing', False, 'ContainerNotFoundError')
+        ])
+        self.assertEqual(self.get_containers('unpause'), ['suspended'])
+        self.assertEqual(self.get_containers('remove_container'), ['broken', 'running', 'suspended'])
+
+    def test_start_containers(self):
+        results = self.backend.start_containers(['running', 'stopped', 'missing'])
+
+        self.assertEqual(self.get_results(results), [
+            ('running', True, None),
+            ('stopped', True, None),
+            ('missing', False, 'ContainerNotFoundError')
+        ])
+        self.assertEqual(self.get_containers('start'), ['stopped'])
+
+    def test_stop_containers(self):
+        results = self.backend.stop_containers(['running', 'suspended', 'stopped', 'broken'])
+
+        self.assertEqual(self.get_results(results), [
+            ('running', True, None),
+            ('suspended', True, None),
+            ('stopped', True, None),
+            ('broken', False, 'ContainerBackendError')
+        ])
+        self.assertEqual(self.get_containers('unpause'), ['suspended'])
+        self.assertEqual(self.get_containers('stop'), ['broken', 'running', 'suspended'])
+
+    def test_suspend_containers(self):
+        results = self.backend.suspend_containers(['running', 'suspended', 'stopped', 'broken'])
+
+        self.assertEqual(self.get_results(results), [
+            ('running', True, None),
+            ('suspended', True, None),
+            ('stopped', False, 'IllegalContainerStateError'),
+            ('broken', False, 'ContainerBackendError')
+        ])
+        self.assertEqual(self.get_containers('pause'), ['broken', 'running'])
+
+    def test_no_containers(self):
+        self.assertEqual(self.backend.suspend_containers([]), [])
+
+
+class CloneContainerTest(unittest.TestCase):
+
+    def make_backend(self, changes):
+        self.client = FakeClient(
+            inspect_container={'Id': 'source', 'Image': 'base-id'},
+            diff=changes,
+            inspect_image={'Id': 'clone-id'},
+            create_container={'Id': 'clone'}
+        )
+        self.committed = []
+        backend = make_docker(self.client)
+        backend._registry = None
+        backend._resource_limits = {}
+        backend.container_exists = lambda container: container == 'source'
+        backend.get_container = lambda container: {'pk': container}
+        backend.start_container = lambda container: True
+
+        def create_container_image(container, name, **kwargs):
+            self.committed.append(name)
+            time.sleep(0.05)
+            return {'pk': 'coco-u2500/ipython:' + name}
+        backend.create_container_image = create_container_image
+        return backend
+
+    def test_changes_are_committed(self):
+        backend = self.make_backend([{'Path': '/home/user/notebook.ipynb', 'Kind': 1}])
+
+        clone = backend.create_container('user', 2500, 'clone', [], [], clone_of='source')
+
+        self.assertEqual(len(self.committed), 1)
+        self.assertTrue(self.committed[0].startswith(Docker.CLONE_IMAGE_NAME_PREFIX))
+        self.assertEqual(self.client.get_calls('create_container')[0][2].get('image'), 'clone-id')
+        self.assertEqual(clone.get('image'), {'pk': 'clone-id'})
+        self.assertGreaterEqual(clone.get(Docker.CONTAINER_KEY_CLONE_COMMIT_DURATION), 0.05)
+        self.assertEqual(
+            [call[2] for call in self.client.get_calls('remove_image')],
+            [{'image': 'coco-u2500/ipython:' + self.committed[0], 'force': True}]
+        )
+
+    def test_unchanged_container_is_not_committed(self):
+        backend = self.make_backend([])
+
+        clone = backend.create_container('user', 2500, 'clone', [], [], clone_of='source')
+
+        self.assertEqual(self.committed, [])
+        self.assertEqual(self.client.get_calls('create_container')[0][2].get('image'), 'base-id')
+        self.assertEqual(clone.get(Docker.CONTAINER_KEY_CLONE_COMMIT_DURATION), 0)
+        self.assertEqual(self.client.get_calls('remove_image'), [])
+
+    def test_untag_clone_image(self):
+        def in_use(image, force):
+            raise ValueError('conflict')
+
+        self.assertTrue(make_docker(FakeClient()).untag_clone_image('coco-u2500/ipython:for-clone-a'))
+        self.assertFalse(make_docker(FakeClient(remove_image=in_use)).untag_clone_image('coco-u2500/ipython:a'))
+
+
+class DeleteCloneContainerTest(unittest.TestCase):
+
+    def delete(self, image, config_image='clone-id', repo_tags=None, labels={Docker.LABEL_SNAPSHOT: 'false'}):
+        client = FakeClient(
+            inspect_container={'Id': 'clone', 'Image': image, 'Config': {'Image': config_image}},
+            inspect_image={'Id': image, 'RepoTags': repo_tags, 'Config': {'Labels': labels}}
+        )
+        backend = make_docker(client)
+        backend.container_is_running = lambda container: False
+        backend.container_is_suspended = lambda container: False
+        backend.delete_container('clone')
+        return [call[2] for call in client.get_calls('remove_image')]
+
+    def test_untagged_clone_image_is_removed(self):
+        self.assertEqual(self.delete('clone-id', repo_tags=['<none>:<none>']), [{'image': 'clone-id'}])
+
+    def test_other_images_are_kept(self):
+        self.assertEqual(self.delete('clone-id', repo_tags=['coco-u2500/ipython:a']), [])
+        self.assertEqual(self.delete('clone-id', labels=None), [])
+        self.assertEqual(self.delete('base-id', config_image='coco/ipython'), [])
+
+
+class PullContainerImageFallbackTest(unittest.TestCase):
+
+    def make_backend(self, local):
+        def inspect_image(image):
+            if not local:
+                raise DockerError('not found', FakeResponse(404))
+            return {'Id': 'local'}
+
+        client = FakeClient(
+            pull='{"error": "Get https://registry:5000/v1/_ping: dial tcp: i/o timeout"}',
+            inspect_image=inspect_image
+        )
+        backend = make_docker(client)
+        backend._warm_images = {}
+        backend._warm_images_pending = set()
+        backend._warm_images_lock = threading.Lock()
+        backend._warm_interval = 60
+        return backend
+
+    def test_local_image_is_used_if_the_registry_is_unreachable(self):
+        backend = self.make_backend(local=True)
+
+        backend.ensure_container_image_pulled('registry:5000/coco/ipython:latest')
+
+        self.assertIn('registry:5000/coco/ipython:latest', backend._warm_images)
+
+    def test_missing_image(self):
+        backend = self.make_backend(local=False)
+
+        with self.assertRaises(ContainerBackendError):
+            backend.ensure_container_image_pulled('registry:5000/coco/ipython:latest')
+        self.assertEqual(backend._warm_images, {})
+
+
+class PrefetchContainerImagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.head = requests.head
+        self.digests = {}
+        self.pulls = []
+        self.running = {}
+        self.max_running = {}
+        self.lock = threading.Lock()
+
+        def head(url, headers, timeout):
+            digest = self.digests.get(url)
+            return FakeResponse(200 if digest else 404, headers={'Docker-Content-Digest': digest})
+        requests.head = head
+
+        def pull(repository, tag):
+            registry = repository.split('/')[0]
+            with self.lock:
+                self.pulls.append(repository + ':' + tag)
+                self.running[registry] = self.running.get(registry, 0) + 1
+                self.max_running[registry] = max(self.max_running.get(registry, 0), self.running[registry])
+            time.sleep(0.05)
+            with self.lock:
+                self.running[registry] -= 1
+            if tag == 'broken':
+                return '{"error": "manifest unknown"}'
+            return '{"status": "Downloaded"}'
+
+        self.reports = []
+
+        class Recording(Instrumentation):
+            def report(instrumentation, backend, operation, duration, bytes=None, outcome='ok'):
+                self.reports.append((backend, operation, outcome))
+
+        self.client = FakeClient(pull=pull, inspect_image={'Id': 'local', 'RepoDigests': [
+            'registry-a:5000/coco/ipython@sha256:current'
+        ]})
+        self.backend = make_docker(self.client)
+        self.backend.instrumentation = Recording()
+        self.backend._jobs = JobQueue(workers=1)
+        self.backend._prefetch_jobs = JobQueue(workers=1, retries=0)
+        self.backend._push_jobs = JobQueue(workers=1)
+        self.backend._prefetch_registry_semaphores = {}
+        self.backend._prefetch_registry_workers = 1
+        self.backend._prefetch_workers = 4
+        self.backend._warm_images = {}
+        self.backend._warm_images_lock = threading.Lock()
+
+    def tearDown(self):
+        requests.head = self.head
+
+    def test_current_images_are_skipped(self):
+        self.digests['http://registry-a:5000/v2/coco/ipython/manifests/latest'] = 'sha256:current'
+        self.digests['http://registry-a:5000/v2/coco/rstudio/manifests/latest'] = 'sha256:new'
+
+        job = self.backend.prefetch_container_images([
+            'registry-a:5000/coco/ipython:latest',
+            'registry-a:5000/coco/rstudio:latest'
+        ])
+        state = self.backend.wait_job(job.get('pk'), timeout=5)
+
+        self.assertEqual(state.get('status'), Job.STATUS_SUCCEEDED)
+        self.assertEqual(self.pulls, ['registry-a:5000/coco/rstudio:latest'])
+        self.assertIn('registry-a:5000/coco/ipython:latest', self.backend._warm_images)
+        self.assertEqual(self.reports, [
+            ('docker_registry', 'HEAD /v2/<id>/manifests/<id>', 'ok'),
+            ('docker_registry', 'HEAD /v2/<id>/manifests/<id>', 'ok')
+        ])
+
+    def test_pulls_per_registry_are_limited(self):
+        images = ['registry-%s:5000/coco/image-%i:latest' % (registry, i) for registry in 'ab' for i in range(3)]
+
+        progress = self.backend.run_prefetch(Job('prefetch'), images)
+
+        self.assertEqual(progress, {'total': 6, 'pulled': 6, 'skipped': 0, 'failed': 0})
+        self.assertEqual(self.max_running, {'registry-a:5000': 1, 'registry-b:5000': 1})
+        self.assertEqual(set(report[2] for report in self.reports), set(['not_found']))
+
+    def test_failed_pulls(self):
+        job = Job('prefetch')
+
+        self.assertRaises(ContainerBackendError, self.backend.run_prefetch, job, [
+            'registry-a:5000/coco/ipython:latest',
+            'registry-a:5000/coco/ipython:broken'
+        ])
+        self.assertEqual(job.progress, {'total': 2, 'pulled': 1, 'skipped': 0, 'failed': 1})
+
+
+class PushContainerImageTest(unittest.TestCase):
+
+    def push(self, chunks):
+        client = FakeClient(push=lambda repository, stream, insecure_registry: iter(chunks))
+        job = Job('push')
+        return make_docker(client).push_container_image(job, 'registry:5000/coco/ipython:latest'), job
+
+    def test_progress(self):
+        result, job = self.push([
+            '{"status": "The push refers to a repository [registry:5000/coco/ipython]"}\r\n',
+            '{"status": "Preparing", "id": "a"}\r\n{"status": "Preparing", "id": "b"}\r\n',
+            '{"status": "Pushing", "id": "a", "progressDetail": {"current": 512, "total": 1024}}\r\n',
+            '{"status": "Layer already exists", "id": "b", "progressDetail": {}}\r\n',
+            '{"status": "Pushing", "id": "a", "progressDetail": {"current": 768, "total": 1024}}\r\n',
+            '{"status": "Pushed", "id": "a", "progressDetail": {}}\r\n'
+        ])
+
+        self.assertEqual(result, {'pk': 'registry:5000/coco/ipython:latest'})
+        self.assertEqual(job.progress, {
+            'status': 'Pushed',
+            'layers': 2,
+            'layers_done': 2,
+            'bytes': 1024,
+            'bytes_total': 1024
+        })
+
+    def test_error(self):
+        chunks = [
+            '{"status": "Pushing", "id": "a", "progressDetail": {"current": 512, "total": 1024}}\r\n',
+            '{"status": "Preparing", "id": "b"}\r\n',
+            '{"error": "unauthorized: authentication required"}\r\n'
+        ]
+
+        with self.assertRaises(ContainerBackendError) as context:
+            self.push(chunks)
+        self.assertIn('authentication required', str(context.exception))
+
+    def test_progress_is_reported_before_an_error(self):
+        job = Job('push')
+        client = FakeClient(push=lambda repository, stream, insecure_registry: iter([
+            '{"status": "Pushing", "id": "a", "progressDetail": {"current": 512, "total": 1024}}\r\n',
+            '{"error": "unauthorized: authentication required"}\r\n'
+        ]))
+
+        self.assertRaises(ContainerBackendError, make_docker(client).push_container_image, job, 'coco/ipython')
+        self.assertEqual(job.progress.get('layers'), 1)
+        self.assertEqual(job.progress.get('layers_done'), 0)
+        self.assertEqual(job.progress.get('bytes'), 512)
+
+
+class CloseTest(unittest.TestCase):
+
+    def test_background_threads_and_connections_are_closed(self):
+        class Component(object):
+            stopped = False
+
+            def stop(self):
+                self.stopped = True
+
+        client = FakeClient()
+        backend = make_docker(client)
+        backend.container_watcher = Component()
+        backend.idle_suspender = Component()
+        backend.snapshot_manager = None
+        backend._stats_sampler = Component()
+        backend._jobs = JobQueue(workers=1)
+        backend._prefetch_jobs = JobQueue(workers=1)
+        backend._push_jobs = JobQueue(workers=1)
+        job = backend._push_jobs.submit('push', lambda job: time.sleep(0.1))
+
+        backend.close()
+
+        components = (backend.container_watcher, backend.idle_suspender, backend._stats_sampler)
+        self.assertTrue(all(component.stopped for component in components))
+        self.assertIsNone(backend._push_jobs._pool)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(len(client.get_calls('close')), 1)
+
+
+class CreateContainerAsJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient(create_container={'Id': 'abc'})
+        self.backend = make_docker(self.client)
+        self.backend._jobs = JobQueue(workers=1, retries=0)
+        self.backend._prefetch_jobs = JobQueue(workers=1)
+        self.backend._push_jobs = JobQueue(workers=1)
+        self.backend._registry = None
+        self.backend._resource_limits = {}
+        self.backend.container_exists = lambda container: False
+        self.backend.get_container = lambda container: {'pk': container}
+        self.backend.start_container = lambda container: True
+
+    def test_container_is_created_in_the_background(self):
+        job = self.backend.create_container('user', 2500, 'ipython', [], [], image='coco/ipython', as_job=True)
+
+        self.assertEqual(job.get('name'), 'create container ipython')
+        state = self.backend.wait_job(job.get('pk'), timeout=5)
+        self.assertEqual(state.get('status'), Job.STATUS_SUCCEEDED)
+        self.assertEqual(state.get('result'), {'pk': 'abc', Docker.CONTAINER_KEY_PORTS: []})
+        self.assertEqual(self.client.get_calls('create_container')[0][2].get('name'), 'coco-u2500-ipython')
+        self.assertNotIn('as_job', self.client.get_calls('create_container')[0][2])
+
+    def test_failed_creation_is_reported_on_the_job(self):
+        self.backend.container_exists = lambda container: container == 'coco-u2500-ipython'
+
+        existing = self.backend.create_container('user', 2500, 'ipython', [], [], image='coco/ipython', as_job=True)
+        clone = self.backend.create_container('user', 2500, 'clone', [], [], clone_of='missing', as_job=True)
+
+        existing = self.backend.wait_job(existing.get('pk'), timeout=5)
+        self.assertEqual(existing.get('status'), Job.STATUS_FAILED)
+        self.assertEqual(existing.get('error'), 'A container with that name already exists')
+        clone = self.backend.wait_job(clone.get('pk'), timeout=5)
+        self.assertEqual(clone.get('status'), Job.STATUS_FAILED)
+        self.assertEqual(clone.get('error'), 'Base container for the clone does not exist')
+        self.assertEqual(self.client.get_calls('create_container'), [])
+
+
+class WatchedContainersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.states = {
+            'abc': {'Id': 'abc', 'Name': '/coco-u2500-ipython', 'State': {'Running': True, 'Paused': False}}
+        }
+
+        def inspect_container(container):
+            for state in self.states.values():
+                if container in (state.get('Id'), state.get('Name').lstrip('/')):
+                    return state
+            raise ContainerNotFoundError
+
+        client = FakeClient(
+            inspect_container=inspect_container,
+            pause=lambda container: self.states[container]['State'].update(Paused=True),
+            remove_container=lambda container, force: self.states.pop(inspect_container(container).get('Id'))
+        )
+        self.backend = make_docker(client)
+        self.backend.container_exists = lambda container: container in self.states
+        self.backend.container_is_running = lambda container: True
+        self.backend.container_is_suspended = lambda container: False
+        self.backend.inspect_container_or_fail = inspect_container
+        self.backend.container_watcher = ContainerStateWatcher(self.backend)
+        self.backend.container_watcher._containers = {'abc': {'pk': 'abc', 'status': 'running'}}
+        self.backend.container_watcher._synced.set()
+
+    def test_changes_are_listed_right_away(self):
+        self.backend.suspend_container('abc')
+
+        self.assertEqual(
+            [container.get('status') for container in self.backend.get_containers()],
+            [SuspendableContainerBackend.CONTAINER_STATUS_SUSPENDED]
+        )
+
+    def test_deleted_containers_are_not_listed(self):
+        self.backend.delete_container('coco-u2500-ipython')
+
+        self.assertEqual(self.backend.get_containers(), [])
+
+
+class PruneDanglingContainerImagesTest(unittest.TestCase):
+
+    def test_only_images_committed_by_the_backend_are_removed(self):
+        client = FakeClient(images=[
+            {'Id': 'ours', 'Size': 10, 'Labels': {Docker.LABEL_SNAPSHOT: 'true'}},
+            {'Id': 'clone', 'Size': 5, 'Labels': {Docker.LABEL_SNAPSHOT: 'false'}},
+            {'Id': 'foreign', 'Size': 100, 'Labels': {}},
+            {'Id': 'unlabeled', 'Size': 100, 'Labels': None}
+        ])
+
+        reclaimed = make_docker(client).prune_dangling_container_images()
+
+        self.assertEqual(reclaimed, 15)
+        self.assertEqual([call[2].get('image') for call in client.get_calls('remove_image')], ['ours', 'clone'])
+        self.assertEqual(client.get_calls('images')[0][2].get('filters').get('label'), Docker.LABEL_SNAPSHOT)
+
+
+class ResumeContainerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient(inspect_container=lambda container: {
+            'Id': container,
+            'State': {'Running': True, 'Paused': True}
+        })
+        self.backend = make_docker(self.client)
+        self.backend._bulk_workers = 2
+        self.backend.instrumentation = Instrumentation()
+        self.backend.idle_suspender = IdleContainerSuspender(self.backend)
+
+    def test_resumes_are_counted(self):
+        self.backend.resume_container('a')
+        self.backend.resume_containers(['b', 'c'])
+
+        self.assertEqual(len(self.client.get_calls('unpause')), 3)
+        self.assertEqual(self.backend.idle_suspender.get_stats().get('resumed'), 3)
+
+
+class ForeignContainersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = make_docker(FakeClient())
+        self.backend.container_watcher = ContainerStateWatcher(self.backend)
+        self.backend.container_watcher._containers = {
+            'a': {'pk': 'a', CONTAINER_KEY_NAME: 'coco-u2500-ipython', 'status': 'running'},
+            'registry': {'pk': 'registry', CONTAINER_KEY_NAME: 'registry', 'status': 'running'}
+        }
+        self.backend.container_watcher._synced.set()
+
+    def test_foreign_containers_are_not_suspended(self):
+        samples = []
+        suspended = []
+        self.backend.get_container_stats = lambda container: samples.append(container) or {
+            'sampled_at': time.time(), 'cpu_usage': 0, 'network_rx': 0, 'network_tx': 0
+        }
+        self.backend.suspend_container = suspended.append
+        suspender = IdleContainerSuspender(self.backend, idle_timeout=0)
+
+        suspender.run_once()
+        time.sleep(0.01)
+        suspender.run_once()
+
+        self.assertEqual(suspended, ['a'])
+        self.assertEqual(set(samples), set(['a']))
+
+    def test_foreign_containers_are_not_sampled(self):
+        sampler = ContainerStatsSampler(self.backend)
+        sampler.sample = lambda container: {'container': container, 'sampled_at': time.time()}
+
+        self.assertEqual([sample.get('container') for sample in sampler.get_all()], ['a'])
+
+
+class RestoreContainerSnapshotTest(unittest.TestCase):
+
+    def make_backend(self, state):
+        client = FakeClient(
+            inspect_container={
+                'Id': 'old',
+                'Name': '/coco-u2500-ipython',
+                'Config': {},
+                'HostConfig': {},
+                'State': state
+            },
+            create_container={'Id': 'new'}
+        )
+        backend = make_docker(client)
+        backend.container_exists = lambda container: True
+        backend.container_snapshot_exists = lambda snapshot: True
+        backend.get_container = lambda container: {'pk': container}
+        return backend, client
+
+    def test_suspended_container_is_resumed_before_it_is_stopped(self):
+        backend, client = self.make_backend({'Running': True, 'Paused': True})
+
+        restored = backend.restore_container_snapshot('old', 'coco-u2500/ipython:snapshot-a')
+
+        self.assertEqual(restored.get('pk'), 'new')
+        names = [call[0] for call in client.calls]
+        self.assertLess(names.index('unpause'), names.index('stop'))
+
+    def test_running_container_is_not_resumed(self):
+        backend, client = self.make_backend({'Running': True, 'Paused': False})
+
+        backend.restore_container_snapshot('old', 'coco-u2500/ipython:snapshot-a')
+
+        self.assertEqual(client.get_calls('unpause'), [])
+
+
+class PayloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {'containers': [{'pk': 'a', 'name': u'coco-u2500-ipython', 'owner': 2500, 'ports': None}]}
+
+    def test_msgpack_round_trip(self):
+        body, content_type = encode_payload(self.data, CONTENT_TYPE_MSGPACK + ', ' + CONTENT_TYPE_JSON + ';q=0.9')
+        decoded = decode_payload(body, content_type)
+
+        self.assertEqual(content_type, CONTENT_TYPE_MSGPACK)
+        self.assertEqual(decoded, self.data)
+        self.assertEqual(decoded, decode_payload(*encode_payload(self.data, CONTENT_TYPE_JSON)))
+        container = decoded.get('containers')[0]
+        self.assertEqual(
+            [type(value) for value in (container.keys()[0], container.get('pk'), container.get('name'))],
+            [type(u'')] * 3
+        )
+
+    def test_json_round_trip(self):
+        body, content_type = encode_payload(self.data, CONTENT_TYPE_JSON)
+
+        self.assertEqual(content_type, CONTENT_TYPE_JSON)
+        self.assertEqual(decode_payload(body, content_type), self.data)
+        self.assertEqual(decode_payload(body), self.data)
+        self.assertEqual(encode_payload(self.data)[1], CONTENT_TYPE_JSON)
+
+
+class HttpRemoteWireFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.request = requests.request
+        self.sent = []
+        self.responses = []
+
+        def request(method, url, **kwargs):
+            self.sent.append(kwargs)
+            return self.responses.pop(0)
+        requests.request = request
+
+    def tearDown(self):
+        requests.request = self.request
+
+    def test_msgpack_is_used_once_the_remote_answered_with_it(self):
+        backend = HttpRemote('http://remote')
+        self.responses = [
+            FakeResponse(200, '[]', {'Content-Type': CONTENT_TYPE_JSON}),
+            FakeResponse(200, encode_payload([], CONTENT_TYPE_MSGPACK)[0], {'Content-Type': CONTENT_TYPE_MSGPACK}),
+            FakeResponse(201)
+        ]
+
+        self.assertEqual(backend.decode(backend.request('GET', 'http://remote/containers')), [])
+        self.assertFalse(backend._remote_msgpack)
+        self.assertEqual(backend.decode(backend.request('GET', 'http://remote/containers')), [])
+        self.assertTrue(backend._remote_msgpack)
+        backend.request('POST', 'http://remote/containers', payload={'name': 'ipython'})
+
+        self.assertTrue(self.sent[0]['headers'].get('Accept').startswith(CONTENT_TYPE_MSGPACK))
+        self.assertEqual(self.sent[2]['headers'].get('Content-Type'), CONTENT_TYPE_MSGPACK)
+        self.assertEqual(decode_payload(self.sent[2]['data'], CONTENT_TYPE_MSGPACK), {'name': 'ipython'})
+
+    def test_json_is_sent_until_the_remote_answered_with_msgpack(self):
+        backend = HttpRemote('http://remote')
+        self.responses = [FakeResponse(201)]
+
+        backend.request('POST', 'http://remote/containers', payload={'name': 'ipython'})
+
+        self.assertEqual(self.sent[0]['headers'].get('Content-Type'), CONTENT_TYPE_JSON)
+        self.assertEqual(json.loads(self.sent[0]['data']), {'name': 'ipython'})
+
+    def test_json_only(self):
+        backend = HttpRemote('http://remote', use_msgpack=False)
+        backend._remote_msgpack = True
+        self.responses = [FakeResponse(200)]
+
+        backend.request('POST', 'http://remote/containers', payload={'name': 'ipython'})
+
+        self.assertEqual(self.sent[0]['headers'].get('Accept'), CONTENT_TYPE_JSON)
+        self.assertEqual(self.sent[0]['headers'].get('Content-Type'), CONTENT_TYPE_JSON)
+
+    def test_larger_requests_are_compressed(self):
+        backend = HttpRemote('http://remote', use_msgpack=False, compress_requests=True)
+        small = {'name': 'ipython'}
+        large = {'name': 'x' * HttpRemote.COMPRESS_MIN_SIZE}
+        self.responses = [FakeResponse(200), FakeResponse(200)]
+
+        backend.request('POST', 'http://remote/containers', payload=small)
+        backend.request('POST', 'http://remote/containers', payload=large)
+
+        self.assertNotIn('Content-Encoding', self.sent[0]['headers'])
+        self.assertEqual(json.loads(self.sent[0]['data']), small)
+        self.assertEqual(self.sent[1]['headers'].get('Content-Encoding'), 'gzip')
+        self.assertLess(len(self.sent[1]['data']), HttpRemote.COMPRESS_MIN_SIZE)
+        self.assertEqual(json.loads(zlib.decompress(self.sent[1]['data'], 16 + zlib.MAX_WBITS)), large)
+
+    def test_compression_is_disabled_by_default(self):
+        backend = HttpRemote('http://remote', use_msgpack=False)
+        self.responses = [FakeResponse(200)]
+
+        backend.request('POST', 'http://remote/containers', payload={'name': 'x' * HttpRemote.COMPRESS_MIN_SIZE})
+
+        self.assertNotIn('Content-Encoding', self.sent[0]['headers'])
+
+
+class WarmUpTest(unittest.TestCase):
+
+    def make_backend(self, label_filters):
+        snapshot = {'Id': 'snapshot', 'RepoTags': ['coco-u2500/ipython:snapshot-a'], 'Created': 1}
+        image = {'Id': 'image', 'RepoTags': ['coco/ipython:latest'], 'Created': 1}
+        client = FakeClient(images=lambda filters: [snapshot] if 'label' in filters else [snapshot, image])
+        backend = make_docker(client)
+        backend._label_filters = label_filters
+        backend._snapshot_index = SnapshotIndex()
+        backend.container_watcher = ContainerStateWatcher(backend)
+        backend.container_watcher._containers = {'abc': {'pk': 'abc', 'status': 'running'}}
+        backend.container_watcher._synced.set()
+        return backend, client
+
+    def test_snapshots_are_loaded(self):
+        backend, client = self.make_backend(label_filters=False)
+
+        loaded = backend.warm_up()
+
+        self.assertEqual((loaded.get('containers'), loaded.get('images'), loaded.get('snapshots')), (1, 1, 1))
+        self.assertEqual(client.get_calls('images')[0][2].get('filters'), {'dangling': False})
+        self.assertFalse(backend._snapshot_index.is_stale())
+        self.assertIsNotNone(backend._snapshot_index.get('coco-u2500/ipython:snapshot-a'))
+
+    def test_label_filters_are_applied(self):
+        backend, client = self.make_backend(label_filters=True)
+
+        loaded = backend.warm_up()
+
+        self.assertEqual((loaded.get('images'), loaded.get('snapshots')), (0, 1))
+        self.assertEqual(client.get_calls('images')[0][2].get('filters'), backend.get_snapshot_filters())
+
+
+class HttpRemoteCircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.request = requests.request
+
+    def tearDown(self):
+        requests.request = self.request
+
+    def test_probe_failing_unexpectedly_does_not_block_the_circuit(self):
+        backend = HttpRemote('http://remote', failure_threshold=1, reset_timeout=0, retries=0)
+        backend.circuit_breaker.record_failure()
+
+        def broken(method, url, **kwargs):
+            raise ValueError('unexpected')
+        requests.request = broken
+        self.assertRaises(ValueError, backend.request, 'GET', 'http://remote/containers')
+
+        requests.request = lambda method, url, **kwargs: FakeResponse(200)
+        self.assertEqual(backend.request('GET', 'http://remote/containers').status_code, 200)
+        self.assertEqual(backend.circuit_breaker.get_state().get('state'), CircuitBreaker.STATE_CLOSED)
+
+    def test_status_details(self):
+        backend = HttpRemote('http://remote', failure_threshold=1, reset_timeout=60)
+        backend.circuit_breaker.record_failure()
+
+        status = backend.get_status(details=True)
+
+        self.assertEqual(status.get('status'), HttpRemote.BACKEND_STATUS_ERROR)
+        self.assertEqual(status.get('circuit_breaker').get('state'), CircuitBreaker.STATE_OPEN)
+        self.assertEqual(backend.get_status(), HttpRemote.BACKEND_STATUS_ERROR)
+
+
+class HttpRemoteConditionalGetTest(unittest.TestCase):
+
+    def test_cached_body_cannot_be_modified_by_callers(self):
+        responses = [
+            FakeResponse(200, '{"containers": []}', {'Content-Type': 'application/json', 'ETag': '"1"'}),
+            FakeResponse(304),
+            FakeResponse(304)
+        ]
+        sent = []
+        backend = HttpRemote('http://remote')
+        backend.request = lambda method, url, **kwargs: sent.append(kwargs.get('headers')) or responses.pop(0)
+
+        status, body = backend.conditional_get('http://remote/containers')
+        body['containers'].append('modified')
+        status, body = backend.conditional_get('http://remote/containers')
+        body['containers'].append('modified')
+        status, body = backend.conditional_get('http://remote/containers')
+
+        self.assertEqual((status, body), (200, {'containers': []}))
+        self.assertEqual(sent[-1], {'If-None-Match': '"1"'})
+
+
+class HttpRemoteGetContainersTest(unittest.TestCase):
+
+    def test_remote_result_is_returned_as_is(self):
+        urls = []
+        backend = HttpRemote('http://remote')
+        backend.conditional_get = lambda url: urls.append(url) or (200, [{'pk': 'a', 'name': 'coco-u2500-ipython'}])
+
+        containers = backend.get_containers(only_running=True, owner=2500, fields=['name'])
+
+        self.assertEqual(containers, [{'pk': 'a', 'name': 'coco-u2500-ipython'}])
+        self.assertEqual(urls, ['http://remote/containers?fields=name&only_running=True&owner=2500'])
+
+
+class HttpRemoteCreateContainerAsJobTest(unittest.TestCase):
+
+    def test_failed_job(self):
+        job = {'pk': 'job', 'name': 'create container ipython', 'status': Job.STATUS_PENDING, 'error': None}
+        failed = dict(job, status=Job.STATUS_FAILED, error='A container with that name already exists')
+        responses = [
+            FakeResponse(202, json.dumps(job), {'Content-Type': CONTENT_TYPE_JSON}),
+            FakeResponse(200, json.dumps(failed), {'Content-Type': CONTENT_TYPE_JSON})
+        ]
+        sent = []
+        backend = HttpRemote('http://remote', read_timeout=10, long_read_timeout=900)
+        backend.request = lambda method, url, **kwargs: sent.append((method, url, kwargs)) or responses.pop(0)
+
+        submitted = backend.create_container('user', 2500, 'ipython', [], [], image='coco/ipython', as_job=True)
+        state = backend.wait_job(submitted.get('pk'), timeout=5)
+
+        self.assertEqual(submitted, job)
+        self.assertEqual(state.get('status'), Job.STATUS_FAILED)
+        self.assertEqual(state.get('error'), 'A container with that name already exists')
+        method, url, kwargs = sent[0]
+        self.assertEqual((method, url), ('POST', 'http://remote/containers'))
+        self.assertTrue(kwargs.get('payload').get('as_job'))
+        self.assertEqual(kwargs.get('timeout'), (backend.connect_timeout, 10))
+        self.assertTrue(sent[1][1].startswith('http://remote/jobs/job?wait='))
+
+    def test_rejected_job(self):
+        backend = HttpRemote('http://remote')
+        backend.request = lambda method, url, **kwargs: FakeResponse(500)
+
+        with self.assertRaises(ContainerBackendError):
+            backend.create_container('user', 2500, 'ipython', [], [], image='coco/ipython', as_job=True)
+
+
+class HttpRemoteRestoreContainerSnapshotTest(unittest.TestCase):
+
+    def make_backend(self, container_exists):
+        backend = HttpRemote('http://remote')
+        backend.request = lambda method, url, **kwargs: FakeResponse(404)
+        backend.container_exists = lambda container, **kwargs: container_exists
+        return backend
+
+    def test_missing_snapshot(self):
+        with self.assertRaises(ContainerSnapshotNotFoundError):
+            self.make_backend(True).restore_container_snapshot('container', 'snapshot')
+
+    def test_missing_container(self):
+        with self.assertRaises(ContainerNotFoundError):
+            self.make_backend(False).restore_container_snapshot('container', 'snapshot')
+
+
+if __name__ == '__main__':
+    unittest.main()
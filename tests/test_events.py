@@ -0,0 +1,56 @@
+from coco.backends.events import CONTAINER_STATUS_DELETED, ContainerStateWatcher
+import threading
+import time
+import unittest
+
+
+class ContainerStateWatcherTest(unittest.TestCase):
+
+    def test_events_are_applied_to_the_view(self):
+        stream = threading.Event()
+
+        class Backend(object):
+            def get_container_events(self):
+                yield {'pk': 'a', 'status': 'running', 'action': 'start', 'time': 1}
+                yield {'pk': 'b', 'status': CONTAINER_STATUS_DELETED, 'action': 'destroy', 'time': 2}
+                stream.set()
+                time.sleep(5)
+
+            def get_containers(self):
+                return [{'pk': 'a', 'status': 'stopped'}, {'pk': 'b', 'status': 'stopped'}]
+
+        watcher = ContainerStateWatcher(Backend())
+        watcher.start()
+        try:
+            self.assertTrue(watcher.wait_synced(5))
+            self.assertTrue(stream.wait(5))
+            self.assertEqual(watcher.get_all(), [{'pk': 'a', 'status': 'running'}])
+            self.assertIsNone(watcher.get('b'))
+        finally:
+            watcher.stop()
+
+    def test_restart_runs_a_single_loop(self):
+        class Backend(object):
+            streams = 0
+
+            def get_container_events(self):
+                Backend.streams += 1
+                return []  # the stream breaks right away
+
+            def get_containers(self):
+                return []
+
+        watcher = ContainerStateWatcher(Backend(), reconnect_delay=0.05, max_reconnect_delay=0.05)
+        watcher.start()
+        watcher.stop()
+        watcher.start()
+        time.sleep(0.3)
+        watcher.stop()
+        time.sleep(0.1)
+
+        # a single loop reconnects about 6 times, two revived loops twice as often
+        self.assertTrue(1 <= Backend.streams <= 8, Backend.streams)
+
+
+if __name__ == '__main__':
+    unittest.main()
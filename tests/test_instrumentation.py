@@ -0,0 +1,147 @@
+from coco.backends.container_backends import HttpRemote
+from coco.backends.instrumentation import OUTCOME_ERROR, OUTCOME_NOT_FOUND, OUTCOME_OK, CompositeInstrumentation, \
+    Instrumentation, PrometheusHistograms, RequestCallCounter, instrument_call
+import threading
+import unittest
+
+
+class RecordingInstrumentation(Instrumentation):
+
+    def __init__(self):
+        self.reports = []
+
+    def report(self, backend, operation, duration, bytes=None, outcome=OUTCOME_OK):
+        self.reports.append((backend, operation, bytes, outcome))
+
+
+class InstrumentCallTest(unittest.TestCase):
+
+    def test_outcomes_are_reported(self):
+        instrumentation = RecordingInstrumentation()
+
+        def missing():
+            raise KeyError('missing')
+
+        self.assertEqual(instrument_call(instrumentation, 'docker', 'info', lambda: 'ok', get_bytes=lambda: 42), 'ok')
+        self.assertRaises(KeyError, instrument_call, instrumentation, 'ldap', 'search_s', missing, not_found=KeyError)
+        self.assertRaises(KeyError, instrument_call, instrumentation, 'ldap', 'add_s', missing)
+
+        self.assertEqual(instrumentation.reports, [
+            ('docker', 'info', 42, OUTCOME_OK),
+            ('ldap', 'search_s', None, OUTCOME_NOT_FOUND),
+            ('ldap', 'add_s', None, OUTCOME_ERROR)
+        ])
+
+    def test_failing_instrumentation_does_not_break_the_call(self):
+        class Broken(Instrumentation):
+            def report(self, *args, **kwargs):
+                raise ValueError('broken')
+
+        self.assertEqual(instrument_call(Broken(), 'docker', 'info', lambda: 'ok'), 'ok')
+
+
+class HttpRemoteOperationNameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = HttpRemote('http://remote')
+
+    def test_identifiers_are_replaced(self):
+        self.assertEqual(
+            self.backend.get_operation_name('POST', 'http://remote/containers/abc/restore?wait=1'),
+            'POST /containers/<id>/restore'
+        )
+        self.assertEqual(self.backend.get_operation_name('GET', 'http://remote/jobs/1'), 'GET /jobs/<id>')
+
+    def test_slashes_in_identifiers(self):
+        self.assertEqual(
+            self.backend.get_operation_name('GET', 'http://remote/containers/YWJj/ZA==/stats'),
+            'GET /containers/<id>/stats'
+        )
+
+    def test_slugs_are_kept(self):
+        self.assertEqual(self.backend.get_operation_name('GET', 'http://remote/containers/snapshots'),
+                         'GET /containers/snapshots')
+        self.assertEqual(self.backend.get_operation_name('GET', 'http://remote/health'), 'GET /health')
+
+
+class PrometheusHistogramsTest(unittest.TestCase):
+
+    def test_render(self):
+        histograms = PrometheusHistograms(buckets=(0.01, 0.1))
+        histograms.report('docker', 'inspect_container', 0.005, 100)
+        histograms.report('docker', 'inspect_container', 0.05, 50)
+        histograms.report('docker', 'inspect_container', 1.0)
+        histograms.report('http_remote', 'GET /containers/"<id>"', 0.005, outcome=OUTCOME_NOT_FOUND)
+
+        lines = histograms.render().splitlines()
+
+        labels = 'backend="docker",operation="inspect_container",outcome="ok"'
+        self.assertIn('# TYPE coco_backend_operation_duration_seconds histogram', lines)
+        self.assertIn('coco_backend_operation_duration_seconds_bucket{%s,le="0.01"} 1' % labels, lines)
+        self.assertIn('coco_backend_operation_duration_seconds_bucket{%s,le="0.1"} 2' % labels, lines)
+        self.assertIn('coco_backend_operation_duration_seconds_bucket{%s,le="+Inf"} 3' % labels, lines)
+        self.assertIn('coco_backend_operation_duration_seconds_count{%s} 3' % labels, lines)
+        self.assertIn('coco_backend_operation_bytes_total{backend="docker",operation="inspect_container"} 150', lines)
+        self.assertIn(
+            'coco_backend_operation_duration_seconds_count'
+            '{backend="http_remote",operation="GET /containers/\\"<id>\\"",outcome="not_found"} 1',
+            lines
+        )
+
+    def test_get_histogram_and_reset(self):
+        histograms = PrometheusHistograms(buckets=(0.01, 0.1))
+        histograms.report('ldap', 'search_s', 0.05)
+
+        self.assertEqual(histograms.get_histogram('ldap', 'search_s'), {
+            'buckets': [(0.01, 0), (0.1, 1)],
+            'count': 1,
+            'sum': 0.05
+        })
+        histograms.reset()
+        self.assertIsNone(histograms.get_histogram('ldap', 'search_s'))
+
+
+class RequestCallCounterTest(unittest.TestCase):
+
+    def test_calls_are_counted_per_request(self):
+        counter = RequestCallCounter()
+        counter.report('docker', 'info', 0.1)  # outside of any request
+
+        with counter.track('get_containers') as calls:
+            counter.report('docker', 'containers', 0.1)
+            with counter.track('get_container') as nested:
+                counter.report('docker', 'inspect_container', 0.1)
+            thread = threading.Thread(target=counter.wrap(lambda: counter.report('docker', 'inspect_container', 0.1)))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(calls, {('docker', 'containers'): 1, ('docker', 'inspect_container'): 2})
+        self.assertEqual(nested, {('docker', 'inspect_container'): 1})
+        self.assertEqual(counter.get_counts(), {
+            'get_containers': {'requests': 1, 'calls': {'docker containers': 1, 'docker inspect_container': 2}},
+            'get_container': {'requests': 1, 'calls': {'docker inspect_container': 1}}
+        })
+
+    def test_unwrapped_threads_are_not_counted(self):
+        counter = RequestCallCounter()
+        with counter.track('get_containers') as calls:
+            thread = threading.Thread(target=lambda: counter.report('docker', 'inspect_container', 0.1))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(calls, {})
+
+    def test_composite(self):
+        counter = RequestCallCounter()
+        recording = RecordingInstrumentation()
+        composite = CompositeInstrumentation(counter, recording)
+
+        with counter.track('info') as calls:
+            composite.report('docker', 'info', 0.1)
+
+        self.assertEqual(calls, {('docker', 'info'): 1})
+        self.assertEqual(recording.reports, [('docker', 'info', None, OUTCOME_OK)])
+
+
+if __name__ == '__main__':
+    unittest.main()
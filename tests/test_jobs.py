@@ -0,0 +1,77 @@
+from coco.backends.jobs import Job, JobQueue
+import time
+import unittest
+
+
+class JobQueueTest(unittest.TestCase):
+
+    def test_submit_passes_job_and_arguments(self):
+        queue = JobQueue(workers=1)
+
+        def work(job, a, b=None):
+            job.progress['seen'] = True
+            return a + b
+
+        job = queue.submit('add', work, 1, b=2)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, 3)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.progress, {'seen': True})
+        self.assertIs(queue.get(job.pk), job)
+
+    def test_failed_job_is_retried(self):
+        queue = JobQueue(workers=1, retries=2, retry_delay=0)
+        calls = []
+
+        def flaky(job):
+            calls.append(job.attempts)
+            if len(calls) < 3:
+                raise ValueError('try again')
+            return 'done'
+
+        job = queue.submit('flaky', flaky)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, 'done')
+        self.assertEqual(job.attempts, 3)
+
+    def test_job_fails_once_retries_are_exhausted(self):
+        queue = JobQueue(workers=1, retries=1, retry_delay=0)
+
+        def broken(job):
+            raise ValueError('broken')
+
+        job = queue.submit('broken', broken)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(job.error, 'broken')
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.to_dict().get('status'), Job.STATUS_FAILED)
+
+    def test_oldest_finished_jobs_are_forgotten(self):
+        queue = JobQueue(workers=1, keep=2)
+        jobs = []
+        for i in range(4):
+            jobs.append(queue.submit('job %i' % i, lambda job: None))
+            self.assertTrue(jobs[-1].wait(5))
+
+        self.assertIsNone(queue.get(jobs[0].pk))
+        self.assertIsNotNone(queue.get(jobs[-1].pk))
+
+    def test_unknown_job(self):
+        self.assertIsNone(JobQueue().get('unknown'))
+
+    def test_close_lets_submitted_jobs_finish(self):
+        queue = JobQueue(workers=1)
+        job = queue.submit('slow', lambda job: time.sleep(0.1) or 'done')
+
+        queue.close()
+        queue.close()  # closing twice is fine
+
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.result, 'done')
+
+
+if __name__ == '__main__':
+    unittest.main()
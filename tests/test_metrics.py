@@ -0,0 +1,30 @@
+from coco.backends.metrics import ContainerStatsSampler
+import time
+import unittest
+
+
+class ContainerStatsSamplerTest(unittest.TestCase):
+
+    def test_restart_runs_a_single_loop(self):
+        class Backend(object):
+            CONTAINER_NAME_PREFIX = 'coco-'
+            samples = 0
+
+            def get_containers(self, only_running=False, name_prefix=None):
+                Backend.samples += 1
+                return []
+
+        sampler = ContainerStatsSampler(Backend(), interval=0.05)
+        sampler.start()
+        sampler.stop()
+        sampler.start()
+        time.sleep(0.3)
+        sampler.stop()
+        time.sleep(0.1)
+
+        # a single loop samples about 6 times, two revived loops twice as often
+        self.assertTrue(1 <= Backend.samples <= 8, Backend.samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
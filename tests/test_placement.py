@@ -0,0 +1,96 @@
+from coco.backends.placement import NodeSelector
+from coco.contract.errors import ConnectionError, ContainerBackendError
+import unittest
+
+
+class FakeNode(object):
+
+    def __init__(self, name, memory_used=0, containers=0, images=(), reachable=True):
+        self.images = images
+        self.load = {'cpus': 4, 'memory_total': 1000, 'memory_used': memory_used, 'containers': containers}
+        self.loads = 0
+        self.name = name
+        self.reachable = reachable
+
+    def container_image_exists(self, image):
+        return image in self.images
+
+    def get_node_load(self):
+        if not self.reachable:
+            raise ConnectionError
+        self.loads += 1
+        return dict(self.load)
+
+
+class NodeSelectorTest(unittest.TestCase):
+
+    def get_scores(self, selector, image=None):
+        return dict((node.name, round(score, 3)) for node, score in selector.get_scores(image))
+
+    def test_scores(self):
+        nodes = [
+            FakeNode('busy', memory_used=750, containers=3),
+            FakeNode('idle'),
+            FakeNode('cached', memory_used=500, containers=1, images=['coco/ipython'])
+        ]
+        selector = NodeSelector(nodes, memory_weight=1.0, containers_weight=0.5, image_weight=0.5)
+
+        self.assertEqual(self.get_scores(selector), {'busy': 0.375, 'idle': 1.5, 'cached': 0.75})
+        self.assertEqual(self.get_scores(selector, 'coco/ipython'), {'busy': 0.375, 'idle': 1.5, 'cached': 1.25})
+        self.assertEqual(selector.select('coco/ipython').name, 'idle')
+
+    def test_weights(self):
+        nodes = [FakeNode('idle'), FakeNode('cached', memory_used=500, containers=1, images=['coco/ipython'])]
+
+        self.assertEqual(NodeSelector(nodes, image_weight=2.0).select('coco/ipython').name, 'cached')
+        self.assertEqual(
+            self.get_scores(NodeSelector(nodes, memory_weight=0, containers_weight=1.0, image_weight=0)),
+            {'idle': 1.0, 'cached': 0.5}
+        )
+
+    def test_unreachable_nodes_are_skipped(self):
+        selector = NodeSelector([FakeNode('down', reachable=False), FakeNode('up', memory_used=900, containers=9)])
+
+        self.assertEqual(selector.select().name, 'up')
+        self.assertRaises(ContainerBackendError, NodeSelector([FakeNode('down', reachable=False)]).select)
+
+    def test_loads_are_cached(self):
+        node = FakeNode('a')
+        selector = NodeSelector([node], ttl=60)
+
+        selector.get_scores()
+        selector.get_scores()
+        self.assertEqual(node.loads, 1)
+
+        selector.invalidate()
+        selector.get_scores()
+        self.assertEqual(node.loads, 2)
+
+        selector.ttl = -1  # expired
+        selector.get_scores()
+        self.assertEqual(node.loads, 3)
+
+    def test_placement_is_accounted_until_the_load_is_fetched_again(self):
+        nodes = [FakeNode('a'), FakeNode('b')]
+        selector = NodeSelector(nodes, ttl=60, memory_weight=0)
+
+        placed = [selector.select().name for _ in range(4)]
+
+        self.assertEqual(sorted(placed), ['a', 'a', 'b', 'b'])
+        self.assertEqual(selector._loads[0][1].get('containers'), 2)
+        self.assertEqual([node.loads for node in nodes], [1, 1])
+
+        selector.invalidate()
+        self.assertEqual(self.get_scores(selector), {'a': 0.5, 'b': 0.5})
+
+    def test_selected_node_counts_as_having_the_image(self):
+        nodes = [FakeNode('a'), FakeNode('b')]
+        selector = NodeSelector(nodes, ttl=60)
+
+        node = selector.select('coco/ipython')
+
+        self.assertEqual(self.get_scores(selector, 'coco/ipython').get(node.name), 1.75)
+
+
+if __name__ == '__main__':
+    unittest.main()
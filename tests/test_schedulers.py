@@ -0,0 +1,136 @@
+from coco.backends.schedulers import CpusetPacker, IdleContainerSuspender, PortAllocator
+from coco.contract.errors import ContainerBackendError
+import time
+import unittest
+
+
+class CpusetPackerTest(unittest.TestCase):
+
+    def make_packer(self, cpusets=None, cpus_per_container=1):
+        class Backend(object):
+            def get_container_cpusets(self):
+                return cpusets or {}
+
+            def get_cpu_count(self):
+                return 4
+
+        return CpusetPacker(Backend(), cpus_per_container)
+
+    def test_parse_cpuset(self):
+        packer = self.make_packer()
+        self.assertEqual(packer.parse_cpuset('0-2,4'), [0, 1, 2, 4])
+        self.assertEqual(packer.parse_cpuset('3'), [3])
+        self.assertEqual(packer.parse_cpuset(''), [])
+        self.assertEqual(packer.parse_cpuset(None), [])
+
+    def test_existing_containers_are_loaded(self):
+        packer = self.make_packer({'a': '0-1', 'b': '1', 'c': '7'})  # core 7 does not exist (anymore)
+        self.assertEqual(packer.get_load(), {0: 1, 1: 2, 2: 0, 3: 0})
+
+    def test_least_loaded_cores_are_reserved(self):
+        packer = self.make_packer({'a': '0-1'}, cpus_per_container=2)
+        self.assertEqual(packer.reserve(), [2, 3])
+        self.assertEqual(packer.reserve(), [0, 1])
+        self.assertEqual(packer.get_load(), {0: 2, 1: 2, 2: 1, 3: 1})
+
+    def test_release_and_free(self):
+        packer = self.make_packer()
+        cores = packer.reserve()
+        packer.bind('a', cores)
+        packer.free(packer.reserve())  # creation failed
+
+        packer.release('a')
+        packer.release('a')  # releasing twice is fine
+        self.assertEqual(packer.get_load(), {0: 0, 1: 0, 2: 0, 3: 0})
+
+    def test_transfer(self):
+        packer = self.make_packer({'old': '2'})
+        packer.get_load()
+
+        packer.transfer('old', 'new')
+        packer.release('old')
+        self.assertEqual(packer.get_load().get(2), 1)
+        packer.release('new')
+        self.assertEqual(packer.get_load().get(2), 0)
+
+
+class IdleContainerSuspenderTest(unittest.TestCase):
+
+    def test_restart_runs_a_single_loop(self):
+        class Backend(object):
+            CONTAINER_NAME_PREFIX = 'coco-'
+            samples = 0
+
+            def get_containers(self, only_running=False, name_prefix=None):
+                Backend.samples += 1
+                return []
+
+        suspender = IdleContainerSuspender(Backend(), interval=0.05)
+        suspender.start()
+        suspender.stop()
+        suspender.start()
+        time.sleep(0.3)
+        suspender.stop()
+        time.sleep(0.1)
+
+        # a single loop samples about 6 times, two revived loops twice as often
+        self.assertTrue(1 <= Backend.samples <= 8, Backend.samples)
+
+    def test_resume_resets_the_idle_time(self):
+        suspender = IdleContainerSuspender(None)
+        suspender._activity['a'] = (0, 0, 0, 0)
+
+        suspender.record_resume('a')
+
+        self.assertEqual(suspender.get_stats(), {'suspended': 0, 'resumed': 1, 'tracked': 0})
+
+
+class PortAllocatorTest(unittest.TestCase):
+
+    def make_allocator(self, ports=None, ranges=((50000, 50002), (50010, 50011))):
+        class Backend(object):
+            def get_container_ports(self):
+                return dict(ports or {})
+
+        return PortAllocator(Backend(), ranges)
+
+    def test_ports_are_allocated_across_ranges(self):
+        allocator = self.make_allocator({'a': [50001]})
+
+        self.assertEqual(allocator.reserve(count=3), [50000, 50002, 50010])
+        self.assertEqual(allocator.reserve(count=1), [50011])
+        self.assertEqual(allocator.get_free_count(), 0)
+        self.assertRaises(ContainerBackendError, allocator.reserve, count=1)
+
+    def test_explicit_ports_are_reserved(self):
+        allocator = self.make_allocator({'a': [8080]})
+
+        self.assertEqual(allocator.reserve([8888], 1), [50000])
+        self.assertTrue(allocator.is_reserved(8888))
+        self.assertRaises(ContainerBackendError, allocator.reserve, [8080])
+        self.assertRaises(ContainerBackendError, allocator.reserve, [8888])
+
+    def test_nothing_is_reserved_on_failure(self):
+        allocator = self.make_allocator()
+
+        self.assertRaises(ContainerBackendError, allocator.reserve, [8888], 6)
+
+        self.assertFalse(allocator.is_reserved(8888))
+        self.assertEqual(allocator.get_free_count(), 5)
+
+    def test_release_free_and_transfer(self):
+        allocator = self.make_allocator({'old': [50000]})
+        allocator.bind('new', allocator.reserve(count=1))
+        allocator.free(allocator.reserve(count=1))  # creation failed
+
+        allocator.transfer('old', 'restored')
+        allocator.release('old')
+        self.assertTrue(allocator.is_reserved(50000))
+
+        allocator.release('restored')
+        allocator.release('new')
+        self.assertEqual(allocator.get_free_count(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+from coco.backends.snapshots import SnapshotIndex, SnapshotManager, SnapshotRetentionPolicy
+from coco.contract.backends import ContainerBackend
+import calendar
+import time
+import unittest
+
+
+DAY = 24 * 3600
+
+
+def make_snapshots(*timestamps):
+    """
+    Return snapshots created at `timestamps` (newest first, as the backend lists them).
+    """
+    return [
+        {ContainerBackend.KEY_PK: 'snapshot-%i' % i, 'created': created}
+        for i, created in enumerate(sorted(timestamps, reverse=True))
+    ]
+
+
+class SnapshotRetentionPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = calendar.timegm((2016, 1, 15, 12, 0, 0))  # a Friday
+
+    def test_keeps_the_newest(self):
+        snapshots = make_snapshots(*[self.now - i * 60 for i in range(10)])
+        policy = SnapshotRetentionPolicy(keep_last=3, keep_daily=0, keep_weekly=0)
+
+        self.assertEqual(policy.select(snapshots), set(['snapshot-0', 'snapshot-1', 'snapshot-2']))
+
+    def test_keeps_the_newest_per_day(self):
+        # two snapshots per day on four days
+        snapshots = make_snapshots(*[self.now - day * DAY - hour * 3600 for day in range(4) for hour in (0, 1)])
+        policy = SnapshotRetentionPolicy(keep_last=0, keep_daily=3, keep_weekly=0)
+
+        self.assertEqual(policy.select(snapshots), set(['snapshot-0', 'snapshot-2', 'snapshot-4']))
+
+    def test_keeps_the_newest_per_week(self):
+        snapshots = make_snapshots(*[self.now - week * 7 * DAY for week in range(4)] + [self.now - DAY])
+        policy = SnapshotRetentionPolicy(keep_last=0, keep_daily=0, keep_weekly=2)
+
+        kept = policy.select(snapshots)
+        self.assertEqual(len(kept), 2)
+        self.assertIn('snapshot-0', kept)  # newest of this week
+        self.assertIn('snapshot-2', kept)  # newest of last week
+
+    def test_rules_are_combined(self):
+        snapshots = make_snapshots(*[self.now - i * DAY for i in range(30)])
+        policy = SnapshotRetentionPolicy(keep_last=2, keep_daily=3, keep_weekly=4)
+
+        kept = policy.select(snapshots)
+        self.assertTrue(set(['snapshot-0', 'snapshot-1', 'snapshot-2']) <= kept)
+        self.assertTrue(len(kept) <= 2 + 3 + 4)
+        self.assertNotIn('snapshot-29', kept)
+
+    def test_no_snapshots(self):
+        self.assertEqual(SnapshotRetentionPolicy().select([]), set())
+
+
+class SnapshotManagerTest(unittest.TestCase):
+
+    def test_restart_runs_a_single_loop(self):
+        class Backend(object):
+            prunes = 0
+
+            def get_container_snapshot_lineages(self):
+                Backend.prunes += 1
+                return {}
+
+            def prune_dangling_container_images(self):
+                return 0
+
+        manager = SnapshotManager(Backend(), interval=0.05)
+        manager.start()
+        manager.stop()
+        manager.start()
+        time.sleep(0.3)
+        manager.stop()
+        time.sleep(0.1)
+
+        # a single loop prunes about 6 times, two revived loops twice as often
+        self.assertTrue(1 <= Backend.prunes <= 8, Backend.prunes)
+
+
+class SnapshotIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SnapshotIndex(ttl=60)
+        self.index.load([
+            {'Id': '1', 'RepoTags': ['coco-u2500/ipython:snapshot-ab']},
+            {'Id': '2', 'RepoTags': ['coco-u2500/ipython:snapshot-cd']},
+            {'Id': '3', 'RepoTags': ['coco-u2501/ipython:snapshot-ab']}
+        ])
+
+    def test_get_matches_exactly(self):
+        self.assertEqual(self.index.get('coco-u2500/ipython:snapshot-ab').get('Id'), '1')
+        self.assertIsNone(self.index.get('coco-u2500/ipython:snapshot-a'))
+        self.assertIsNone(self.index.get('coco-u2500/ipython:snapshot-abc'))
+
+    def test_for_repository(self):
+        images = self.index.for_repository('coco-u2500/ipython')
+        self.assertEqual(sorted(image.get('Id') for image in images), ['1', '2'])
+        self.assertEqual(self.index.for_repository('coco-u9999/ipython'), [])
+
+    def test_add_and_remove(self):
+        self.index.add({'Id': '4', 'RepoTags': ['coco-u2502/ipython:snapshot-ef']})
+        self.assertEqual(self.index.get('coco-u2502/ipython:snapshot-ef').get('Id'), '4')
+
+        self.index.remove('coco-u2502/ipython:snapshot-ef')
+        self.index.remove('coco-u2502/ipython:snapshot-ef')  # removing twice is fine
+        self.assertIsNone(self.index.get('coco-u2502/ipython:snapshot-ef'))
+        self.assertEqual(self.index.for_repository('coco-u2502/ipython'), [])
+        self.assertEqual(len(self.index.all()), 3)
+
+    def test_staleness(self):
+        self.assertTrue(SnapshotIndex().is_stale())
+        self.assertFalse(self.index.is_stale())
+        self.index.invalidate()
+        self.assertTrue(self.index.is_stale())
+
+
+if __name__ == '__main__':
+    unittest.main()